@@ -1,65 +1,325 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 
-from openai import OpenAI
+import openai
+from openai import AsyncOpenAI
 
-client = OpenAI()  # Uses env variable OPENAI_API_KEY
+from broken_link import backoff_delay, retry_after_seconds
+from feedback_cache import SUMMARY_URL, FeedbackCache, fields_hash
+from metrics import metrics
+
+review_client = AsyncOpenAI(max_retries=0)  # Uses env variable OPENAI_API_KEY; retries are done in _complete
+
+REVIEW_MODEL = "gpt-3.5-turbo"
+REVIEW_TEMPLATE_VERSION = 1      # bump whenever the review prompt or output format changes
+MODEL_CONTEXT = {"gpt-3.5-turbo": 16385, "gpt-4o-mini": 128000, "gpt-4o": 128000}
+REVIEW_OUTPUT_TOKENS = 4000      # completion budget per batch
+PAGE_OUTPUT_TOKENS = 200         # expected feedback per page, caps pages per batch
+REVIEW_CONCURRENCY = 4
+REVIEW_RETRIES = 5
+PAGE_FIELDS = ("title", "description", "h1")
+REVIEW_FIELDS = PAGE_FIELDS + ("issues",)   # what a page contributes to the review prompt
+
+REVIEW_SYSTEM = "You are an expert SEO analyst."
+REVIEW_INSTRUCTIONS = (
+    "Please review the SEO metadata of the following webpages.\n"
+    "For each URL, provide:\n"
+    "- A brief SEO analysis\n"
+    "- Suggested improvements for the title, meta description, or H1 if only missing or suboptimal.\n"
+    "- Recommended keywords to target\n"
+    "- Alternative H1 tags if relevant\n"
+    "- Any missing SEO elements (e.g., title too long, missing H1, weak keywords)\n\n"
+    "Reply with a JSON object mapping each URL exactly as given to its feedback as a single string.\n\n"
+)
+SUMMARY_INSTRUCTIONS = (
+    "Below is page-level SEO feedback for one website. Write a short site-wide report: "
+    "the most common problems, the pages that need attention first, and recurring keyword opportunities.\n\n"
+)
+
+
+def count_tokens(text: str, model: str = REVIEW_MODEL) -> int:
+    """Exact with tiktoken when it is installed, otherwise ~4 characters per token."""
+    try:
+        import tiktoken
+    except ImportError:
+        return len(text) // 4 + 1
+    try:
+        encoding = tiktoken.encoding_for_model(model)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return len(encoding.encode(text))
+
+
+def page_block(url: str, data: dict) -> str:
+    lines = [f"URL: {url}"]
+    lines += [f"{name.capitalize() if name != 'h1' else 'H1'}: {data.get(name)}" for name in PAGE_FIELDS]
+    if data.get("issues"):
+        lines.append(f"Audit issues: {', '.join(data['issues'])}")
+    lines.append("-" * 40)
+    return "\n".join(lines) + "\n"
 
-def ask_ai_for_seo_feedback(seo_data: dict) -> str:
-    prompt = (
-        "You are an expert SEO analyst. Please review the SEO metadata of the following webpages.\n"
-        "For each URL, provide:\n"
-        "- A brief SEO analysis\n"
-        "- Suggested improvements for the title, meta description, or H1 if only missing or suboptimal.\n"
-        "- Recommended keywords to target\n"
-        "- Alternative H1 tags if relevant\n"
-        "- Any missing SEO elements (e.g., title too long, missing H1, weak keywords)\n\n"
-    )
 
+def pack_batches(seo_data: dict, model: str = REVIEW_MODEL) -> List[List[Tuple[str, str]]]:
+    """
+    Groups (url, page block) pairs into batches whose prompt fits the model's
+    context next to the completion budget, with at most as many pages as the
+    completion budget can answer.
+    """
+    context = MODEL_CONTEXT.get(model, 16385)
+    overhead = count_tokens(REVIEW_SYSTEM + REVIEW_INSTRUCTIONS, model) + 50
+    budget = context - REVIEW_OUTPUT_TOKENS - overhead
+    max_pages = max(1, REVIEW_OUTPUT_TOKENS // PAGE_OUTPUT_TOKENS)
+    batches, batch, used = [], [], 0
     for url, data in seo_data.items():
+        # Skip anything that is not a page dict (e.g. an error string or None)
         if not isinstance(data, dict):
-            continue  # Skip if it's not a dictionary (e.g., an error string or None)
+            continue
+        block = page_block(url, data)
+        tokens = count_tokens(block, model)
+        if tokens > budget:
+            block = block[: budget * 3]   # pathological page; truncate rather than fail the batch
+            tokens = count_tokens(block, model)
+        if batch and (used + tokens > budget or len(batch) >= max_pages):
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append((url, block))
+        used += tokens
+    if batch:
+        batches.append(batch)
+    return batches
 
-    for url, data in seo_data.items():
-        prompt += f"URL: {url}\n"
-        prompt += f"Title: {data['title']}\n"
-        prompt += f"Description: {data['description']}\n"
-        prompt += f"H1: {data['h1']}\n"
-        prompt += "-" * 40 + "\n"
-
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are an expert SEO analyst."},
-            {"role": "user", "content": prompt}
-        ]
+
+@dataclass
+class SiteReview:
+    pages: Dict[str, str] = field(default_factory=dict)     # url -> feedback
+    unparsed: List[str] = field(default_factory=list)       # raw replies that were not valid JSON
+    summary: str = ""
+    batches: int = 0
+    failed_batches: int = 0
+    cached: int = 0                                          # pages answered from the feedback cache
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def report(self) -> str:
+        parts = []
+        if self.summary:
+            parts += ["Site summary:", self.summary, ""]
+        for url, feedback in self.pages.items():
+            parts += [f"URL: {url}", feedback, "-" * 40]
+        parts += self.unparsed
+        return "\n".join(parts)
+
+
+async def _complete(messages: list, model: str, json_mode: bool = False, max_tokens: int = REVIEW_OUTPUT_TOKENS):
+    """One chat completion, retried on rate limits and transient errors."""
+    extra = {"response_format": {"type": "json_object"}} if json_mode else {}
+    for attempt in range(REVIEW_RETRIES + 1):
+        try:
+            with metrics.track("openai_review"):
+                response = await review_client.chat.completions.create(
+                    model=model, messages=messages, max_tokens=max_tokens, **extra
+                )
+            if response.usage:
+                metrics.count("openai_prompt_tokens", response.usage.prompt_tokens)
+                metrics.count("openai_completion_tokens", response.usage.completion_tokens)
+            return response
+        except (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) as e:
+            if attempt == REVIEW_RETRIES:
+                raise
+            response = getattr(e, "response", None)
+            wait = retry_after_seconds(response.headers.get("retry-after")) if response is not None else None
+            await asyncio.sleep(wait if wait is not None else backoff_delay(attempt + 1))
+
+
+async def _review_batch(batch: List[Tuple[str, str]], model: str, review: SiteReview):
+    prompt = REVIEW_INSTRUCTIONS + "".join(block for _, block in batch)
+    response = await _complete(
+        [{"role": "system", "content": REVIEW_SYSTEM}, {"role": "user", "content": prompt}], model, json_mode=True
     )
+    review.batches += 1
+    if response.usage:
+        review.prompt_tokens += response.usage.prompt_tokens
+        review.completion_tokens += response.usage.completion_tokens
+    content = response.choices[0].message.content or ""
+    try:
+        feedback = json.loads(content)
+    except ValueError:
+        review.unparsed.append(content)
+        return
+    if not isinstance(feedback, dict):
+        # Valid JSON, but not the {url: feedback} object that was asked for
+        review.unparsed.append(content)
+        return
+    for url, _ in batch:
+        if url in feedback:
+            review.pages[url] = str(feedback[url])
+
+
+def review_template_id() -> str:
+    """Identifies the prompt templates; cached feedback from any other template is discarded."""
+    text = REVIEW_SYSTEM + REVIEW_INSTRUCTIONS + SUMMARY_INSTRUCTIONS
+    return f"v{REVIEW_TEMPLATE_VERSION}-{hashlib.sha256(text.encode()).hexdigest()[:12]}"
+
+
+async def review_site(
+    seo_data: dict,
+    model: str = REVIEW_MODEL,
+    concurrency: int = REVIEW_CONCURRENCY,
+    summarize: bool = True,
+    cache: Optional[FeedbackCache] = None,
+) -> SiteReview:
+    """
+    Reviews any number of pages: they are packed into token-budgeted batches,
+    the batches run concurrently, and the per-page feedback is merged into one
+    report, with a site-wide summary when the pages span several batches.
+
+    With a `cache`, pages whose SEO fields are unchanged reuse their stored
+    feedback and only the rest go to the model.
+    """
+    review = SiteReview()
+    pending, keys = {}, {}
+    for url, data in seo_data.items():
+        if not isinstance(data, dict):
+            continue
+        keys[url] = fields_hash(url, data, REVIEW_FIELDS)
+        feedback = cache.lookup(model, keys[url]) if cache else None
+        if feedback is not None:
+            review.pages[url] = feedback
+            review.cached += 1
+        else:
+            pending[url] = data
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(batch):
+        async with semaphore:
+            try:
+                await _review_batch(batch, model, review)
+            except openai.OpenAIError as e:
+                # A failed batch only loses its own pages
+                review.failed_batches += 1
+                logging.error(f"❌ Review batch of {len(batch)} pages failed: {e}")
+                return
+        if cache:
+            for url, _ in batch:
+                if url in review.pages:
+                    cache.store(model, keys[url], url, review.pages[url])
+
+    await asyncio.gather(*(run(batch) for batch in pack_batches(pending, model)))
+    # Keep the report in the crawl's page order
+    review.pages = {url: review.pages[url] for url in seo_data if url in review.pages}
+
+    if summarize and len(review.pages) > REVIEW_OUTPUT_TOKENS // PAGE_OUTPUT_TOKENS:
+        budget = MODEL_CONTEXT.get(model, 16385) - REVIEW_OUTPUT_TOKENS - 200
+        lines, used = [], 0
+        for url, feedback in review.pages.items():
+            line = f"{url}: {feedback}\n"
+            used += count_tokens(line, model)
+            if used > budget:
+                break
+            lines.append(line)
+        summary_key = fields_hash(SUMMARY_URL, {"feedback": lines}, ["feedback"])
+        review.summary = (cache.lookup(model, summary_key) if cache else None) or ""
+        if not review.summary:
+            try:
+                response = await _complete(
+                    [{"role": "system", "content": REVIEW_SYSTEM}, {"role": "user", "content": SUMMARY_INSTRUCTIONS + "".join(lines)}],
+                    model,
+                    max_tokens=1000,
+                )
+            except openai.OpenAIError as e:
+                # The per-page feedback is still worth returning without a summary
+                logging.error(f"❌ Review summary failed: {e}")
+                return review
+            review.summary = response.choices[0].message.content or ""
+            if cache and review.summary:
+                cache.store(model, summary_key, SUMMARY_URL, review.summary)
+    return review
+
+
+def ask_ai_for_seo_feedback(seo_data: dict) -> str:
+    """Blocking wrapper around review_site for callers outside an event loop."""
+    return asyncio.run(review_site(seo_data)).report()
+
+
+
+ADVICE_MODEL = "gpt-4o-mini"
+ADVICE_TIMEOUT = 60.0   # seconds for the whole completion, retries and streaming included
+ADVICE_MAX_TOKENS = 500
+
+# The client timeout only bounds each connect / read; ADVICE_TIMEOUT is
+# enforced around the whole call below and raises TimeoutError.
+async_client = AsyncOpenAI(timeout=ADVICE_TIMEOUT, max_retries=2)
 
-    feedback = response.choices[0].message.content
-    return feedback
 
+def advice_messages(gsc_summary: dict, ga4_summary: dict) -> list:
+    prompt = f"""
+    You are an expert SEO consultant. Analyze the following SEO and traffic data, and provide actionable insights and recommendations:
 
+    Google Search Console data summary:
+    {gsc_summary}
 
-# def generate_seo_advice(gsc_summary: dict, ga4_summary: dict) -> str:
-#     prompt = f"""
-#     You are an expert SEO consultant. Analyze the following SEO and traffic data, and provide actionable insights and recommendations:
+    Google Analytics data summary:
+    {ga4_summary}
 
-#     Google Search Console data summary:
-#     {gsc_summary}
+    Please suggest improvements, content ideas, and alert on any SEO issues.
+    """
+    return [
+        {"role": "system", "content": "You are a helpful SEO assistant."},
+        {"role": "user", "content": prompt},
+    ]
 
-#     Google Analytics data summary:
-#     {ga4_summary}
 
-#     Please suggest improvements, content ideas, and alert on any SEO issues.
-#     """
+async def generate_seo_advice(gsc_summary: dict, ga4_summary: dict, model: str = ADVICE_MODEL) -> str:
+    """The advice text; raises TimeoutError after ADVICE_TIMEOUT seconds."""
+    with metrics.track("openai_advice"):
+        async with asyncio.timeout(ADVICE_TIMEOUT):
+            response = await async_client.chat.completions.create(
+                model=model,
+                messages=advice_messages(gsc_summary, ga4_summary),
+                max_tokens=ADVICE_MAX_TOKENS,
+                temperature=0.7,
+            )
+    advice = response.choices[0].message.content.strip()
+    return advice
 
-#     response = openai.ChatCompletion.create(
-#         model="gpt-4o-mini",  # or "gpt-4" if you have access
-#         messages=[
-#             {"role": "system", "content": "You are a helpful SEO assistant."},
-#             {"role": "user", "content": prompt},
-#         ],
-#         max_tokens=500,
-#         temperature=0.7,
-#     )
 
-#     advice = response.choices[0].message.content.strip()
-#     return advice
+async def stream_seo_advice(gsc_summary: dict, ga4_summary: dict, model: str = ADVICE_MODEL):
+    """
+    Yields the advice text piece by piece as the model produces it. The
+    time to the first piece is recorded as "openai_first_token". Raises
+    TimeoutError once the stream has run for ADVICE_TIMEOUT seconds.
+    """
+    with metrics.track("openai_advice"):
+        t0 = time.perf_counter()
+        # One deadline for the whole stream, applied to each wait rather than
+        # across the yields, which run in the consumer's time.
+        deadline = asyncio.get_running_loop().time() + ADVICE_TIMEOUT
+        async with asyncio.timeout_at(deadline):
+            stream = await async_client.chat.completions.create(
+                model=model,
+                messages=advice_messages(gsc_summary, ga4_summary),
+                max_tokens=ADVICE_MAX_TOKENS,
+                temperature=0.7,
+                stream=True,
+            )
+        try:
+            chunks = aiter(stream)
+            first = True
+            while True:
+                async with asyncio.timeout_at(deadline):
+                    chunk = await anext(chunks, None)
+                if chunk is None:
+                    break
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first:
+                        metrics.observe("openai_first_token", time.perf_counter() - t0)
+                        first = False
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
@@ -0,0 +1,372 @@
+# batch.py
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sqlite3
+import sys
+import time
+from typing import Iterable, Iterator, List, Optional
+from urllib.parse import urlparse
+
+from log_config import configure_logging
+from site_crawler import DEFAULT_MAX_PAGES
+
+DEFAULT_QUEUE_PATH = "batch_queue.sqlite"
+DEFAULT_DATA_DIR = "batch_data"
+DEFAULT_TIMEOUT = 2 * 3600      # seconds one domain may take before it is abandoned
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_DELAY = 60                # seconds before the first retry; doubles per attempt
+POLL_INTERVAL = 1.0
+REPORT_INTERVAL = 60
+
+
+def read_domains(path: str) -> Iterator[str]:
+    """
+    Domains from a text file (one per line, # comments) or JSONL, where each
+    line is an object with a "domain", "domain_or_url" or "url" field.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                domain = record.get("domain") or record.get("domain_or_url") or record.get("url")
+                if not domain:
+                    continue
+                line = domain.strip()
+            yield line
+
+
+def domain_slug(domain: str) -> str:
+    """File-system safe name for a domain's state, cache and log files."""
+    host = urlparse(domain).netloc if "://" in domain else domain
+    return re.sub(r"[^A-Za-z0-9.-]+", "_", host.strip("/")).strip("._") or "domain"
+
+
+class JobQueue:
+    """
+    Durable per-domain job queue in SQLite, shared by the worker processes.
+
+    A job is queued → running → done, or back to queued with a growing delay
+    after a failure until `max_attempts` is used up (then failed). Claiming
+    runs in an IMMEDIATE transaction, so two workers never get the same job.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH):
+        # Autocommit; every write below is a single statement or an explicit transaction.
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                domain TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker INTEGER,
+                not_before REAL NOT NULL DEFAULT 0,
+                enqueued_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                duration REAL,
+                error TEXT
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, not_before)")
+
+    def add(self, domains: Iterable[str]) -> int:
+        """Queues each domain; finished ones are queued again, running ones are left alone."""
+        now = time.time()
+        rows = [(domain, now) for domain in domains]
+        self._db.execute("BEGIN IMMEDIATE")
+        self._db.executemany(
+            """
+            INSERT INTO jobs (domain, status, enqueued_at) VALUES (?, 'queued', ?)
+            ON CONFLICT(domain) DO UPDATE SET
+                status = 'queued', attempts = 0, worker = NULL, not_before = 0,
+                enqueued_at = excluded.enqueued_at, error = NULL
+            WHERE jobs.status != 'running'
+            """,
+            rows,
+        )
+        self._db.execute("COMMIT")
+        return len(rows)
+
+    def claim(self, worker: int) -> Optional[str]:
+        """The next ready domain, marked as running on `worker`; None if nothing is ready."""
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute(
+                "SELECT domain FROM jobs WHERE status = 'queued' AND not_before <= ? "
+                "ORDER BY not_before, enqueued_at LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row:
+                self._db.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, attempts = attempts + 1 "
+                    "WHERE domain = ?",
+                    (worker, now, row[0]),
+                )
+        finally:
+            self._db.execute("COMMIT")
+        return row[0] if row else None
+
+    def finish(self, domain: str, error: Optional[str] = None, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        now = time.time()
+        if error is None:
+            self._db.execute(
+                "UPDATE jobs SET status = 'done', finished_at = ?, duration = ? - started_at, error = NULL "
+                "WHERE domain = ?",
+                (now, now, domain),
+            )
+            return
+        self._db.execute(
+            """
+            UPDATE jobs SET
+                status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+                not_before = ? + ? * (1 << (attempts - 1)),
+                finished_at = ?, duration = ? - started_at, error = ?
+            WHERE domain = ?
+            """,
+            (max_attempts, now, RETRY_DELAY, now, now, error, domain),
+        )
+
+    def release(
+        self, worker: Optional[int] = None, max_attempts: int = DEFAULT_MAX_ATTEMPTS, penalize: bool = True
+    ) -> int:
+        """
+        Gives back the jobs a dead worker (or, with no `worker`, a previous
+        batch) left running. Each counts as a failed attempt unless
+        `penalize` is off, as when the batch was stopped on purpose.
+        """
+        where, params = "status = 'running'", []
+        if worker is not None:
+            where, params = where + " AND worker = ?", [worker]
+        if not penalize:
+            return self._db.execute(
+                f"UPDATE jobs SET status = 'queued', attempts = attempts - 1, worker = NULL WHERE {where}", params
+            ).rowcount
+        domains = [row[0] for row in self._db.execute(f"SELECT domain FROM jobs WHERE {where}", params)]
+        for domain in domains:
+            self.finish(domain, "worker exited while running this domain", max_attempts)
+        return len(domains)
+
+    def has_work(self) -> bool:
+        """True while any job is queued (ready or waiting to retry) or running."""
+        row = self._db.execute("SELECT 1 FROM jobs WHERE status IN ('queued', 'running') LIMIT 1").fetchone()
+        return row is not None
+
+    def counts(self) -> dict:
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        counts.update(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return counts
+
+    def jobs(self, status: Optional[str] = None) -> List[dict]:
+        columns = ("domain", "status", "attempts", "worker", "started_at", "finished_at", "duration", "error")
+        query = f"SELECT {', '.join(columns)} FROM jobs"
+        rows = self._db.execute(query + " WHERE status = ?", (status,)) if status else self._db.execute(query)
+        return [dict(zip(columns, row)) for row in rows]
+
+    def close(self):
+        self._db.close()
+
+
+def run_job(domain: str, options: dict, timeout: float, data_dir: str) -> Optional[str]:
+    """
+    Audits one domain in a fresh event loop; returns None on success or the error.
+
+    Each domain gets its own crawl state, response cache, feedback cache and
+    log under `data_dir`, so workers never contend for the same SQLite files.
+    """
+    from server import main
+
+    slug = domain_slug(domain)
+    directory = os.path.join(data_dir, slug)
+    os.makedirs(directory, exist_ok=True)
+    os.environ["SEO_STATE_DB"] = os.path.join(directory, "crawl_state.sqlite")
+    os.environ["SEO_CACHE_DIR"] = os.path.join(directory, "http_cache")
+    os.environ["SEO_FEEDBACK_CACHE"] = os.path.join(directory, "feedback_cache.sqlite")
+    options = dict(
+        options,
+        diff_report=os.path.join(directory, "diff.json"),
+        metrics_json=os.path.join(directory, "metrics.json"),
+    )
+    # "output" is a flag here; every domain writes to its own file.
+    options["output"] = os.path.join(directory, "audit.jsonl") if options.get("output") else None
+
+    level = logging.getLogger().level
+    with open(os.path.join(directory, "audit.log"), "a", encoding="utf-8") as log:
+        configure_logging(level, stream=log)
+        try:
+            logging.info(f"\n===== {domain} @ {time.strftime('%Y-%m-%d %H:%M:%S')} =====")
+            asyncio.run(asyncio.wait_for(main(domain, **options), timeout))
+        except asyncio.TimeoutError:
+            return f"timed out after {timeout:.0f}s"
+        except Exception as e:
+            logging.error(f"❌ Audit failed: {type(e).__name__}: {e}")
+            return f"{type(e).__name__}: {e}"
+        finally:
+            # Flushes the domain's log before it is closed, then logs to the terminal again.
+            configure_logging(level)
+    return None
+
+
+def worker_main(
+    worker: int, queue_path: str, options: dict, timeout: float, max_attempts: int, data_dir: str, log_level: str
+):
+    """Worker process: claims domains one at a time until the queue is drained."""
+    configure_logging(log_level)
+    queue = JobQueue(queue_path)
+    try:
+        while True:
+            domain = queue.claim(worker)
+            if domain is None:
+                # Jobs still running elsewhere may fail and come back for a retry.
+                if not queue.has_work():
+                    return
+                time.sleep(POLL_INTERVAL)
+                continue
+            error = run_job(domain, options, timeout, data_dir)
+            queue.finish(domain, error, max_attempts)
+            logging.info(f"{'✅' if error is None else '❌'} [worker {worker}] {domain}" + (f": {error}" if error else ""))
+    finally:
+        queue.close()
+
+
+def run_batch(
+    domains: Optional[Iterable[str]],
+    workers: int,
+    queue_path: str = DEFAULT_QUEUE_PATH,
+    data_dir: str = DEFAULT_DATA_DIR,
+    timeout: float = DEFAULT_TIMEOUT,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    options: Optional[dict] = None,
+):
+    """
+    Audits every domain in `domains` with `workers` processes, each running
+    its own event loop, one domain at a time. A slow domain only holds up its
+    own worker, and a worker that dies is replaced and its domain retried.
+    With `domains` None, an interrupted batch in `queue_path` is resumed.
+    """
+    queue = JobQueue(queue_path)
+    released = queue.release(max_attempts=max_attempts)
+    if released:
+        logging.info(f"♻️ {released} domains left running by an interrupted batch were re-queued")
+    if domains is not None:
+        logging.info(f"📥 Queued {queue.add(domains)} domains")
+
+    context = multiprocessing.get_context("spawn")
+    # Spawned workers start without the parent's logging setup.
+    log_level = logging.getLevelName(logging.getLogger().level)
+    args = (queue_path, options or {}, timeout, max_attempts, data_dir, log_level)
+
+    def start(worker):
+        process = context.Process(target=worker_main, args=(worker, *args), name=f"audit-worker-{worker}")
+        process.start()
+        return process
+
+    t0 = time.monotonic()
+    processes = {worker: start(worker) for worker in range(max(1, workers))}
+    last_report = t0
+    try:
+        while processes:
+            time.sleep(POLL_INTERVAL)
+            for worker, process in list(processes.items()):
+                if process.is_alive():
+                    continue
+                process.join()
+                del processes[worker]
+                if process.exitcode != 0:
+                    lost = queue.release(worker, max_attempts)
+                    logging.warning(f"💥 Worker {worker} exited with code {process.exitcode}; {lost} domain(s) re-queued")
+                    if queue.has_work():
+                        processes[worker] = start(worker)
+            if time.monotonic() - last_report >= REPORT_INTERVAL:
+                last_report = time.monotonic()
+                logging.info(f"⏱️ {queue.counts()} after {(last_report - t0) / 60:.1f} min")
+    except KeyboardInterrupt:
+        logging.warning("\n🛑 Interrupted; stopping workers (rerun with --resume to continue)")
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join()
+        queue.release(penalize=False)
+        raise
+    finally:
+        report(queue, time.monotonic() - t0)
+        queue.close()
+
+
+def report(queue: JobQueue, elapsed: float, max_listed: int = 10):
+    counts = queue.counts()
+    done = queue.jobs("done")
+    logging.info("\n🧾 Batch summary:")
+    logging.info(f"✅ Done: {counts['done']}  ❌ Failed: {counts['failed']}  ⏳ Queued: {counts['queued']}  "
+                 f"🏃 Running: {counts['running']}")
+    if elapsed and done:
+        durations = sorted(job["duration"] or 0 for job in done)
+        logging.info(f"⏱️ {elapsed / 60:.1f} min wall time, {len(done) / elapsed * 60:.1f} domains/min, "
+                     f"median {durations[len(durations) // 2]:.1f}s per domain")
+        logging.info("🐢 Slowest domains:")
+        for job in sorted(done, key=lambda job: -(job["duration"] or 0))[:max_listed]:
+            logging.info(f"  - {job['domain']}: {job['duration']:.1f}s ({job['attempts']} attempt(s))")
+    for job in queue.jobs("failed"):
+        logging.info(f"  ❌ {job['domain']} after {job['attempts']} attempt(s): {job['error']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(usage="python batch.py <domains file> [options]")
+    parser.add_argument("domains", nargs="?",
+                        help="one domain per line, or JSONL with a \"domain\" (or \"url\") field per line")
+    parser.add_argument("--resume", action="store_true", help="continue the batch in the queue without re-adding")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, metavar="N",
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--queue", default=DEFAULT_QUEUE_PATH, metavar="PATH")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, metavar="DIR",
+                        help="per-domain state, caches, diff report and log (default: batch_data)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, metavar="SECONDS",
+                        help="give up on a domain after this long (default: 2 hours)")
+    parser.add_argument("--attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, metavar="N",
+                        help="tries per domain before it is marked failed (default: 3)")
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--audit", action="store_true")
+    parser.add_argument("--crawl", action="store_true")
+    parser.add_argument("--crawl-max-pages", type=int, default=DEFAULT_MAX_PAGES, metavar="N")
+    parser.add_argument("--output", action="store_true",
+                        help="analyse every sitemap URL, written to <data-dir>/<domain>/audit.jsonl")
+    parser.add_argument("--review-limit", type=int, metavar="N",
+                        help="pages per domain sent to the AI review (0 skips it)")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    args = parser.parse_args()
+    if not args.domains and not args.resume:
+        parser.print_usage()
+        sys.exit(1)
+    configure_logging(args.log_level)
+
+    run_batch(
+        None if args.resume else read_domains(args.domains),
+        args.workers,
+        queue_path=args.queue,
+        data_dir=args.data_dir,
+        timeout=args.timeout,
+        max_attempts=args.attempts,
+        options={
+            "incremental": args.incremental,
+            "audit_rules": args.audit,
+            "crawl": args.crawl,
+            "crawl_max_pages": args.crawl_max_pages,
+            "output": args.output,
+            "review_limit": args.review_limit,
+        },
+    )
+
+# python batch.py clients.txt --workers 8 --incremental --audit
+
+# python batch.py --resume
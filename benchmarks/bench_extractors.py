@@ -0,0 +1,104 @@
+# bench_extractors.py
+"""
+Compares the analyze_seo extractor backends on pages/sec and peak RSS.
+
+    python benchmarks/bench_extractors.py --pages 2000
+    python benchmarks/bench_extractors.py --dir saved_pages/ --json results.json
+
+Each backend runs in a fresh process so peak RSS is not shared between them.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractors import BACKENDS, available_backends  # noqa: E402
+
+WORDS = "seo audit sitemap crawl link page title meta description heading content".split()
+
+
+def synthetic_page(i: int, body_paragraphs: int = 200) -> str:
+    rnd = random.Random(i)
+    para = lambda: " ".join(rnd.choice(WORDS) for _ in range(60))  # noqa: E731
+    body = "\n".join(f"<p>{para()} <a href='/p/{rnd.randint(0, 10_000)}'>link</a></p>" for _ in range(body_paragraphs))
+    return (
+        "<!DOCTYPE html><html><head>"
+        f"<title>Page {i} | Example</title>"
+        f'<meta name="description" content="Description for page {i}">'
+        "<link rel='stylesheet' href='/s.css'><script>var x = '<h1>not a heading</h1>';</script>"
+        "</head><body><nav>" + "".join(f"<a href='/n/{n}'>nav {n}</a>" for n in range(40)) + "</nav>"
+        f"<h1>Heading <b>{i}</b></h1>{body}</body></html>"
+    )
+
+
+def load_pages(args) -> list:
+    if args.dir:
+        pages = []
+        for name in sorted(os.listdir(args.dir)):
+            with open(os.path.join(args.dir, name), encoding="utf-8", errors="replace") as f:
+                pages.append(f.read())
+        return pages
+    return [synthetic_page(i) for i in range(args.pages)]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_backend(name: str, args, queue):
+    pages = load_pages(args)
+    extract = BACKENDS[name]
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for html in pages:
+            extract(html)
+    elapsed = time.perf_counter() - start
+    total = len(pages) * args.repeat
+    queue.put({
+        "backend": name,
+        "pages": total,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(total / elapsed, 1) if elapsed else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_rss_over_input_mb": round(peak_rss_mb() - baseline, 1),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000, help="synthetic pages to generate")
+    parser.add_argument("--dir", help="benchmark saved HTML files from this directory instead")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--backends", nargs="*", default=None, help="default: every installed backend")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    names = args.backends or available_backends()
+    results = []
+    for name in names:
+        queue = multiprocessing.Queue()
+        proc = multiprocessing.Process(target=run_backend, args=(name, args, queue))
+        proc.start()
+        results.append(queue.get())
+        proc.join()
+
+    print(f"{'backend':<12}{'pages/s':>12}{'peak RSS MB':>14}{'RSS over input':>16}")
+    for r in results:
+        print(f"{r['backend']:<12}{r['pages_per_sec']:>12}{r['peak_rss_mb']:>14}{r['peak_rss_over_input_mb']:>16}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+# bench_pipeline.py
+"""
+End-to-end benchmark of the pipeline and the API against a local mock of
+the web and of the Google APIs (benchmarks/mock_server.py): no network
+access, and the same sites on every run, so results compare across commits.
+
+    python benchmarks/bench_pipeline.py --pages 5000 --json before.json
+    git checkout my-branch
+    python benchmarks/bench_pipeline.py --pages 5000 --json after.json --compare before.json
+
+Scenarios (pick with --scenarios):
+
+    hunt            hunt() on every mock host: robots.txt, candidates, index walk
+    sitemap         extract_links_from_sitemap() on every sitemap hunt found
+    check_link      check_link() on every sitemap URL, through the CrawlScheduler
+    analyze_seo     analyze_seo() on the main site's pages (--audit for the full rules)
+    api             the FastAPI GSC / GA4 endpoints, served by uvicorn
+
+Each scenario runs in a fresh process, so peak RSS is its own. Throughput is
+items per second (links, URLs, pages or requests); p50 / p99 are per item.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from functools import partial
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from bench_extractors import peak_rss_mb  # noqa: E402
+from mock_server import GoogleSpec, default_sites, google_env, run_in_process  # noqa: E402
+
+SCENARIOS = ("hunt", "sitemap", "check_link", "analyze_seo", "api")
+TOKEN = "bench-token"
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def result(name: str, latencies: list, seconds: float, errors: int = 0, **extra) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "name": name,
+        "items": len(latencies),
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "items_per_sec": round(len(latencies) / seconds, 1) if seconds else None,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        **extra,
+    }
+
+
+async def timed_map(scheduler, func, urls, latencies: list):
+    """Runs `func` over `urls` with the scheduler, recording each call's latency; returns the results."""
+
+    async def timed(url):
+        t0 = time.perf_counter()
+        try:
+            return await func(url)
+        finally:
+            latencies.append(time.perf_counter() - t0)
+
+    return [checked async for _, checked in scheduler.map(timed, urls)]
+
+
+async def no_search(session, domain, max_hits=10):
+    # hunt() also asks google.com for sitemaps; the benchmark never leaves the machine.
+    return []
+
+
+async def discover(mock: dict) -> dict:
+    """Sitemaps of every mock host, for the scenarios that start from them; reset metrics afterwards."""
+    import func
+    from http_client import get_session
+
+    session = await get_session()
+    return {name: await func.hunt(site["base"], session) for name, site in mock["sites"].items()}
+
+
+async def bench_hunt(mock: dict, args) -> list:
+    import func
+    from http_client import get_session
+
+    session = await get_session()
+    latencies, found, empty = [], 0, 0
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        for site in mock["sites"].values():
+            start = time.perf_counter()
+            sitemaps = await func.hunt(site["base"], session)
+            latencies.append(time.perf_counter() - start)
+            found += len(sitemaps)
+            # Every mock site publishes a sitemap, so finding none is a failure.
+            empty += not sitemaps
+    return [result("hunt", latencies, time.perf_counter() - t0, empty, sitemaps=found)]
+
+
+async def bench_sitemap(mock: dict, args) -> list:
+    import func
+    from http_client import get_session
+    from metrics import metrics
+
+    session = await get_session()
+    sitemaps = [url for urls in (await discover(mock)).values() for url in urls]
+    latencies, urls, empty = [], 0, 0
+    metrics.reset()
+    t0 = time.perf_counter()
+    for _ in range(args.repeat):
+        for sitemap in sitemaps:
+            start = time.perf_counter()
+            links = await func.extract_links_from_sitemap(sitemap, session)
+            latencies.append(time.perf_counter() - start)
+            urls += len(links)
+            empty += not links
+    seconds = time.perf_counter() - t0
+    rows = [result("sitemap", latencies, seconds, empty, sitemaps=len(sitemaps))]
+    rows.append({"name": "sitemap_urls", "items": urls, "seconds": round(seconds, 3),
+                 "items_per_sec": round(urls / seconds, 1) if seconds else None})
+    return rows
+
+
+async def bench_check_link(mock: dict, args) -> list:
+    import func
+    from http_client import get_session
+    from metrics import metrics
+    from scheduler import CrawlScheduler
+
+    session = await get_session()
+    urls = []
+    for sitemaps in (await discover(mock)).values():
+        for sitemap in sitemaps:
+            urls += await func.extract_links_from_sitemap(sitemap, session)
+    latencies = []
+    metrics.reset()
+    t0 = time.perf_counter()
+    scheduler = CrawlScheduler(crawl_delays=func.CRAWL_DELAYS)
+    verdicts = await timed_map(scheduler, partial(func.check_link, session), urls, latencies)
+    broken = sum(1 for verdict in verdicts if verdict is False)
+    errors = sum(1 for verdict in verdicts if isinstance(verdict, Exception))
+    expected = sum(site["broken"] for site in mock["sites"].values())
+    return [result("check_link", latencies, time.perf_counter() - t0, errors, broken=broken, expected_broken=expected)]
+
+
+async def bench_analyze_seo(mock: dict, args) -> list:
+    import func
+    from http_client import get_session
+    from parse_pool import ParsePool
+    from scheduler import CrawlScheduler
+
+    session = await get_session()
+    site = mock["sites"]["site"]
+    urls = [f"{site['base']}/p/{i}" for i in range(site["pages"])]
+    pool = ParsePool(workers=args.parse_workers, audit=args.audit) if args.parse_workers else None
+    analyze = partial(func.analyze_seo, session, parse_pool=pool, audit=args.audit)
+    latencies = []
+    t0 = time.perf_counter()
+    try:
+        pages = await timed_map(CrawlScheduler(crawl_delays=func.CRAWL_DELAYS), analyze, urls, latencies)
+    finally:
+        if pool:
+            await pool.close()
+    failed = sum(1 for page in pages if not page or not isinstance(page, dict) or "error" in page)
+    return [result("analyze_seo", latencies, time.perf_counter() - t0, failed)]
+
+
+async def bench_api(mock: dict, args) -> list:
+    import aiohttp
+    import uvicorn
+
+    from google_console_analytics import app
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    base = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning", access_log=False, lifespan="on"))
+    serving = asyncio.create_task(server.serve(sockets=[sock]))
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+    rows = []
+    async with aiohttp.ClientSession(base, headers=headers) as client:
+
+        async def run(name, calls, concurrency=args.api_concurrency, measure_rows=False):
+            """`calls` are (method, path, params, body); each call's latency is one item."""
+            latencies, errors, received = [], 0, 0
+            pending = iter(calls)
+
+            async def worker():
+                nonlocal errors, received
+                for method, path, params, body in pending:
+                    start = time.perf_counter()
+                    async with client.request(method, path, params=params, json=body) as resp:
+                        payload = await resp.read()
+                    latencies.append(time.perf_counter() - start)
+                    if resp.status != 200:
+                        errors += 1
+                    if measure_rows:
+                        received += payload.count(b"\n")
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            seconds = time.perf_counter() - t0
+            extra = {"rows": received, "rows_per_sec": round(received / seconds, 1)} if measure_rows else {}
+            rows.append(result(name, latencies, seconds, errors, **extra))
+
+        n = args.api_requests
+        performance = [
+            ("GET", "/gsc/performance", {"site": f"https://site{i}.example/", "dimensions": "query"}, None)
+            for i in range(n)
+        ]
+        # Distinct sites miss the response cache; the same requests again are served from it.
+        await run("api_gsc_performance", performance)
+        await run("api_gsc_performance_cached", performance)
+        await run("api_ga4_report", [
+            ("GET", "/ga4/report", {"property_id": str(1000 + i), "metrics": "sessions", "dimensions": "date"}, None)
+            for i in range(n)
+        ])
+        reports = [{"metrics": ["sessions"], "dimensions": [d]} for d in ("date", "country", "deviceCategory")]
+        await run("api_ga4_batch", [
+            ("POST", "/ga4/batch", None, {"property_ids": [str(1000 + p) for p in range(i, i + 10)], "reports": reports})
+            for i in range(0, n, 10)
+        ])
+        await run("api_gsc_export", [
+            ("GET", "/gsc/export", {"site": "https://export.example/", "start_date": "2024-01-01",
+                                    "end_date": f"2024-01-{args.export_days:02d}"}, None)
+        ], concurrency=1, measure_rows=True)
+        await run("api_metrics", [("GET", "/metrics", None, None)] * 20, concurrency=1)
+
+    server.should_exit = True
+    await serving
+    return rows
+
+
+BENCHES = {
+    "hunt": bench_hunt,
+    "sitemap": bench_sitemap,
+    "check_link": bench_check_link,
+    "analyze_seo": bench_analyze_seo,
+    "api": bench_api,
+}
+
+
+def run_scenario(name: str, mock: dict, args, queue):
+    # Before any project import: google_api reads its base URLs at import time.
+    os.environ.update(google_env(mock["google"]))
+    os.environ.setdefault("CLIENT_ID", "bench")
+    os.environ.setdefault("CLIENT_SECRET", "bench")
+    # Live Google calls only: no local warehouse in between.
+    os.environ["SEO_WAREHOUSE"] = ""
+    os.environ.pop("RESPONSE_CACHE_REDIS_URL", None)
+
+    import func
+    from http_client import close_session
+    from log_config import configure_logging, stop_logging
+    from metrics import metrics
+
+    func.google_search = no_search
+    devnull = open(os.devnull, "w")
+    configure_logging(args.log_level, stream=None if args.verbose else devnull)
+
+    async def bench():
+        try:
+            return await BENCHES[name](mock, args)
+        finally:
+            await close_session()
+
+    baseline = peak_rss_mb()
+    rows = asyncio.run(bench())
+    stop_logging()
+    stages = metrics.summary()["stages"]
+    for row in rows:
+        row["peak_rss_mb"] = round(peak_rss_mb(), 1)
+        row["peak_rss_over_start_mb"] = round(peak_rss_mb() - baseline, 1)
+    # Where the time went, from the instrumentation in metrics.py.
+    rows[0]["stages"] = {
+        stage: {key: h[key] for key in ("count", "total_s", "p50_ms", "p99_ms")} for stage, h in stages.items()
+    }
+    queue.put(rows)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: list, path: str):
+    with open(path) as f:
+        before = {row["name"]: row for row in json.load(f)["results"]}
+    print(f"\nvs {path}:")
+    print(f"{'name':<28}{'items/s':>12}{'p99 ms':>12}{'peak RSS':>12}")
+    for row in results:
+        old = before.get(row["name"])
+        if not old:
+            continue
+
+        def change(key, ref=old):
+            if not row.get(key) or not ref.get(key):
+                return "-"
+            return f"{(row[key] - ref[key]) / ref[key] * 100:+.1f}%"
+
+        print(f"{row['name']:<28}{change('items_per_sec'):>12}{change('p99_ms'):>12}{change('peak_rss_mb'):>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=2000, help="pages on the main mock site (others get a tenth)")
+    parser.add_argument("--sitemap-depth", type=int, default=2, help="levels of sitemap indexes on the main site")
+    parser.add_argument("--gzip", action="store_true", help="gzip the main site's sitemaps")
+    parser.add_argument("--slow-latency", type=float, default=0.05, metavar="SECONDS",
+                        help="delay of every response from the slow host (default: 0.05)")
+    parser.add_argument("--scenarios", nargs="*", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=3, help="passes for hunt and sitemap")
+    parser.add_argument("--audit", action="store_true", help="run the full seo_rules audit in analyze_seo")
+    parser.add_argument("--parse-workers", type=int, default=0, metavar="N")
+    parser.add_argument("--api-requests", type=int, default=200, metavar="N", help="requests per API endpoint")
+    parser.add_argument("--api-concurrency", type=int, default=20, metavar="N")
+    parser.add_argument("--export-days", type=int, default=7, help="days in the /gsc/export run (max 31)")
+    parser.add_argument("--gsc-rows", type=int, default=1000, metavar="N", help="mock GSC rows per day")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's log instead of discarding it")
+    parser.add_argument("--json", metavar="PATH", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="print the change against an earlier --json file")
+    args = parser.parse_args()
+
+    sites = default_sites(args.pages, args.sitemap_depth, args.gzip, args.slow_latency)
+    server, mock = run_in_process(sites, GoogleSpec(gsc_rows_per_day=args.gsc_rows))
+    context = multiprocessing.get_context("spawn")
+    results = []
+    try:
+        for name in args.scenarios:
+            queue = context.Queue()
+            proc = context.Process(target=run_scenario, args=(name, mock, args, queue))
+            proc.start()
+            results += queue.get()
+            proc.join()
+    finally:
+        server.terminate()
+        server.join()
+
+    print(f"{'name':<28}{'items':>8}{'items/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'peak RSS MB':>13}")
+    for r in results:
+        print(f"{r['name']:<28}{r['items']:>8}{r.get('items_per_sec') or '-':>12}{r.get('p50_ms', '-'):>10}"
+              f"{r.get('p99_ms', '-'):>10}{r.get('errors', '-'):>8}{r.get('peak_rss_mb', '-'):>13}")
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.json:
+        meta = {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": vars(args),
+        }
+        with open(args.json, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
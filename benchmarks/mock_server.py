@@ -0,0 +1,437 @@
+# mock_server.py
+"""
+Local stand-in for the websites and Google APIs the pipeline talks to, so
+benchmarks run without the internet and give the same answers every time.
+
+    python benchmarks/mock_server.py --pages 5000 --sitemap-depth 2 --gzip
+
+Every synthetic site is an aiohttp app on its own 127.0.0.1 port, so the
+pipeline sees separate hosts (per-host limits, HEAD learning) for:
+
+    site     the main site: robots.txt, a sitemap index tree, HTML pages
+    slow     every response delayed by --slow-latency
+    errors   a share of pages answer 404, 500 or 503 (with Retry-After: 0)
+    nohead   HEAD is rejected with 405, so link checks fall back to GET
+
+A further port serves the Search Console and GA4 endpoints the API uses;
+point the clients at it with the SEO_GSC_BASE, SEO_GA4_DATA_BASE and
+SEO_GA4_ADMIN_BASE variables listed in `google_env`.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import math
+import multiprocessing
+import random
+import zlib
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+WORDS = "seo audit sitemap crawl link page title meta description heading content".split()
+PARAGRAPHS = 64                 # distinct paragraphs pages are assembled from
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+ERROR_STATUSES = (404, 500, 503)
+
+
+@dataclass
+class SiteSpec:
+    """Shape of one synthetic site."""
+
+    name: str
+    pages: int = 1000
+    sitemap_depth: int = 1          # 0: a single urlset; n: n levels of sitemap indexes above the urlsets
+    urls_per_sitemap: int = 500
+    gzip: bool = False              # serve the urlsets as .xml.gz
+    latency: float = 0.0            # seconds added to every response
+    error_rate: float = 0.0         # share of pages answering with one of ERROR_STATUSES
+    redirect_rate: float = 0.0      # share of pages behind a 301
+    reject_head: bool = False       # HEAD answers 405
+    links_per_page: int = 20
+    paragraphs: int = 20
+
+
+@dataclass
+class GoogleSpec:
+    """Size of the mocked Search Console and GA4 answers."""
+
+    latency: float = 0.0
+    gsc_rows_per_day: int = 1000
+    ga4_rows: int = 30
+    properties: int = 20
+    throttle_every: int = 0         # answer every n-th call with 429 (Retry-After: 0); 0 never
+
+
+def default_sites(pages: int, sitemap_depth: int = 1, use_gzip: bool = False, slow_latency: float = 0.05) -> List[SiteSpec]:
+    """The main site plus the small slow, failing and HEAD-rejecting hosts."""
+    small = max(10, pages // 10)
+    return [
+        SiteSpec("site", pages, sitemap_depth=sitemap_depth, gzip=use_gzip, redirect_rate=0.02),
+        SiteSpec("slow", small, sitemap_depth=0, latency=slow_latency),
+        SiteSpec("errors", small, sitemap_depth=0, error_rate=0.3),
+        SiteSpec("nohead", small, sitemap_depth=0, reject_head=True),
+    ]
+
+
+def _fraction(i: int, salt: int) -> float:
+    """Deterministic value in [0, 1) per page, so every run fails the same pages."""
+    return (zlib.crc32(f"{salt}:{i}".encode()) & 0xFFFF) / 0x10000
+
+
+class SyntheticSite:
+    def __init__(self, spec: SiteSpec):
+        self.spec = spec
+        self.base = ""          # set once the port is known
+        rnd = random.Random(spec.name)
+        self._paragraphs = [" ".join(rnd.choice(WORDS) for _ in range(60)) for _ in range(PARAGRAPHS)]
+        self._sitemaps: Dict[str, bytes] = {}
+
+    def page_status(self, i: int) -> int:
+        if _fraction(i, 1) < self.spec.error_rate:
+            return ERROR_STATUSES[i % len(ERROR_STATUSES)]
+        if _fraction(i, 2) < self.spec.redirect_rate:
+            return 301
+        return 200
+
+    def page_html(self, i: int) -> str:
+        spec = self.spec
+        links = "".join(
+            f"<li><a href='/p/{(i * 7 + k * 13 + 1) % spec.pages}'>Related {k}</a></li>"
+            for k in range(spec.links_per_page)
+        )
+        body = "\n".join(
+            f"<p>{self._paragraphs[(i + n) % PARAGRAPHS]}</p>" for n in range(spec.paragraphs)
+        )
+        # Every 50th page reuses its neighbour's title, so duplicate detection has something to find.
+        title = f"Page {i - 1 if i % 50 == 1 else i} | {spec.name}"
+        return (
+            "<!DOCTYPE html><html lang='en'><head>"
+            f"<title>{title}</title>"
+            f'<meta name="description" content="Synthetic page {i} of {spec.name}">'
+            f"<link rel='canonical' href='{self.base}/p/{i}'>"
+            "</head><body><nav><a href='/'>Home</a></nav>"
+            f"<h1>Page {i}</h1><h2>Section</h2>{body}<ul>{links}</ul></body></html>"
+        )
+
+    def build_sitemaps(self):
+        """Urlsets of `urls_per_sitemap` pages under `sitemap_depth` levels of indexes."""
+        spec, base = self.spec, self.base
+        suffix = ".xml.gz" if spec.gzip else ".xml"
+        per = max(1, spec.urls_per_sitemap)
+        leaves = []
+        for n, start in enumerate(range(0, spec.pages, per)):
+            path = f"/sitemaps/urls-{n}{suffix}"
+            lastmod = date(2024, 1, 1) + timedelta(days=n % 365)
+            urls = "".join(
+                f"<url><loc>{base}/p/{i}</loc><lastmod>{lastmod}</lastmod></url>"
+                for i in range(start, min(start + per, spec.pages))
+            )
+            xml = f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{SITEMAP_NS}">{urls}</urlset>'.encode()
+            self._sitemaps[path] = gzip.compress(xml) if spec.gzip else xml
+            leaves.append(path)
+
+        if spec.sitemap_depth <= 0:
+            # A single urlset at the conventional location.
+            self._sitemaps["/sitemap.xml"] = self._sitemaps.pop(leaves[0]) if len(leaves) == 1 else self._index(leaves)
+            return
+        fanout = max(2, math.ceil(len(leaves) ** (1 / spec.sitemap_depth)))
+        level = leaves
+        for depth in range(spec.sitemap_depth - 1):
+            parents = []
+            for n in range(0, len(level), fanout):
+                path = f"/sitemaps/index-{depth}-{n // fanout}.xml"
+                self._sitemaps[path] = self._index(level[n:n + fanout])
+                parents.append(path)
+            level = parents
+        self._sitemaps["/sitemap_index.xml"] = self._index(level)
+
+    def _index(self, paths: List[str]) -> bytes:
+        entries = "".join(f"<sitemap><loc>{self.base}{path}</loc></sitemap>" for path in paths)
+        return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="{SITEMAP_NS}">{entries}</sitemapindex>'.encode()
+
+    @property
+    def root_sitemap(self) -> str:
+        return "/sitemap.xml" if "/sitemap.xml" in self._sitemaps else "/sitemap_index.xml"
+
+    def page_urls(self) -> List[str]:
+        return [f"{self.base}/p/{i}" for i in range(self.spec.pages)]
+
+    async def _delay(self):
+        if self.spec.latency:
+            await asyncio.sleep(self.spec.latency)
+
+    async def robots(self, request: web.Request) -> web.Response:
+        await self._delay()
+        text = f"User-agent: *\nAllow: /\n\nSitemap: {self.base}{self.root_sitemap}\n"
+        # Like most servers, no charset: `text=` would always add "; charset=utf-8".
+        return web.Response(body=text.encode(), headers={"Content-Type": "text/plain"})
+
+    async def sitemap(self, request: web.Request) -> web.Response:
+        await self._delay()
+        body = self._sitemaps.get(request.path)
+        if body is None:
+            raise web.HTTPNotFound()
+        content_type = "application/x-gzip" if request.path.endswith(".gz") else "application/xml"
+        return web.Response(body=body, content_type=content_type)
+
+    async def home(self, request: web.Request) -> web.Response:
+        await self._delay()
+        links = "".join(f"<a href='/p/{i}'>Page {i}</a>" for i in range(min(self.spec.pages, 100)))
+        html = f"<!DOCTYPE html><html><head><title>{self.spec.name}</title></head><body><h1>Home</h1>{links}</body></html>"
+        return web.Response(body=html.encode(), headers={"Content-Type": "text/html"})
+
+    async def page(self, request: web.Request) -> web.Response:
+        await self._delay()
+        try:
+            i = int(request.match_info["page"])
+        except ValueError:
+            raise web.HTTPNotFound()
+        if not 0 <= i < self.spec.pages:
+            raise web.HTTPNotFound()
+        status = self.page_status(i)
+        if status == 301 and not request.path.endswith("/"):
+            raise web.HTTPMovedPermanently(f"/p/{i}/")
+        if status >= 400:
+            headers = {"Retry-After": "0"} if status == 503 else None
+            return web.Response(status=status, text="error", headers=headers)
+        if request.method == "HEAD":
+            return web.Response(content_type="text/html")
+        if request.headers.get("Range") == "bytes=0-0":
+            return web.Response(status=206, body=b"<", content_type="text/html",
+                                headers={"Content-Range": "bytes 0-0/*"})
+        # Odd pages omit the charset, so both decoding paths are exercised.
+        content_type = "text/html" if i % 2 else "text/html; charset=utf-8"
+        return web.Response(body=self.page_html(i).encode(), headers={"Content-Type": content_type})
+
+    async def reject_head(self, request: web.Request) -> web.Response:
+        await self._delay()
+        return web.Response(status=405, headers={"Allow": "GET"})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        allow_head = not self.spec.reject_head
+        app.router.add_get("/", self.home, allow_head=allow_head)
+        app.router.add_get("/robots.txt", self.robots, allow_head=allow_head)
+        app.router.add_get("/sitemap.xml", self.sitemap, allow_head=allow_head)
+        app.router.add_get("/sitemap_index.xml", self.sitemap, allow_head=allow_head)
+        app.router.add_get("/sitemaps/{name}", self.sitemap, allow_head=allow_head)
+        app.router.add_get("/p/{page}", self.page, allow_head=allow_head)
+        app.router.add_get("/p/{page}/", self.page, allow_head=allow_head)
+        if self.spec.reject_head:
+            app.router.add_route("HEAD", "/{tail:.*}", self.reject_head)
+        return app
+
+
+class MockGoogle:
+    """searchAnalytics.query, sites, runReport, batchRunReports, metadata and accountSummaries."""
+
+    def __init__(self, spec: GoogleSpec):
+        self.spec = spec
+        self.calls = 0
+
+    async def _begin(self) -> Optional[web.Response]:
+        self.calls += 1
+        if self.spec.latency:
+            await asyncio.sleep(self.spec.latency)
+        if self.spec.throttle_every and self.calls % self.spec.throttle_every == 0:
+            return web.json_response({"error": {"code": 429, "message": "Quota exceeded"}}, status=429,
+                                     headers={"Retry-After": "0"})
+        return None
+
+    async def gsc_sites(self, request: web.Request) -> web.Response:
+        throttled = await self._begin()
+        if throttled:
+            return throttled
+        sites = [{"siteUrl": f"https://site{n}.example/", "permissionLevel": "siteOwner"} for n in range(5)]
+        return web.json_response({"siteEntry": sites})
+
+    async def gsc_site(self, request: web.Request) -> web.Response:
+        throttled = await self._begin()
+        if throttled:
+            return throttled
+        return web.json_response({"siteUrl": request.match_info["site"], "permissionLevel": "siteOwner"})
+
+    async def gsc_query(self, request: web.Request) -> web.Response:
+        throttled = await self._begin()
+        if throttled:
+            return throttled
+        body = await request.json()
+        start, end = date.fromisoformat(body["startDate"]), date.fromisoformat(body["endDate"])
+        days = (end - start).days + 1
+        total = self.spec.gsc_rows_per_day * days
+        first = body.get("startRow", 0)
+        count = max(0, min(body.get("rowLimit", 1000), total - first))
+        dimensions = body.get("dimensions", [])
+        rows = []
+        for n in range(first, first + count):
+            keys = []
+            for dimension in dimensions:
+                if dimension == "date":
+                    keys.append(str(start + timedelta(days=n % days)))
+                elif dimension == "device":
+                    keys.append(("DESKTOP", "MOBILE", "TABLET")[n % 3])
+                elif dimension == "country":
+                    keys.append(("usa", "gbr", "deu", "ind")[n % 4])
+                else:
+                    keys.append(f"{dimension} {n}")
+            clicks = n % 97
+            impressions = clicks * 10 + 5
+            rows.append({"keys": keys, "clicks": clicks, "impressions": impressions,
+                         "ctr": clicks / impressions, "position": 1 + n % 40})
+        return web.json_response({"rows": rows, "responseAggregationType": "byPage"} if rows else {})
+
+    def _report(self, body: dict) -> dict:
+        dimensions = [d["name"] for d in body.get("dimensions", [])]
+        metrics = [m["name"] for m in body.get("metrics", [])]
+        rows = [
+            {
+                "dimensionValues": [{"value": f"{name}-{n}"} for name in dimensions],
+                "metricValues": [{"value": str((n * 31 + k) % 1000)} for k in range(len(metrics))],
+            }
+            for n in range(self.spec.ga4_rows)
+        ]
+        return {
+            "dimensionHeaders": [{"name": name} for name in dimensions],
+            "metricHeaders": [{"name": name, "type": "TYPE_INTEGER"} for name in metrics],
+            "rows": rows,
+            "rowCount": len(rows),
+        }
+
+    async def ga4_property(self, request: web.Request) -> web.Response:
+        throttled = await self._begin()
+        if throttled:
+            return throttled
+        _, _, call = request.match_info["call"].partition(":")
+        body = await request.json() if request.can_read_body else {}
+        if call == "runReport":
+            return web.json_response(self._report(body))
+        if call == "batchRunReports":
+            return web.json_response({"reports": [self._report(r) for r in body.get("requests", [])]})
+        raise web.HTTPNotFound()
+
+    async def ga4_metadata(self, request: web.Request) -> web.Response:
+        throttled = await self._begin()
+        if throttled:
+            return throttled
+        return web.json_response({"name": f"properties/{request.match_info['property']}/metadata"})
+
+    async def account_summaries(self, request: web.Request) -> web.Response:
+        throttled = await self._begin()
+        if throttled:
+            return throttled
+        properties = [{"property": f"properties/{1000 + n}", "displayName": f"Property {n}"}
+                      for n in range(self.spec.properties)]
+        return web.json_response({"accountSummaries": [{"account": "accounts/1", "propertySummaries": properties}]})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/gsc/sites", self.gsc_sites)
+        app.router.add_get("/gsc/sites/{site}", self.gsc_site)
+        app.router.add_post("/gsc/sites/{site}/searchAnalytics/query", self.gsc_query)
+        app.router.add_get("/ga4data/properties/{property}/metadata", self.ga4_metadata)
+        app.router.add_post("/ga4data/properties/{call}", self.ga4_property)
+        app.router.add_get("/ga4admin/accountSummaries", self.account_summaries)
+        return app
+
+
+def google_env(base: str) -> Dict[str, str]:
+    """Environment that points google_api at a MockGoogle served at `base`."""
+    return {
+        "SEO_GSC_BASE": f"{base}/gsc",
+        "SEO_GA4_DATA_BASE": f"{base}/ga4data",
+        "SEO_GA4_ADMIN_BASE": f"{base}/ga4admin",
+    }
+
+
+async def _serve(app: web.Application, host: str) -> Tuple[web.AppRunner, str]:
+    # Quiet access log: it would cost the server more than the responses.
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://{host}:{port}"
+
+
+async def start(sites: List[SiteSpec], google: GoogleSpec, host: str = "127.0.0.1") -> Tuple[list, dict]:
+    """
+    Serves every site and the Google mock; returns the runners and a
+    description: {"sites": {name: {"base", "sitemap", "pages", ...}}, "google": base}.
+    """
+    runners = []
+    described = {"sites": {}, "google": None}
+    for spec in sites:
+        site = SyntheticSite(spec)
+        runner, site.base = await _serve(site.app(), host)
+        # Sitemaps embed absolute URLs, so they are built once the port is known.
+        site.build_sitemaps()
+        runners.append(runner)
+        described["sites"][spec.name] = {
+            **asdict(spec),
+            "base": site.base,
+            "sitemap": site.base + site.root_sitemap,
+            "broken": sum(1 for i in range(spec.pages) if site.page_status(i) >= 400),
+        }
+    runner, described["google"] = await _serve(MockGoogle(google).app(), host)
+    runners.append(runner)
+    return runners, described
+
+
+def _run(sites: List[SiteSpec], google: GoogleSpec, ready, host: str):
+    async def serve():
+        runners, described = await start(sites, google, host)
+        ready.put(described)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            for runner in runners:
+                await runner.cleanup()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+def run_in_process(sites: List[SiteSpec], google: Optional[GoogleSpec] = None, host: str = "127.0.0.1"):
+    """
+    Starts the mock in its own process, so serving does not compete with the
+    code being measured for the event loop. Returns (process, description);
+    terminate the process when done.
+    """
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    process = context.Process(target=_run, args=(sites, google or GoogleSpec(), ready, host),
+                              name="mock-server", daemon=True)
+    process.start()
+    return process, ready.get(timeout=120)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000, help="pages on the main site (the others get a tenth)")
+    parser.add_argument("--sitemap-depth", type=int, default=1, help="levels of sitemap indexes (0: one urlset)")
+    parser.add_argument("--gzip", action="store_true", help="serve the main site's urlsets gzipped")
+    parser.add_argument("--slow-latency", type=float, default=0.05, metavar="SECONDS")
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+
+    sites = default_sites(args.pages, args.sitemap_depth, args.gzip, args.slow_latency)
+
+    async def serve():
+        runners, described = await start(sites, GoogleSpec(), args.host)
+        print(json.dumps(described, indent=2))
+        print("Environment for the API:", " ".join(f"{k}={v}" for k, v in google_env(described["google"]).items()))
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# broken_link.py
+import asyncio
+import email.utils
+import heapq
+import logging
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+from urllib.parse import urlparse
+
+import aiohttp
+
+from http_client import ssl_context
+from metrics import metrics
+
+BROWSER_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Connection": "keep-alive"
+}
+
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=10)
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 0.5          # seconds; doubled per attempt, with full jitter
+BACKOFF_MAX = 30.0
+RETRY_AFTER_MAX = 120.0     # never wait longer than this for a Retry-After
+RETRY_STATUSES = {429, 503}
+HEAD_REJECTIONS_TO_LEARN = 2  # HEAD failures rescued by GET before a host is GET-only
+MAX_REDIRECTS = 10
+
+
+@dataclass
+class LinkResult:
+    url: str
+    ok: Optional[bool]          # True: fine, False: broken, None: blocked / needs auth
+    status: Optional[int] = None
+    method: str = "HEAD"
+    final_url: Optional[str] = None
+    redirects: List[Tuple[int, str]] = field(default_factory=list)  # (status, url) per hop
+    attempts: int = 0
+    error: Optional[str] = None
+
+    @property
+    def hops(self) -> int:
+        return len(self.redirects)
+
+
+def classify(url: str, status: int) -> Optional[bool]:
+    if status == 999:
+        return None  # LinkedIn's anti-bot status
+    if status in (401, 403):
+        return None
+    if status == 400 and ("facebook.com" in url or "twitter.com" in url):
+        return None
+    return status < 400
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parses Retry-After as delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def backoff_delay(attempt: int) -> float:
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class LinkChecker:
+    """
+    Verifies links with as few requests as possible.
+
+    HEAD is tried first. When a host answers HEAD with an error, a ranged
+    GET (`Range: bytes=0-0`) double-checks before anything is reported broken.
+    Hosts where that GET keeps succeeding are remembered, and later URLs on
+    them skip HEAD. 429/503 responses are retried after their Retry-After;
+    timeouts and connection errors are retried with jittered exponential
+    backoff.
+    """
+
+    def __init__(self, max_attempts: int = MAX_ATTEMPTS, headers: Optional[dict] = None):
+        self.max_attempts = max_attempts
+        self.headers = headers or BROWSER_HEADERS
+        self.head_rejecting_hosts = set()
+        self._head_rescues = Counter()
+
+    async def _request(self, session, method: str, url: str) -> Tuple[int, str, list, Optional[str]]:
+        headers = self.headers
+        if method == "GET":
+            headers = {**headers, "Range": "bytes=0-0"}
+        async with session.request(
+            method, url, headers=headers, allow_redirects=True, max_redirects=MAX_REDIRECTS,
+            timeout=REQUEST_TIMEOUT, ssl=ssl_context,
+        ) as resp:
+            # The body is never read; for a GET the connection is simply released.
+            chain = [(r.status, str(r.url)) for r in resp.history]
+            return resp.status, str(resp.url), chain, resp.headers.get("Retry-After")
+
+    async def check(self, session: aiohttp.ClientSession, url: str) -> LinkResult:
+        host = urlparse(url).netloc.lower()
+        method = "GET" if host in self.head_rejecting_hosts else "HEAD"
+        result = LinkResult(url=url, ok=False, method=method)
+
+        while result.attempts < self.max_attempts:
+            result.attempts += 1
+            try:
+                status, final_url, chain, retry_after = await self._request(session, result.method, url)
+            except aiohttp.TooManyRedirects as e:
+                result.error = f"Too many redirects ({len(e.history)})"
+                result.redirects = [(r.status, str(r.url)) for r in e.history]
+                result.ok = False
+                return result
+            except aiohttp.ClientResponseError as e:
+                result.status, result.error, result.ok = e.status, str(e), False
+                return result
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                result.error = "Timeout" if isinstance(e, asyncio.TimeoutError) else str(e) or type(e).__name__
+                if result.attempts < self.max_attempts:
+                    await asyncio.sleep(backoff_delay(result.attempts))
+                continue
+
+            result.status, result.final_url, result.redirects, result.error = status, final_url, chain, None
+
+            if status in RETRY_STATUSES and result.attempts < self.max_attempts:
+                wait = retry_after_seconds(retry_after)
+                await asyncio.sleep(min(wait, RETRY_AFTER_MAX) if wait is not None else backoff_delay(result.attempts))
+                continue
+
+            if status >= 400 and result.method == "HEAD" and status not in RETRY_STATUSES:
+                # Many servers mishandle HEAD; confirm with a one-byte GET before reporting.
+                result.method = "GET"
+                result.attempts -= 1  # the fallback is not a retry
+                continue
+
+            if result.method == "GET" and method == "HEAD" and status < 400:
+                self._head_rescues[host] += 1
+                if self._head_rescues[host] >= HEAD_REJECTIONS_TO_LEARN:
+                    self.head_rejecting_hosts.add(host)
+
+            # 416: the resource exists but is empty, so even byte 0 is out of range.
+            result.ok = True if status == 416 and result.method == "GET" else classify(url, status)
+            return result
+
+        result.ok = False if result.status is None else classify(url, result.status)
+        return result
+
+
+class RedirectReport:
+    """Collects redirected links so chains can be shortened to a single hop."""
+
+    def __init__(self, long_chain: int = 2, max_listed: int = 20):
+        self.long_chain = long_chain
+        self.max_listed = max_listed
+        self.redirected = 0
+        self.hop_counts = Counter()
+        # Only the `max_listed` longest chains are kept, in a min-heap on hop count.
+        self.long_chain_count = 0
+        self._long_chains: List[Tuple[int, int, LinkResult]] = []
+        self.head_fallbacks = 0
+
+    def add(self, result: LinkResult):
+        if result.method == "GET":
+            self.head_fallbacks += 1
+        if not result.hops:
+            return
+        self.redirected += 1
+        self.hop_counts[result.hops] += 1
+        if result.hops >= self.long_chain:
+            self.long_chain_count += 1
+            # The negated count keeps the first seen of equally long chains.
+            entry = (result.hops, -self.long_chain_count, result)
+            if len(self._long_chains) < self.max_listed:
+                heapq.heappush(self._long_chains, entry)
+            elif entry[:2] > self._long_chains[0][:2]:
+                heapq.heapreplace(self._long_chains, entry)
+
+    @property
+    def long_chains(self) -> List[LinkResult]:
+        """The longest chains seen, longest first."""
+        return [result for *_, result in sorted(self._long_chains, key=lambda e: e[:2], reverse=True)]
+
+    def report(self):
+        if self.head_fallbacks:
+            logging.info(f"🔁 Checked with ranged GET after HEAD was rejected: {self.head_fallbacks}")
+        if not self.redirected:
+            return
+        hops = ", ".join(f"{n} hop(s): {c}" for n, c in sorted(self.hop_counts.items()))
+        logging.info(f"↪️ Redirected links: {self.redirected} ({hops})")
+        if self.long_chain_count:
+            logging.info(f"⛓️ Chains of {self.long_chain} or more hops: {self.long_chain_count}")
+        for result in self.long_chains:
+            chain = " → ".join(f"{url} [{status}]" for status, url in result.redirects)
+            logging.info(f"  - {chain} → {result.final_url} [{result.status}]")
+
+
+_default_checker = LinkChecker()
+
+
+async def verify_link(session: aiohttp.ClientSession, url: str) -> LinkResult:
+    """Checks a link with the process-wide checker, which remembers HEAD-rejecting hosts."""
+    host = urlparse(url).hostname
+    with metrics.track("check_link", host):
+        result = await _default_checker.check(session, url)
+    if result.ok is False:
+        metrics.count("broken_links", host=host)
+    return result
@@ -0,0 +1,253 @@
+# crawl_state.py
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+DEFAULT_STATE_PATH = "crawl_state.sqlite"
+DEFAULT_STALE_AFTER = 7 * 24 * 3600   # re-check unchanged URLs weekly
+COMMIT_EVERY = 500
+
+SEO_FIELDS = ("title", "description", "h1")
+
+
+def link_status(result) -> str:
+    """Maps check_link's True / False / None to a stored status."""
+    if result is True:
+        return "ok"
+    if result is False:
+        return "broken"
+    return "blocked"
+
+
+def _domain_filter(domain_prefix: Optional[str]) -> Tuple[str, tuple]:
+    """An SQL condition (and its parameters) limiting `pages` to one site."""
+    if not domain_prefix:
+        return "", ()
+    return " AND url LIKE ?", (domain_prefix.rstrip("/") + "/%",)
+
+
+@dataclass
+class CrawlDiff:
+    new_urls: int = 0
+    newly_broken: List[str] = field(default_factory=list)
+    fixed: List[str] = field(default_factory=list)
+    # (url, old value, new value)
+    title_changed: List[Tuple[str, str, str]] = field(default_factory=list)
+    description_changed: List[Tuple[str, str, str]] = field(default_factory=list)
+    h1_changed: List[Tuple[str, str, str]] = field(default_factory=list)
+    content_changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {
+            "new_urls": self.new_urls,
+            "newly_broken": self.newly_broken,
+            "fixed": self.fixed,
+            "title_changed": [{"url": u, "old": o, "new": n} for u, o, n in self.title_changed],
+            "description_changed": [{"url": u, "old": o, "new": n} for u, o, n in self.description_changed],
+            "h1_changed": [{"url": u, "old": o, "new": n} for u, o, n in self.h1_changed],
+            "content_changed": self.content_changed,
+            "removed": self.removed,
+        }
+
+    def summary(self) -> str:
+        lines = [
+            f"🆕 New URLs: {self.new_urls}",
+            f"❌ Newly broken: {len(self.newly_broken)}",
+            *(f"  - {u}" for u in self.newly_broken),
+            f"✅ Fixed: {len(self.fixed)}",
+            *(f"  - {u}" for u in self.fixed),
+            f"✏️ Title changed: {len(self.title_changed)}",
+            *(f"  - {u}: {o!r} → {n!r}" for u, o, n in self.title_changed),
+            f"✏️ Description changed: {len(self.description_changed)}",
+            f"✏️ H1 changed: {len(self.h1_changed)}",
+            f"📝 Content changed: {len(self.content_changed)}",
+            f"🗑️ Removed from sitemaps: {len(self.removed)}",
+        ]
+        return "\n".join(lines)
+
+
+class CrawlState:
+    """
+    Per-URL results of previous audits, kept in SQLite.
+
+    Stores the last link status, the SEO fields, a hash of the page content and
+    the sitemap lastmod, and builds a CrawlDiff against the previous run as new
+    results are recorded.
+    """
+
+    def __init__(self, path: str = DEFAULT_STATE_PATH, stale_after: float = DEFAULT_STALE_AFTER):
+        self.stale_after = stale_after
+        self.run_started = time.time()
+        self.diff = CrawlDiff()
+        self._pending = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                status TEXT,
+                title TEXT,
+                description TEXT,
+                h1 TEXT,
+                content_hash TEXT,
+                lastmod TEXT,
+                checked_at REAL,
+                analyzed_at REAL,
+                last_seen REAL NOT NULL,
+                in_sitemap INTEGER NOT NULL DEFAULT 1
+            )
+            """
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(pages)")}
+        if "in_sitemap" not in columns:
+            self._db.execute("ALTER TABLE pages ADD COLUMN in_sitemap INTEGER NOT NULL DEFAULT 1")
+        # When each site (or "" for all of them) was last audited, to tell the
+        # previous run's URLs from ones already reported as removed.
+        self._db.execute("CREATE TABLE IF NOT EXISTS runs (site TEXT PRIMARY KEY, started REAL NOT NULL)")
+        self._db.commit()
+
+    def observe(self, url: str, lastmod: Optional[str] = None) -> bool:
+        """
+        Marks a URL as listed in this run's sitemaps and says whether it needs
+        checking: it is new, its lastmod changed, or its last check is stale.
+        """
+        row = self._db.execute("SELECT lastmod, checked_at FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            self.diff.new_urls += 1
+            self._db.execute("INSERT INTO pages (url, last_seen) VALUES (?, ?)", (url, self.run_started))
+            self._maybe_commit()
+            return True
+
+        self._db.execute("UPDATE pages SET last_seen = ?, in_sitemap = 1 WHERE url = ?", (self.run_started, url))
+        self._maybe_commit()
+        old_lastmod, checked_at = row
+        if checked_at is None:
+            return True
+        if lastmod and lastmod != old_lastmod:
+            return True
+        return self.run_started - checked_at > self.stale_after
+
+    def needs_seo(self, url: str) -> bool:
+        """True if the page was never analysed or has been re-checked since."""
+        row = self._db.execute("SELECT checked_at, analyzed_at FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None or row[1] is None:
+            return True
+        checked_at, analyzed_at = row
+        return checked_at is not None and checked_at > analyzed_at
+
+    def record_link(self, url: str, result, lastmod: Optional[str] = None):
+        status = link_status(result)
+        row = self._db.execute("SELECT status FROM pages WHERE url = ?", (url,)).fetchone()
+        old_status = row[0] if row else None
+        if status == "broken" and old_status and old_status != "broken":
+            self.diff.newly_broken.append(url)
+        elif status == "ok" and old_status == "broken":
+            self.diff.fixed.append(url)
+
+        self._db.execute(
+            """
+            INSERT INTO pages (url, status, lastmod, checked_at, last_seen) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                status = excluded.status,
+                lastmod = COALESCE(excluded.lastmod, pages.lastmod),
+                checked_at = excluded.checked_at,
+                last_seen = excluded.last_seen
+            """,
+            (url, status, lastmod, time.time(), self.run_started),
+        )
+        self._maybe_commit()
+
+    def record_seo(self, url: str, data: dict):
+        """
+        Stores a page's SEO fields. A page not `observe`d in a sitemap (found
+        by crawling) is kept with in_sitemap = 0, so it is never reported as
+        removed from the sitemaps.
+        """
+        row = self._db.execute(
+            "SELECT title, description, h1, content_hash, analyzed_at FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row and row[4] is not None:
+            old = dict(zip(SEO_FIELDS + ("content_hash",), row[:4]))
+            for name, changes in (
+                ("title", self.diff.title_changed),
+                ("description", self.diff.description_changed),
+                ("h1", self.diff.h1_changed),
+            ):
+                if old[name] != data.get(name):
+                    changes.append((url, old[name], data.get(name)))
+            if data.get("content_hash") and old["content_hash"] != data.get("content_hash"):
+                self.diff.content_changed.append(url)
+
+        self._db.execute(
+            """
+            INSERT INTO pages (url, title, description, h1, content_hash, analyzed_at, last_seen, in_sitemap)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+            ON CONFLICT(url) DO UPDATE SET
+                title = excluded.title,
+                description = excluded.description,
+                h1 = excluded.h1,
+                content_hash = excluded.content_hash,
+                analyzed_at = excluded.analyzed_at
+            """,
+            (
+                url,
+                data.get("title"),
+                data.get("description"),
+                data.get("h1"),
+                data.get("content_hash"),
+                time.time(),
+                self.run_started,
+            ),
+        )
+        self._maybe_commit()
+
+    def finish(self, domain_prefix: Optional[str] = None) -> CrawlDiff:
+        """
+        Commits pending writes and fills in URLs listed in the previous run but
+        not in this one. `domain_prefix` (e.g. "https://example.com") limits
+        that to one site, whose previous run may differ from other sites'.
+        """
+        site = (domain_prefix or "").rstrip("/")
+        where, params = _domain_filter(domain_prefix)
+        row = self._db.execute("SELECT started FROM runs WHERE site = ?", (site,)).fetchone()
+        if row is not None:
+            # Older URLs were already reported as removed by the run after they were last listed.
+            self.diff.removed = [
+                url
+                for (url,) in self._db.execute(
+                    f"SELECT url FROM pages WHERE last_seen = ? AND in_sitemap = 1{where} ORDER BY url",
+                    (row[0],) + params,
+                )
+            ]
+        self._db.execute(
+            "INSERT INTO runs (site, started) VALUES (?, ?) ON CONFLICT(site) DO UPDATE SET started = excluded.started",
+            (site, self.run_started),
+        )
+        self._db.commit()
+        self._pending = 0
+        return self.diff
+
+    def broken_urls(self, domain_prefix: Optional[str] = None) -> List[str]:
+        """Broken URLs listed in this run, including those skipped as unchanged."""
+        where, params = _domain_filter(domain_prefix)
+        return [
+            url
+            for (url,) in self._db.execute(
+                f"SELECT url FROM pages WHERE status = 'broken' AND last_seen = ?{where} ORDER BY url",
+                (self.run_started,) + params,
+            )
+        ]
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self._db.commit()
+            self._pending = 0
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
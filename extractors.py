@@ -0,0 +1,238 @@
+# extractors.py
+import hashlib
+import logging
+import os
+import re
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional, Tuple
+
+NO_TITLE = "No title"
+MISSING = "Missing"
+FEED_CHUNK = 8 * 1024
+XML_DECLARATION = re.compile(r"^\s*<\?xml[^>]*\?>")
+
+# Set SEO_EXTRACTOR to force a backend; otherwise the first available one is used.
+PREFERRED_BACKENDS = ("selectolax", "lxml", "stream", "bs4")
+
+
+def _result(title: Optional[str], description: Optional[str], h1: Optional[str]) -> dict:
+    return {
+        "title": title.strip() if title and title.strip() else NO_TITLE,
+        "description": description.strip() if description and description.strip() else MISSING,
+        "h1": h1.strip() if h1 and h1.strip() else MISSING,
+    }
+
+
+class _HeadScanner(HTMLParser):
+    """Collects title, meta description and the first h1, then reports done."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.description = None
+        self.h1 = None
+        self.in_body = False
+        self.done = False
+        self._title_parts = None
+        self._h1_parts = None
+        self._h1_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title" and self.title is None and self._title_parts is None:
+            self._title_parts = []
+        elif tag == "meta" and self.description is None:
+            attrs = dict(attrs)
+            if (attrs.get("name") or "").lower() == "description" and attrs.get("content") is not None:
+                self.description = attrs["content"]
+        elif tag == "body":
+            self.in_body = True
+        elif tag == "h1":
+            self.in_body = True
+            if self.h1 is None:
+                self._h1_depth += 1
+                if self._h1_parts is None:
+                    self._h1_parts = []
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._title_parts is not None and self.title is None:
+            self.title = "".join(self._title_parts)
+        elif tag == "h1" and self._h1_parts is not None and self.h1 is None:
+            self._h1_depth -= 1
+            if self._h1_depth <= 0:
+                self.h1 = " ".join("".join(self._h1_parts).split()) if self._h1_parts else ""
+        elif tag == "head":
+            self.in_body = True
+        self._update_done()
+
+    def handle_data(self, data):
+        if self._title_parts is not None and self.title is None:
+            self._title_parts.append(data)
+        if self._h1_parts is not None and self.h1 is None:
+            self._h1_parts.append(data)
+
+    def _update_done(self):
+        # The head fields can only be missing once we are past <head>.
+        head_done = (self.title is not None and self.description is not None) or self.in_body
+        self.done = self.h1 is not None and head_done
+
+
+def extract_stream(html: str) -> dict:
+    """Tokenizes only as far as needed: stops once the head and the first h1 are read."""
+    scanner = _HeadScanner()
+    for start in range(0, len(html), FEED_CHUNK):
+        scanner.feed(html[start:start + FEED_CHUNK])
+        if scanner.done:
+            break
+    else:
+        scanner.close()
+    title = scanner.title if scanner.title is not None else (
+        "".join(scanner._title_parts) if scanner._title_parts is not None else None
+    )
+    return _result(title, scanner.description, scanner.h1)
+
+
+def extract_lxml(html: str) -> dict:
+    import lxml.html
+
+    # lxml rejects str input that declares an encoding (XHTML's <?xml ... encoding=...?>);
+    # the text is already decoded, so the declaration is dropped.
+    html = XML_DECLARATION.sub("", html, count=1)
+    if not html.strip():
+        return _result(None, None, None)
+    doc = lxml.html.fromstring(html)
+    title = doc.find(".//title")
+    meta = doc.xpath('//meta[translate(@name, "DESCRIPTION", "description")="description"]/@content')
+    h1 = doc.find(".//h1")
+    return _result(
+        title.text_content() if title is not None else None,
+        meta[0] if meta else None,
+        " ".join(h1.text_content().split()) if h1 is not None else None,
+    )
+
+
+def extract_selectolax(html: str) -> dict:
+    from selectolax.parser import HTMLParser as LexborParser
+
+    tree = LexborParser(html)
+    title = tree.css_first("title")
+    meta = tree.css_first('meta[name="description" i]')
+    h1 = tree.css_first("h1")
+    return _result(
+        title.text() if title else None,
+        meta.attributes.get("content") if meta else None,
+        " ".join(h1.text().split()) if h1 else None,
+    )
+
+
+def extract_bs4(html: str) -> dict:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    meta_desc = soup.find("meta", attrs={"name": "description"})
+    h1 = soup.find("h1")
+    return _result(
+        soup.title.get_text() if soup.title else None,
+        meta_desc.get("content") if meta_desc else None,
+        " ".join(h1.get_text().split()) if h1 else None,
+    )
+
+
+BACKENDS: Dict[str, Callable[[str], dict]] = {
+    "stream": extract_stream,
+    "lxml": extract_lxml,
+    "selectolax": extract_selectolax,
+    "bs4": extract_bs4,
+}
+
+_MODULES = {"stream": None, "lxml": "lxml.html", "selectolax": "selectolax.parser", "bs4": "bs4"}
+
+
+def available_backends() -> List[str]:
+    import importlib.util
+
+    names = []
+    for name, module in _MODULES.items():
+        try:
+            if module is None or importlib.util.find_spec(module) is not None:
+                names.append(name)
+        except ModuleNotFoundError:
+            continue
+    return names
+
+
+_default: Optional[str] = None
+
+
+def default_backend() -> str:
+    global _default
+    if _default is None:
+        forced = os.getenv("SEO_EXTRACTOR")
+        if forced:
+            if forced not in BACKENDS:
+                raise ValueError(f"Unknown SEO_EXTRACTOR {forced!r}; choose from {sorted(BACKENDS)}")
+            _default = forced
+        else:
+            available = available_backends()
+            _default = next(name for name in PREFERRED_BACKENDS if name in available)
+    return _default
+
+
+def extract_seo(html: str, backend: Optional[str] = None) -> dict:
+    """
+    Returns {"title", "description", "h1"} using the given or default backend,
+    falling back to the stream scanner when that backend cannot parse the page.
+    """
+    backend = backend or default_backend()
+    if backend == "stream":
+        return extract_stream(html)
+    try:
+        return BACKENDS[backend](html)
+    except Exception as e:
+        logging.debug(f"{backend} could not parse the page ({e!r}); using the stream scanner")
+        return extract_stream(html)
+
+
+def page_fields(
+    html: str, backend: Optional[str] = None, url: Optional[str] = None, audit: bool = False, outlinks: bool = False
+) -> dict:
+    """
+    SEO fields plus a content hash, i.e. everything analyze_seo stores for a page.
+    With `audit`, the seo_rules engine reads the whole document in one pass and
+    its results are added under "audit", "issues" and "timings_us".
+    With `outlinks`, the same pass also collects the page's distinct link
+    targets (absolute, without fragment) under "outlinks".
+    """
+    if audit or outlinks:
+        from seo_rules import DEFAULT_RULES, OUTLINK_RULES, audit_html, with_outlinks
+
+        if not audit:
+            rules = OUTLINK_RULES
+        else:
+            rules = with_outlinks(DEFAULT_RULES) if outlinks else DEFAULT_RULES
+        report = audit_html(html, url or "", rules)
+        audit_fields = report["fields"]
+        fields = _result(audit_fields.pop("title"), audit_fields.pop("description"), audit_fields.pop("h1"))
+        links = audit_fields.pop("outlinks", None)
+        if audit:
+            fields["audit"] = audit_fields
+            fields["issues"] = report["issues"]
+            fields["timings_us"] = report["timings_us"]
+        if outlinks:
+            fields["outlinks"] = links
+    else:
+        fields = extract_seo(html, backend)
+    fields["content_hash"] = hashlib.sha256(html.encode("utf-8", "replace")).hexdigest()
+    return fields
+
+
+def page_fields_batch(
+    pages: List[Tuple[str, str]], backend: Optional[str] = None, audit: bool = False, outlinks: bool = False
+) -> List[dict]:
+    """Process-pool entry point: one pickled round-trip for a batch of (url, html) pages."""
+    results = []
+    for url, html in pages:
+        try:
+            results.append(page_fields(html, backend, url=url, audit=audit, outlinks=outlinks))
+        except Exception as e:
+            results.append({"error": f"Parse failed: {e}"})
+    return results
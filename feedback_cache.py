@@ -0,0 +1,95 @@
+# feedback_cache.py
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Iterable, Optional
+
+DEFAULT_FEEDBACK_CACHE = "feedback_cache.sqlite"
+DEFAULT_MAX_AGE = 90 * 24 * 3600    # drop feedback not reused for 90 days
+COMMIT_EVERY = 200
+
+SUMMARY_URL = ""                    # row holding the site-wide summary
+
+
+def fields_hash(url: str, data: dict, fields: Iterable[str]) -> str:
+    """Hash of a page's URL and the SEO fields the review prompt reads."""
+    payload = json.dumps([url, {name: data.get(name) for name in fields}], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class FeedbackCache:
+    """
+    LLM feedback per page, keyed on model, prompt template and a hash of the
+    page's SEO fields, so unchanged pages skip the model on the next run.
+
+    Opening the cache with a different `template` drops every row written
+    under another template; rows not reused within `max_age` are evicted.
+    """
+
+    def __init__(self, path: str = DEFAULT_FEEDBACK_CACHE, template: str = "", max_age: float = DEFAULT_MAX_AGE):
+        self.template = template
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS feedback (
+                model TEXT NOT NULL,
+                template TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                url TEXT NOT NULL,
+                feedback TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                used_at REAL NOT NULL,
+                PRIMARY KEY (model, template, hash)
+            )
+            """
+        )
+        now = time.time()
+        self._db.execute("DELETE FROM feedback WHERE template != ? OR used_at < ?", (template, now - max_age))
+        self._db.commit()
+
+    def lookup(self, model: str, key: str) -> Optional[str]:
+        row = self._db.execute(
+            "SELECT feedback FROM feedback WHERE model = ? AND template = ? AND hash = ?", (model, self.template, key)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._db.execute(
+            "UPDATE feedback SET used_at = ? WHERE model = ? AND template = ? AND hash = ?",
+            (time.time(), model, self.template, key),
+        )
+        self._maybe_commit()
+        return row[0]
+
+    def store(self, model: str, key: str, url: str, feedback: str):
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO feedback VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (model, self.template, key, url, feedback, now, now),
+        )
+        self._maybe_commit()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": self._db.execute("SELECT COUNT(*) FROM feedback").fetchone()[0],
+        }
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self._db.commit()
+            self._pending = 0
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
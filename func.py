@@ -1,15 +1,20 @@
 # sitemap_hunter.py
-import re, itertools, xml.etree.ElementTree as ET
+import re, itertools
+from contextlib import aclosing
 from urllib.parse import urlparse, unquote
 import aiohttp
 import asyncio
-from typing import List
-import certifi
-import ssl
-from bs4 import BeautifulSoup
+import logging
+import time
+from typing import AsyncIterator, List, Optional
+from broken_link import LinkResult, verify_link
+from extractors import page_fields
+from http_cache import cached_get
+from http_client import get_session
+from metrics import metrics
+from sitemap_parser import SitemapEntry, probe_sitemap, stream_sitemap
+from url_index import UrlIndex, unique
 
-ssl_context = ssl.create_default_context(cafile=certifi.where())
-RETRY_COUNT = 2
 HEADERS = {"User-Agent": "SEO-Agent/0.1 (+https://github.com/noshinai/seo-agent)"}
 
 COMMON_CANDIDATES = [
@@ -20,6 +25,12 @@ COMMON_CANDIDATES = [
     "/sitemap-index.xml",
 ]
 
+# Crawl-delay seconds per host, filled in by parse_robots and read by the scheduler.
+CRAWL_DELAYS: dict[str, float] = {}
+
+# Sitemap documents fetched at once while walking indexes.
+DISCOVERY_CONCURRENCY = 10
+
 async def normalize_root(session: aiohttp.ClientSession, url: str) -> str:
     url = url if "://" in url else f"https://{url}"
     try:
@@ -33,55 +44,72 @@ async def normalize_root(session: aiohttp.ClientSession, url: str) -> str:
 
 async def get(session: aiohttp.ClientSession, url: str) -> aiohttp.ClientResponse | None:
     try:
-        async with session.get(url, headers=HEADERS, timeout=10, allow_redirects=True) as resp:
-            if resp.status == 200:
-                return await resp.text()
-            else:
-                print(f"⚠️ Failed ({resp.status}): {url}")
+        with metrics.track("get", urlparse(url).hostname):
+            async with cached_get(session, url, headers=HEADERS, timeout=10) as resp:
+                if resp.status == 200:
+                    return await resp.text()
+                else:
+                    logging.warning(f"⚠️ Failed ({resp.status}): {url}")
     except Exception as e:
-        print(f"❌ Error fetching {url}: {e}")
+        logging.warning(f"❌ Error fetching {url}: {e}")
     return None
 
 
-def is_xml(text: str) -> bool:
-    try:
-        ET.fromstring(text.strip()[:10_000])
-        return True
-    except ET.ParseError:
-        return False
-
-
-async def try_common(session: aiohttp.ClientSession, root: str) -> List[str]:
-    hits = []
-    for path in COMMON_CANDIDATES:
-        full = root + path
-        print(f"🌐 Trying: {full}")
-        text = await get(session, full)
-        if text and is_xml(text):
-            print(f"✅ Valid sitemap found: {full}")
-            hits.append(full)
-    return hits
+def parse_crawl_delay(text: str, agent: str = "seo-agent") -> float | None:
+    """Return the Crawl-delay that applies to us: our own group first, then `*`."""
+    delays = {}
+    agents = []
+    in_rules = False
+    for raw in text.splitlines():
+        line = raw.split("#", 1)[0].strip()
+        if ":" not in line:
+            continue
+        key, value = (part.strip() for part in line.split(":", 1))
+        key = key.lower()
+        if key == "user-agent":
+            if in_rules:
+                agents, in_rules = [], False
+            agents.append(value.lower())
+        else:
+            in_rules = True
+            if key == "crawl-delay":
+                try:
+                    delay = float(value)
+                except ValueError:
+                    continue
+                for ua in agents:
+                    delays.setdefault(ua, delay)
+
+    for ua, delay in delays.items():
+        if ua != "*" and agent in ua:
+            return delay
+    return delays.get("*")
+
+
+def common_candidates(root: str) -> List[str]:
+    return [root + path for path in COMMON_CANDIDATES]
 
 
 async def parse_robots(session: aiohttp.ClientSession, root: str) -> List[str]:
     robots_url = root + "/robots.txt"
-    print(f"📄 Fetching robots.txt: {robots_url}")
+    logging.info(f"📄 Fetching robots.txt: {robots_url}")
     text = await get(session, robots_url)
     if not text:
-        print("⚠️ No robots.txt found.")
+        logging.warning("⚠️ No robots.txt found.")
         return []
 
+    delay = parse_crawl_delay(text)
+    if delay is not None:
+        logging.info(f"🐢 Crawl-delay from robots.txt: {delay}s")
+        CRAWL_DELAYS[urlparse(root).netloc.lower()] = delay
+
+    # Candidates are validated once, by the discovery walk in expand_sitemaps.
     sitemaps = []
     for line in text.splitlines():
         if line.lower().startswith("sitemap:"):
             sm_url = line.split(":", 1)[1].strip()
-            print(f"🔗 Found in robots.txt: {sm_url}")
-            sm_text = await get(session, sm_url)
-            if sm_text and is_xml(sm_text):
-                print(f"✅ Valid sitemap from robots.txt: {sm_url}")
-                sitemaps.append(sm_url)
-            else:
-                print(f"❌ Invalid or unreachable sitemap: {sm_url}")
+            logging.info(f"🔗 Found in robots.txt: {sm_url}")
+            sitemaps.append(sm_url)
     return sitemaps
 
 
@@ -94,7 +122,7 @@ async def google_search(session: aiohttp.ClientSession, domain: str, max_hits: i
         async with session.get("https://www.google.com/search", params=params, headers=HEADERS, timeout=10) as resp:
             html = await resp.text()
     except Exception as e:
-        print(f"❌ Google search failed: {e}")
+        logging.warning(f"❌ Google search failed: {e}")
         return []
 
     soup = bs4.BeautifulSoup(html, "html.parser")
@@ -107,170 +135,220 @@ async def google_search(session: aiohttp.ClientSession, domain: str, max_hits: i
             if domain in actual and "sitemap" in actual:
                 urls.append(actual)
 
-    clean = []
-    for u in itertools.islice(urls, max_hits):
-        print(f"🔍 Checking search hit: {u}")
-        sm_text = await get(session, u)
-        if sm_text and is_xml(sm_text):
-            print(f"✅ Valid sitemap from search: {u}")
-            clean.append(u)
-    return clean
-
-async def expand_sitemaps(session: aiohttp.ClientSession, sitemap_urls: List[str]) -> List[str]:
-    """Recursively expand sitemap index files into concrete sitemap URLs."""
+    hits = list(itertools.islice(urls, max_hits))
+    for u in hits:
+        logging.info(f"🔍 Search hit: {u}")
+    return hits
+
+async def expand_sitemaps(
+    session: aiohttp.ClientSession,
+    sitemap_urls: List[str],
+    max_sitemaps: Optional[int] = None,
+    concurrency: int = DISCOVERY_CONCURRENCY,
+) -> List[str]:
+    """
+    Expand sitemap index files into concrete sitemap URLs.
+
+    Indexes are walked concurrently and every URL is fetched at most once, no
+    matter how many candidates or indexes list it. The walk stops early once
+    `max_sitemaps` concrete sitemaps have been found.
+    """
+    seen = UrlIndex()
     final_sitemaps = []
+    queue: asyncio.Queue = asyncio.Queue()
+    enough = asyncio.Event()
+
+    def enqueue(url: str):
+        if seen.add(url):
+            queue.put_nowait(url)
+
+    async def worker():
+        while True:
+            sm_url = await queue.get()
+            try:
+                with metrics.track("sitemap_probe", urlparse(sm_url).hostname):
+                    kind, nested = await probe_sitemap(session, sm_url, headers=HEADERS)
+                if kind == "urlset":
+                    logging.info(f"✅ Valid sitemap: {sm_url}")
+                    final_sitemaps.append(sm_url)
+                    if max_sitemaps and len(final_sitemaps) >= max_sitemaps:
+                        enough.set()
+                elif kind is None:
+                    logging.info(f"❌ Invalid or unreachable sitemap: {sm_url}")
+                # Handle sitemap index (nested sitemaps)
+                for loc in nested:
+                    logging.info(f"🔁 Found nested sitemap: {loc}")
+                    enqueue(loc)
+            finally:
+                queue.task_done()
 
     for sm_url in sitemap_urls:
-        xml = await get(session, sm_url)
-        if not xml:
-            continue
+        enqueue(sm_url)
 
-        try:
-            root = ET.fromstring(xml)
-        except ET.ParseError:
-            continue
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    waiters = [asyncio.create_task(queue.join()), asyncio.create_task(enough.wait())]
+    try:
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in workers + waiters:
+            task.cancel()
+        await asyncio.gather(*workers, *waiters, return_exceptions=True)
 
-        # Handle sitemap index (nested sitemaps)
-        if root.tag.endswith("sitemapindex"):
-            for sm in root.findall(".//{*}sitemap/{*}loc"):
-                loc = sm.text.strip()
-                print(f"🔁 Found nested sitemap: {loc}")
-                nested = await expand_sitemaps(session, [loc])
-                final_sitemaps.extend(nested)
-        elif root.tag.endswith("urlset"):
-            # Direct sitemap
-            final_sitemaps.append(sm_url)
+    return final_sitemaps[:max_sitemaps] if max_sitemaps else final_sitemaps
 
-    return final_sitemaps
 
 
+async def hunt(
+    domain_or_url: str,
+    session: Optional[aiohttp.ClientSession] = None,
+    max_sitemaps: Optional[int] = None,
+) -> List[str]:
+    session = session or await get_session()
+    root = await normalize_root(session, domain_or_url)
+    logging.info(f"🔍 Hunting sitemaps for: {domain_or_url}")
+    logging.info(f"🔗 Canonical domain resolved: {root}")
 
-async def hunt(domain_or_url: str) -> List[str]:
-    async with aiohttp.ClientSession() as session:
-        root = await normalize_root(session, domain_or_url)
-        print(f"🔍 Hunting sitemaps for: {domain_or_url}")
-        print(f"🔗 Canonical domain resolved: {root}")
+    robots_hits, search_hits = await asyncio.gather(
+        parse_robots(session, root),
+        google_search(session, urlparse(root).netloc),
+    )
 
-        robots_hits = await parse_robots(session, root)
-        common_hits = await try_common(session, root)
-        search_hits = await google_search(session, urlparse(root).netloc)
+    # Robots.txt entries go first so an early stop keeps the site's own listing.
+    initial_sitemaps = list(unique(robots_hits + common_candidates(root) + search_hits))
 
-        # Deduplicate all discovered sitemaps
-        initial_sitemaps = list(set(robots_hits + common_hits + search_hits))
+    # 🧠 Walk sitemap indexes concurrently into real sitemaps (deduplicated)
+    return await expand_sitemaps(session, initial_sitemaps, max_sitemaps=max_sitemaps)
 
-        # 🧠 Recursively expand sitemap indexes into real sitemaps
-        expanded_sitemaps = await expand_sitemaps(session, initial_sitemaps)
 
-        # Deduplicate final list
-        return list(set(expanded_sitemaps))
+async def hunt_links(
+    domain_or_url: str, session: Optional[aiohttp.ClientSession] = None
+) -> AsyncIterator[SitemapEntry]:
+    """
+    Finds every sitemap for a site and yields its entries while they download.
+    A URL listed by several sitemaps, or spelled several ways, is yielded once.
+    """
+    seen = UrlIndex()
+    for sitemap_url in await hunt(domain_or_url, session):
+        async with aclosing(iter_sitemap_entries(sitemap_url, session, seen)) as entries:
+            async for entry in entries:
+                yield entry
 
 
 
-async def extract_links_from_sitemap(sitemap_url: str):
+async def iter_sitemap_entries(
+    sitemap_url: str,
+    session: Optional[aiohttp.ClientSession] = None,
+    seen: Optional[UrlIndex] = None,
+) -> AsyncIterator[SitemapEntry]:
     """
-    Downloads and parses a sitemap to extract <loc> URLs asynchronously.
+    Streams a (possibly gzipped) sitemap and yields its entries as they are parsed.
+    Entries whose URL is already in `seen` are skipped, and new ones are added.
     """
-    print(f"\n Downloading sitemap: {sitemap_url}")
+    logging.info(f"\n Downloading sitemap: {sitemap_url}")
+    session = session or await get_session()
+    count = skipped = 0
     try:
-        async with aiohttp.ClientSession(headers=HEADERS) as session:
-            async with session.get(sitemap_url, timeout=10) as response:
-                response_text = await response.text()
-                response.raise_for_status()
+        async with aclosing(stream_sitemap(session, sitemap_url, headers=HEADERS)) as entries:
+            async for entry in entries:
+                count += 1
+                if seen is not None and not seen.add(entry.loc):
+                    skipped += 1
+                    continue
+                yield entry
+        logging.info(f" Found {count} URLs in sitemap" + (f" ({skipped} duplicates skipped)." if skipped else "."))
+    except Exception as e:
+        logging.error(f" Failed to parse sitemap: {e}")
 
-        tree = ET.fromstring(response_text)
 
-        # Handle sitemap namespaces
-        namespace = {"ns": "http://www.sitemaps.org/schemas/sitemap/0.9"}
-        loc_elements = tree.findall(".//ns:loc", namespaces=namespace)
+async def extract_links_from_sitemap(sitemap_url: str, session: Optional[aiohttp.ClientSession] = None):
+    """
+    Downloads and parses a sitemap to extract <loc> URLs asynchronously.
+    """
+    async with aclosing(iter_sitemap_entries(sitemap_url, session)) as entries:
+        return [entry.loc async for entry in entries]
+
 
-        urls = [el.text.strip() for el in loc_elements if el.text]
-        print(f" Found {len(urls)} URLs in sitemap.")
-        return urls
-    except Exception as e:
-        print(f" Failed to parse sitemap: {e}")
-        return []
 
+def report_link(result: LinkResult) -> Optional[bool]:
+    """Prints one line for a checked link and returns its True / False / None verdict."""
+    via = f" via {result.method}" if result.method != "HEAD" else ""
+    hops = f", {result.hops} redirect(s) → {result.final_url}" if result.hops else ""
+    if result.status is None:
+        logging.warning(f"❌ Error: {result.url} [{result.error}, {result.attempts} attempt(s)]")
+    elif result.ok is None:
+        logging.info(f"❌ Blocked or requires auth: {result.url} [{result.status}{via}]")
+    elif result.ok:
+        # One line per working link is only worth its cost when debugging.
+        logging.debug(f"✅ OK: {result.url} [{result.status}{via}{hops}]")
+    else:
+        logging.warning(f"❌ Broken: {result.url} [{result.status}{via}{hops}]")
+    return result.ok
 
 
 async def check_link(session, url):
-    HEADERS = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0.0.0 Safari/537.36"
-        ),
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.5",
-        "Connection": "keep-alive"
-    }
-
-    for attempt in range(RETRY_COUNT):
-        try:
-            async with session.head(url, headers=HEADERS, allow_redirects=True, ssl=ssl_context) as resp:
-                if resp.status == 999:
-                    print(f"❌ Blocked by site (LinkedIn): {url} [{resp.status}]")
-                    return None
-                elif resp.status in [403, 401]:
-                    print(f"❌ Blocked or requires auth: {url} [{resp.status}]")
-                    return None
-                elif resp.status == 400 and ("facebook.com" in url or "twitter.com" in url):
-                    print(f"⚠️ Possibly OK but blocked or rate-limited: {url} [{resp.status}]")
-                    return None
-                elif resp.status >= 400:
-                    print(f"❌ Broken: {url} [{resp.status}]")
-                    return False
-                else:
-                    print(f"✅ OK: {url} [{resp.status}]")
-                    return True
-        except aiohttp.ClientResponseError as e:
-            print(f"❌ Client error: {url} [{e.status}]")
-            return False
-        except asyncio.TimeoutError:
-            print(f"⏳ Timeout: {url} [Attempt {attempt + 1}]")
-        except Exception as e:
-            print(f"❌ Error: {url} [Exception: {e}]")
-            return False
-    return False
+    """
+    True if the link works, False if broken, None if the site blocks checkers.
+    See broken_link.LinkChecker for the HEAD → ranged GET fallback and retries.
+    """
+    return report_link(await verify_link(session, url))
 
 
 
 async def fetch_html(session, url):
+    host = urlparse(url).hostname
     try:
-        async with session.get(url, timeout=50) as resp:
-            if resp.status != 200:
-                print(f"⚠️ Failed to fetch {url} (status: {resp.status})")
-                return None
+        with metrics.track("fetch_html", host):
+            async with cached_get(session, url, headers=HEADERS, timeout=50) as resp:
+                if resp.status != 200:
+                    logging.warning(f"⚠️ Failed to fetch {url} (status: {resp.status})")
+                    return None
 
-            content_type = resp.headers.get("Content-Type", "")
-            if "text/html" not in content_type:
-                print(f"⚠️ Skipping {url} (non-HTML content: {content_type})")
-                return None
+                content_type = resp.headers.get("Content-Type", "")
+                if "text/html" not in content_type:
+                    logging.info(f"⚠️ Skipping {url} (non-HTML content: {content_type})")
+                    return None
 
-            return await resp.text()
+                t0 = time.perf_counter()
+                html = await resp.text()
+                metrics.observe("download", time.perf_counter() - t0, host)
+                return html
     except asyncio.TimeoutError:
-        print(f"⏱️ Timeout while fetching: {url}")
+        logging.warning(f"⏱️ Timeout while fetching: {url}")
     except aiohttp.ClientError as e:
-        print(f"❌ Client error while fetching {url}: {e}")
+        logging.warning(f"❌ Client error while fetching {url}: {e}")
     except Exception as e:
-        print(f"❗ Unexpected error fetching {url}: {e}")
+        logging.error(f"❗ Unexpected error fetching {url}: {e}")
 
     return None
 
-async def analyze_seo(session, url):
+async def analyze_seo(session, url, parse_pool=None, audit=False, outlinks=False, link_metrics=None):
+    """
+    Fetches a page and extracts its SEO fields. With a `parse_pool.ParsePool`
+    the parsing runs in a worker process instead of on the event loop. With
+    `audit` (or a pool created with audit=True) the seo_rules checks run too;
+    with `outlinks` (or outlinks=True on the pool) the page's link targets are
+    returned under "outlinks". With the `link_metrics.LinkMetrics` of a crawl,
+    the page's internal PageRank, click depth and in-links are added.
+    """
     seo_data = {}
     html = await fetch_html(session, url)
     if not html:
         return {"url": url, "error": "Failed to fetch"}
 
-    soup = BeautifulSoup(html, "html.parser")
-    title = soup.title.string.strip() if soup.title else "No title"
-    meta_desc = soup.find("meta", attrs={"name": "description"})
-    description = meta_desc["content"].strip() if meta_desc and "content" in meta_desc.attrs else "Missing"
-    h1 = soup.find("h1").text.strip() if soup.find("h1") else "Missing"
-
-    seo_data[url] = {
-            "title": title,
-            "description": description,
-            "h1": h1
-        }
-    return seo_data
\ No newline at end of file
+    # With a pool this includes the wait for a worker process.
+    with metrics.track("parse"):
+        if parse_pool:
+            fields = await parse_pool.parse(html, url)
+        else:
+            try:
+                fields = page_fields(html, url=url, audit=audit, outlinks=outlinks)
+            except Exception as e:
+                # Same result as a failed parse in the pool's page_fields_batch
+                fields = {"error": f"Parse failed: {e}"}
+    if "error" in fields:
+        return {"url": url, "error": fields["error"]}
+
+    if link_metrics:
+        fields.update(link_metrics.for_url(url))
+    seo_data[url] = fields
+    return seo_data
@@ -0,0 +1,175 @@
+# google_api.py
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+import aiohttp
+
+from broken_link import backoff_delay, retry_after_seconds
+from http_client import ssl_context
+from metrics import metrics
+
+# Overridable to point the API clients at a local stand-in (see benchmarks/mock_server.py).
+GSC_BASE = os.getenv("SEO_GSC_BASE", "https://searchconsole.googleapis.com/webmasters/v3")
+GA4_DATA_BASE = os.getenv("SEO_GA4_DATA_BASE", "https://analyticsdata.googleapis.com/v1beta")
+GA4_ADMIN_BASE = os.getenv("SEO_GA4_ADMIN_BASE", "https://analyticsadmin.googleapis.com/v1beta")
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_RETRIES = 4
+RETRY_AFTER_MAX = 30.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class GoogleApiError(Exception):
+    """
+    A Google API call that failed after retries; `details` is the decoded error
+    body. Timeouts are reported as 504, connection errors and successful
+    responses whose body is not JSON as 502.
+    """
+
+    def __init__(self, status: int, details, url: str = ""):
+        super().__init__(f"Google API returned {status} for {url}")
+        self.status = status
+        self.details = details
+        self.url = url
+
+
+class GoogleApiClient:
+    """
+    Async client for the Search Console and GA4 REST APIs.
+
+    One keep-alive pool is shared by every request, so the TLS handshake with
+    googleapis.com is paid once per worker instead of once per call. 429 and
+    5xx responses, timeouts and connection errors are retried with jittered
+    exponential backoff, honouring Retry-After.
+    """
+
+    def __init__(
+        self,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        limit: int = 100,
+        limit_per_host: int = 50,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=60,
+                ttl_dns_cache=300,
+                ssl=ssl_context,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Accept": "application/json"},
+            )
+            self._session_loop = loop
+        return self._session
+
+    async def request(self, method: str, url: str, token: str, json_body=None, params=None):
+        """Sends an authorised request and returns the decoded JSON body, or raises GoogleApiError."""
+        session = await self.session()
+        headers = {"Authorization": f"Bearer {token}"}
+        host = urlparse(url).hostname
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                # One observation per attempt, so retried calls show up as their own latencies.
+                with metrics.track("google_api", host):
+                    async with session.request(method, url, headers=headers, json=json_body, params=params) as resp:
+                        body = await resp.read()
+                        if resp.status < 400:
+                            try:
+                                return json.loads(body) if body else {}
+                            except ValueError:
+                                # A proxy's HTML error page or a truncated body
+                                raise GoogleApiError(502, _decode(body), url) from None
+                        if resp.status not in RETRY_STATUSES or last:
+                            raise GoogleApiError(resp.status, _decode(body), url)
+                        wait = retry_after_seconds(resp.headers.get("Retry-After"))
+                metrics.count("google_api_retries", host=host)
+                logging.warning(f"Google API {resp.status} for {url}, retrying (attempt {attempt + 1})")
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                if last:
+                    # Reported like an error response, so callers only handle GoogleApiError.
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise GoogleApiError(504, "Timeout", url) from e
+                    raise GoogleApiError(502, str(e) or type(e).__name__, url) from e
+                wait = None
+                metrics.count("google_api_retries", host=host)
+                logging.warning(f"Google API request failed: {url} [{e!r}], retrying (attempt {attempt + 1})")
+            await asyncio.sleep(min(wait, RETRY_AFTER_MAX) if wait is not None else backoff_delay(attempt + 1))
+
+    async def get(self, url: str, token: str, params=None):
+        return await self.request("GET", url, token, params=params)
+
+    async def post(self, url: str, token: str, json_body):
+        return await self.request("POST", url, token, json_body=json_body)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session, self._session_loop = None, None
+
+
+class QuotaLimiter:
+    """
+    Keeps a batch of API calls inside a quota: at most `concurrency` in flight
+    and no more than `per_minute` started in any minute (calls are spaced out
+    evenly rather than bursting).
+    """
+
+    def __init__(self, concurrency: int = 8, per_minute: Optional[float] = None):
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._interval = 60.0 / per_minute if per_minute else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        if self._interval:
+            try:
+                async with self._lock:
+                    now = time.monotonic()
+                    if self._next_start > now:
+                        await asyncio.sleep(self._next_start - now)
+                    self._next_start = max(now, self._next_start) + self._interval
+            except BaseException:
+                self._semaphore.release()
+                raise
+        return self
+
+    async def __aexit__(self, *exc):
+        self._semaphore.release()
+
+
+def _decode(body: bytes):
+    try:
+        return json.loads(body)
+    except ValueError:
+        return body.decode("utf-8", "replace")
+
+
+_client = GoogleApiClient()
+
+
+def get_google_client() -> GoogleApiClient:
+    return _client
+
+
+async def close_google_client():
+    await _client.close()
@@ -1,5 +1,5 @@
 from fastapi import FastAPI, Request, Query, Header
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from starlette.config import Config
 from starlette.middleware.sessions import SessionMiddleware
 from google_auth_oauthlib.flow import Flow
@@ -8,11 +8,19 @@ from dotenv import load_dotenv
 
 from typing import List
 import pathlib
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import logging
-import requests
+import time
 import urllib.parse
 from typing import List, Optional
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+import ga4_batch
+import gsc_export
+from metrics import metrics
+from response_cache import get_response_cache
+from warehouse import configure_warehouse, get_warehouse
+from google_api import GA4_ADMIN_BASE, GA4_DATA_BASE, GSC_BASE, GoogleApiError, close_google_client, get_google_client
 
 app = FastAPI()
 load_dotenv()
@@ -33,6 +41,39 @@ SCOPES = [
 ]
 REDIRECT_URI = os.getenv("REDIRECT_URI", "http://localhost:8000/oauth2callback")
 
+
+@app.on_event("shutdown")
+async def shutdown_google_client():
+    await close_google_client()
+    configure_warehouse(None)
+
+
+@app.get("/cache/stats")
+async def response_cache_stats():
+    """Hit / miss / coalesced counters for the Google API response cache."""
+    return get_response_cache().stats_dict()
+
+
+@app.middleware("http")
+async def time_endpoints(request: Request, call_next):
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    # The route template, not the raw path, so query strings and IDs don't multiply the series.
+    route = request.scope.get("route")
+    stage = f"endpoint {route.path}" if route is not None else "endpoint unmatched"
+    metrics.observe(stage, time.perf_counter() - t0)
+    metrics.count(f"endpoint_{response.status_code // 100}xx")
+    return response
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage latencies, Google API and OpenAI calls, and response cache counters for Prometheus."""
+    cache = get_response_cache().stats_dict()
+    extra = {f"response_cache_{name}": value for name, value in cache.items() if isinstance(value, (int, float))}
+    return PlainTextResponse(metrics.prometheus(extra), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/oauth/login")
 def login(request: Request):
     flow = Flow.from_client_config(
@@ -54,7 +95,7 @@ def login(request: Request):
 
 # --- Step 2: Handle callback, fetch token, then fetch GSC site list ---
 @app.get("/oauth2callback")
-def oauth_callback(request: Request):
+async def oauth_callback(request: Request):
     state = request.session.get("state")
     if not state:
         return JSONResponse({"error": "Missing session state"}, status_code=400)
@@ -73,56 +114,29 @@ def oauth_callback(request: Request):
         redirect_uri=REDIRECT_URI,
     )
 
-    # Fetch token from Google's redirect response
-    flow.fetch_token(authorization_response=str(request.url))
+    # Fetch token from Google's redirect response (a blocking call, so off the event loop)
+    await run_in_threadpool(flow.fetch_token, authorization_response=str(request.url))
     credentials = flow.credentials
 
     # Store token in session
     request.session["token"] = credentials.token
 
     # Fetch list of GSC sites immediately
-    headers = {
-        "Authorization": f"Bearer {credentials.token}",
-        "Accept": "application/json",
-    }
-    response = requests.get("https://searchconsole.googleapis.com/webmasters/v3/sites", headers=headers)
+    try:
+        data = await get_google_client().get(f"{GSC_BASE}/sites", credentials.token)
+    except GoogleApiError as e:
+        return JSONResponse({"error": "Failed to fetch GSC data", "details": e.details}, status_code=500)
+    data["token"] = credentials.token
+    return JSONResponse(data)
 
-    if response.status_code == 200:
-        data = response.json()
-        data["token"] = credentials.token
-        return JSONResponse(data)
-    else:
-        return JSONResponse({"error": "Failed to fetch GSC data", "details": response.json()}, status_code=500)
 
 
 
+GSC_DIMENSIONS = {"query", "page", "device", "country", "date"}
 
-@app.get("/gsc/performance")
-def get_gsc_performance(
-    site: str, 
-    request: Request,
-    authorization: str = Header(default=None),
-    start_date: str = Query(default=None),
-    end_date: str = Query(default=None),
-    dimensions: Optional[List[str]] = Query(default=["query"]),
-    row_limit: Optional[int] = Query(default=20)):
-
-    if not site:
-        return JSONResponse({"error": "Site parameter is required"}, status_code=400)
 
-    token = request.session.get("token")
-    if not token and authorization and authorization.startswith("Bearer "):
-        token = authorization.split("Bearer ")[1]
-
-    if not token:
-        return JSONResponse({"error": "Not authenticated"}, status_code=401)
-
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-    }
-
-    # Parse and validate dates
+def parse_gsc_range(start_date: Optional[str], end_date: Optional[str]):
+    """Parses YYYY-MM-DD dates; defaults to the 30 days up to today."""
     try:
         if not end_date:
             end_date = datetime.utcnow().date()
@@ -134,44 +148,81 @@ def get_gsc_performance(
         else:
             start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
     except ValueError:
-        return JSONResponse({"error": "Invalid date format. Use YYYY-MM-DD."}, status_code=400)
+        raise ValueError("Invalid date format. Use YYYY-MM-DD.")
 
     if start_date > end_date:
-        return JSONResponse({"error": "Start date cannot be after end date."}, status_code=400)
-    
-    # Validate dimensions
-    allowed_dimensions = {"query", "page", "device", "country", "date"}
-    invalid_dimensions = [d for d in dimensions if d not in allowed_dimensions]
+        raise ValueError("Start date cannot be after end date.")
+    return start_date, end_date
+
+
+def validate_gsc_dimensions(dimensions: List[str]):
+    invalid_dimensions = [d for d in dimensions if d not in GSC_DIMENSIONS]
     if invalid_dimensions:
-        return JSONResponse({"error": f"Invalid dimensions: {invalid_dimensions}"}, status_code=400)
+        raise ValueError(f"Invalid dimensions: {invalid_dimensions}")
 
+
+async def fetch_gsc_performance(token: str, site: str, start_date: date, end_date: date,
+                                dimensions: List[str], row_limit: int, search_type: str = "web") -> dict:
+    """searchAnalytics.query through the response cache and, when enabled, the local warehouse."""
+    site = site.rstrip("/")
     payload = {
         "startDate": str(start_date),
         "endDate": str(end_date),
         "dimensions": dimensions,
+        "type": search_type,
         "rowLimit": row_limit
     }
+    url = f"{GSC_BASE}/sites/{urllib.parse.quote(site, safe='')}/searchAnalytics/query"
 
-    site = site.rstrip("/")
-    encoded_site = urllib.parse.quote(site, safe='')
+    async def fetch():
+        # Historical days come from the local warehouse; only missing or fresh days hit Google.
+        # It only stores web search rows, so other search types are always fetched live.
+        warehouse = get_warehouse()
+        if warehouse and search_type == "web":
+            return await warehouse.gsc_performance(token, site, start_date, end_date, dimensions, row_limit)
+        return await get_google_client().post(url, token, payload)
+
+    cache = get_response_cache()
+    return await cache.get_or_fetch(cache.key("gsc", token, site=site, **payload), fetch)
 
-    url = f"https://searchconsole.googleapis.com/webmasters/v3/sites/{encoded_site}/searchAnalytics/query"
 
+@app.get("/gsc/performance")
+async def get_gsc_performance(
+    site: str, 
+    request: Request,
+    authorization: str = Header(default=None),
+    start_date: str = Query(default=None),
+    end_date: str = Query(default=None),
+    dimensions: Optional[List[str]] = Query(default=["query"]),
+    row_limit: Optional[int] = Query(default=20),
+    search_type: str = Query(default="web")):
+
+    if not site:
+        return JSONResponse({"error": "Site parameter is required"}, status_code=400)
+
+    token = request.session.get("token")
+    if not token and authorization and authorization.startswith("Bearer "):
+        token = authorization.split("Bearer ")[1]
+
+    if not token:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+
+    # Parse and validate dates and dimensions
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()  # raises an exception for 4xx/5xx
-        return response.json()
+        start_date, end_date = parse_gsc_range(start_date, end_date)
+        validate_gsc_dimensions(dimensions)
+    except ValueError as ve:
+        return JSONResponse({"error": str(ve)}, status_code=400)
 
-    except requests.exceptions.HTTPError as http_err:
-        try:
-            error_data = response.json()
-        except Exception:
-            error_data = response.text
-        logging.error(f"HTTP error: {http_err} | Response: {error_data}")
+    try:
+        return await fetch_gsc_performance(token, site, start_date, end_date, dimensions, row_limit, search_type)
+
+    except GoogleApiError as http_err:
+        logging.error(f"HTTP error: {http_err} | Response: {http_err.details}")
         return JSONResponse({
             "error": "Failed to fetch performance data",
-            "status_code_from_google": response.status_code,
-            "details": error_data
+            "status_code_from_google": http_err.status,
+            "details": http_err.details
         }, status_code=500)
 
     except Exception as e:
@@ -182,8 +233,22 @@ def get_gsc_performance(
         }, status_code=500)
 
 
-@app.get("/ga4/properties")
-def list_ga4_properties(request: Request, authorization: str = Header(default=None)):
+@app.get("/gsc/export")
+async def export_gsc_performance(
+    site: str,
+    request: Request,
+    authorization: str = Header(default=None),
+    start_date: str = Query(default=None),
+    end_date: str = Query(default=None),
+    dimensions: List[str] = Query(default=["query", "page"]),
+    shard: str = Query(default="day", pattern="^(day|week|none)$"),
+    search_type: str = Query(default="web"),
+    format: str = Query(default="ndjson", pattern="^(ndjson|arrow)$"),
+    concurrency: int = Query(default=gsc_export.DEFAULT_CONCURRENCY, ge=1, le=32)):
+    """
+    Bulk export: every row for the range, paged with startRow and fetched in
+    concurrent per-day (or per-week) shards, streamed as NDJSON or Arrow IPC.
+    """
     token = request.session.get("token")
     if not token and authorization and authorization.startswith("Bearer "):
         token = authorization.split("Bearer ")[1]
@@ -191,13 +256,61 @@ def list_ga4_properties(request: Request, authorization: str = Header(default=No
     if not token:
         return JSONResponse({"error": "Not authenticated"}, status_code=401)
 
-    headers = {"Authorization": f"Bearer {token}"}
-    response = requests.get("https://analyticsadmin.googleapis.com/v1beta/accountSummaries", headers=headers)
+    try:
+        start_date, end_date = parse_gsc_range(start_date, end_date)
+        validate_gsc_dimensions(dimensions)
+    except ValueError as ve:
+        return JSONResponse({"error": str(ve)}, status_code=400)
+
+    rows = gsc_export.export_rows(
+        token, site, start_date, end_date, dimensions,
+        shard=shard, search_type=search_type, concurrency=concurrency,
+    )
+    # Wait for the first row so auth and quota errors still get a proper status.
+    try:
+        first = await anext(rows, None)
+    except GoogleApiError as http_err:
+        logging.error(f"HTTP error: {http_err} | Response: {http_err.details}")
+        return JSONResponse({
+            "error": "Failed to export performance data",
+            "status_code_from_google": http_err.status,
+            "details": http_err.details
+        }, status_code=500)
 
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return JSONResponse({"error": "Failed to fetch GA accounts", "details": response.json()}, status_code=500)
+    async def all_rows():
+        if first is None:
+            return
+        yield first
+        try:
+            async for row in rows:
+                yield row
+        except Exception as e:
+            logging.exception("GSC export failed mid-stream.")
+            if format == "ndjson":
+                yield {"error": "Export interrupted", "message": str(e)}
+        finally:
+            await rows.aclose()
+
+    if format == "arrow":
+        columns = gsc_export.export_dimensions(dimensions, shard)
+        body = gsc_export.arrow_stream(all_rows(), columns)
+        return StreamingResponse(body, media_type="application/vnd.apache.arrow.stream")
+    return StreamingResponse(gsc_export.ndjson_stream(all_rows()), media_type="application/x-ndjson")
+
+
+@app.get("/ga4/properties")
+async def list_ga4_properties(request: Request, authorization: str = Header(default=None)):
+    token = request.session.get("token")
+    if not token and authorization and authorization.startswith("Bearer "):
+        token = authorization.split("Bearer ")[1]
+
+    if not token:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+
+    try:
+        return await get_google_client().get(f"{GA4_ADMIN_BASE}/accountSummaries", token)
+    except GoogleApiError as e:
+        return JSONResponse({"error": "Failed to fetch GA accounts", "details": e.details}, status_code=500)
 
 
 
@@ -215,8 +328,36 @@ def parse_date_param(date_str: str):
         raise ValueError("Date must be 'YYYY-MM-DD', 'today' or '<n>daysAgo'")
     
 
+async def fetch_ga4_report(token: str, property_id: str, start_date: str, end_date: str,
+                           metrics: List[str], dimensions: List[str]) -> dict:
+    """
+    runReport through the response cache and, when enabled, the local warehouse.
+    Dates must already be resolved by parse_date_param, so "30daysAgo" keys on the actual date.
+    """
+    property_id = property_id.removeprefix("properties/")
+    url = f"{GA4_DATA_BASE}/properties/{property_id}:runReport"
+    payload = {
+        "dateRanges": [{"startDate": start_date, "endDate": end_date}],
+        "metrics": [{"name": m} for m in metrics],
+        "dimensions": [{"name": d} for d in dimensions]
+    }
+
+    async def fetch():
+        warehouse = get_warehouse()
+        if warehouse:
+            report = await warehouse.ga4_report(
+                token, property_id, date.fromisoformat(start_date), date.fromisoformat(end_date), metrics, dimensions
+            )
+            if report is not None:
+                return report
+        return await get_google_client().post(url, token, payload)
+
+    cache = get_response_cache()
+    return await cache.get_or_fetch(cache.key("ga4", token, property_id=property_id, **payload), fetch)
+
+
 @app.get("/ga4/report")
-def get_ga4_report(
+async def get_ga4_report(
     request: Request,
     property_id: str = Query(...),  # GA4 property ID
     start_date: str = Query(default="30daysAgo"),
@@ -239,26 +380,56 @@ def get_ga4_report(
     if not token:
         return JSONResponse({"error": "Not authenticated"}, status_code=401)
 
-    url = f"https://analyticsdata.googleapis.com/v1beta/properties/{property_id}:runReport"
+    try:
+        return await fetch_ga4_report(token, property_id, start_date, end_date, metrics, dimensions)
+    except GoogleApiError as e:
+        return JSONResponse({
+            "error": "Failed to fetch GA4 report",
+            "status_code_from_google": e.status,
+            "details": e.details
+        }, status_code=500)
 
-    payload = {
-        "dateRanges": [{"startDate": start_date, "endDate": end_date}],
-        "metrics": [{"name": m} for m in metrics],
-        "dimensions": [{"name": d} for d in dimensions]
-    }
 
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
+class Ga4ReportSpec(BaseModel):
+    metrics: List[str] = ["sessions"]
+    dimensions: List[str] = ["date"]
+    start_date: str = "30daysAgo"
+    end_date: str = "today"
+    limit: Optional[int] = None
 
-    response = requests.post(url, headers=headers, json=payload)
 
-    if response.status_code == 200:
-        return response.json()
-    else:
-        return JSONResponse({
-            "error": "Failed to fetch GA4 report",
-            "status_code_from_google": response.status_code,
-            "details": response.json()
-        }, status_code=500)
+class Ga4BatchRequest(BaseModel):
+    property_ids: List[str] = Field(..., min_length=1)
+    reports: List[Ga4ReportSpec] = Field(..., min_length=1)
+    concurrency: int = Field(default=ga4_batch.DEFAULT_CONCURRENCY, ge=1, le=200)
+
+
+@app.post("/ga4/batch")
+async def get_ga4_batch(
+    body: Ga4BatchRequest,
+    request: Request,
+    authorization: str = Header(default=None)
+):
+    """
+    Runs the same reports for many properties. Reports go five to a
+    batchRunReports call, properties run concurrently, and one NDJSON line
+    per property is streamed back as soon as it is ready.
+    """
+    token = request.session.get("token")
+    if not token and authorization and authorization.startswith("Bearer "):
+        token = authorization.split("Bearer ")[1]
+
+    if not token:
+        return JSONResponse({"error": "Not authenticated"}, status_code=401)
+
+    try:
+        specs = [
+            {**spec.model_dump(), "start_date": parse_date_param(spec.start_date), "end_date": parse_date_param(spec.end_date)}
+            for spec in body.reports
+        ]
+    except ValueError as ve:
+        return JSONResponse({"error": str(ve)}, status_code=400)
+
+    property_ids = list(dict.fromkeys(pid.removeprefix("properties/") for pid in body.property_ids))
+    results = ga4_batch.run_batch(token, property_ids, specs, concurrency=body.concurrency)
+    return StreamingResponse(ga4_batch.ndjson_results(results), media_type="application/x-ndjson")
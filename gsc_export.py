@@ -0,0 +1,201 @@
+# gsc_export.py
+import asyncio
+import json
+import urllib.parse
+from datetime import date, timedelta
+from typing import AsyncIterator, List, Optional, Tuple
+
+from google_api import GSC_BASE, GoogleApiClient, QuotaLimiter, get_google_client
+
+GSC_MAX_ROWS = 25000          # searchAnalytics.query rowLimit ceiling
+GSC_PER_MINUTE = 1200         # default per-site, per-user quota
+DEFAULT_CONCURRENCY = 8
+DEVICES = ("DESKTOP", "MOBILE", "TABLET")
+METRICS = ("clicks", "impressions", "ctr", "position")
+ARROW_BATCH_ROWS = 10000
+
+_DONE = object()
+
+
+def date_shards(start: date, end: date, shard: str = "day") -> List[Tuple[date, date]]:
+    """Splits [start, end] into per-day or per-week ranges ("none" keeps one range)."""
+    if shard == "none":
+        return [(start, end)]
+    step = {"day": 1, "week": 7}[shard]
+    shards = []
+    while start <= end:
+        shard_end = min(start + timedelta(days=step - 1), end)
+        shards.append((start, shard_end))
+        start = shard_end + timedelta(days=1)
+    return shards
+
+
+def export_dimensions(dimensions: List[str], shard: str) -> List[str]:
+    """
+    Sharding by date only gives exact rows if every row is per day, so "date"
+    is added to the dimensions whenever the range is sharded.
+    """
+    if shard != "none" and "date" not in dimensions:
+        return ["date", *dimensions]
+    return list(dimensions)
+
+
+def shard_payloads(
+    start: date, end: date, dimensions: List[str], shard: str = "day", search_type: str = "web"
+) -> List[dict]:
+    """
+    One searchAnalytics.query body per date shard, and per device when
+    "device" is a dimension (each device filter returns a disjoint slice).
+    """
+    payloads = []
+    for shard_start, shard_end in date_shards(start, end, shard):
+        base = {
+            "startDate": str(shard_start),
+            "endDate": str(shard_end),
+            "dimensions": dimensions,
+            "type": search_type,
+            "rowLimit": GSC_MAX_ROWS,
+        }
+        if "device" in dimensions:
+            for device in DEVICES:
+                payloads.append({
+                    **base,
+                    "dimensionFilterGroups": [
+                        {"filters": [{"dimension": "device", "operator": "equals", "expression": device}]}
+                    ],
+                })
+        else:
+            payloads.append(base)
+    return payloads
+
+
+def flatten_row(row: dict, dimensions: List[str]) -> dict:
+    flat = dict(zip(dimensions, row.get("keys", [])))
+    for metric in METRICS:
+        flat[metric] = row.get(metric)
+    return flat
+
+
+async def fetch_shard(
+    client: GoogleApiClient, token: str, url: str, payload: dict, limiter: QuotaLimiter
+) -> AsyncIterator[List[dict]]:
+    """Pages through one shard with startRow, yielding each page of rows."""
+    start_row = 0
+    while True:
+        async with limiter:
+            data = await client.post(url, token, {**payload, "startRow": start_row})
+        rows = data.get("rows", [])
+        if rows:
+            yield rows
+        if len(rows) < payload["rowLimit"]:
+            return
+        start_row += len(rows)
+
+
+async def export_rows(
+    token: str,
+    site: str,
+    start: date,
+    end: date,
+    dimensions: List[str],
+    shard: str = "day",
+    search_type: str = "web",
+    concurrency: int = DEFAULT_CONCURRENCY,
+    per_minute: Optional[float] = GSC_PER_MINUTE,
+    client: Optional[GoogleApiClient] = None,
+) -> AsyncIterator[dict]:
+    """
+    Streams every Search Analytics row for a site and date range.
+
+    Shards are fetched concurrently within the quota and rows are yielded in
+    arrival order as soon as each page lands. Only a few pages are buffered,
+    so a slow consumer holds back the fetchers.
+    """
+    client = client or get_google_client()
+    dimensions = export_dimensions(dimensions, shard)
+    url = f"{GSC_BASE}/sites/{urllib.parse.quote(site.rstrip('/'), safe='')}/searchAnalytics/query"
+    payloads = shard_payloads(start, end, dimensions, shard, search_type)
+    limiter = QuotaLimiter(concurrency, per_minute)
+    pages: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    shards: asyncio.Queue = asyncio.Queue()
+    for payload in payloads:
+        shards.put_nowait(payload)
+
+    async def work():
+        try:
+            while not shards.empty():
+                payload = shards.get_nowait()
+                async for rows in fetch_shard(client, token, url, payload, limiter):
+                    await pages.put(rows)
+        except Exception as e:
+            # Handed to the consumer so one failed shard fails the export.
+            await pages.put(e)
+        finally:
+            await pages.put(_DONE)
+
+    workers = [asyncio.create_task(work()) for _ in range(min(concurrency, len(payloads)))]
+    try:
+        running = len(workers)
+        while running:
+            rows = await pages.get()
+            if rows is _DONE:
+                running -= 1
+                continue
+            if isinstance(rows, Exception):
+                raise rows
+            for row in rows:
+                yield flatten_row(row, dimensions)
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def ndjson_stream(rows: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    async for row in rows:
+        yield (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class _Chunks:
+    """Write-only file object that hands back whatever was written since the last take()."""
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+async def arrow_stream(
+    rows: AsyncIterator[dict], dimensions: List[str], batch_rows: int = ARROW_BATCH_ROWS
+) -> AsyncIterator[bytes]:
+    """Encodes rows as an Arrow IPC stream, one record batch per `batch_rows` rows."""
+    import pyarrow as pa
+
+    schema = pa.schema(
+        [(d, pa.string()) for d in dimensions]
+        + [("clicks", pa.int64()), ("impressions", pa.int64()), ("ctr", pa.float64()), ("position", pa.float64())]
+    )
+    chunks = _Chunks()
+    writer = pa.ipc.new_stream(pa.PythonFile(chunks, mode="w"), schema)
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+            batch = []
+            yield chunks.take()
+    if batch:
+        writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+    writer.close()
+    yield chunks.take()
@@ -0,0 +1,362 @@
+# http_cache.py
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+import aiohttp
+
+DEFAULT_CACHE_DIR = ".seo_cache"
+DEFAULT_MAX_AGE = 30 * 24 * 3600      # drop entries not revalidated for 30 days
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3      # 2 GiB of stored bodies
+READ_CHUNK = 64 * 1024
+COMMIT_EVERY = 200                     # index writes batched per commit
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    key: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_type: Optional[str]
+    size: int
+    stored_at: float
+
+    def validators(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    On-disk response cache: an SQLite index of validators plus one body file per URL.
+
+    Entries are revalidated with If-None-Match / If-Modified-Since on every use
+    unless they were validated less than `fresh_for` seconds ago. Entries not
+    revalidated within `max_age` seconds are evicted, and the least recently
+    used bodies are dropped once the total size exceeds `max_bytes`.
+
+    Index writes are committed every COMMIT_EVERY changes and on `close`;
+    `cached_get` runs them in a thread so they never block the event loop.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_DIR,
+        max_age: float = DEFAULT_MAX_AGE,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        fresh_for: float = 0.0,
+    ):
+        self.path = path
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.fresh_for = fresh_for
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.bytes_saved = 0
+
+        self._bodies = os.path.join(path, "bodies")
+        os.makedirs(self._bodies, exist_ok=True)
+        # Shared by the event loop (lookups) and worker threads (writes).
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._db = sqlite3.connect(os.path.join(path, "index.sqlite"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                key TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_type TEXT,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._db.commit()
+        # Running total of stored body sizes, so stores don't have to sum the table.
+        (self._bytes,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        self.evict()
+
+    def body_path(self, key: str) -> str:
+        return os.path.join(self._bodies, key[:2], key)
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, key, etag, last_modified, content_type, size, stored_at FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            entry = CacheEntry(*row)
+            if not os.path.exists(self.body_path(entry.key)):
+                self._delete(url, entry.key, entry.size)
+                return None
+            return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.time() - entry.stored_at < self.fresh_for
+
+    def touch(self, entry: CacheEntry, revalidated: bool = False):
+        now = time.time()
+        with self._lock:
+            if revalidated:
+                self._db.execute(
+                    "UPDATE responses SET stored_at = ?, accessed_at = ? WHERE url = ?", (now, now, entry.url)
+                )
+            else:
+                self._db.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (now, entry.url))
+            self._maybe_commit()
+
+    def store(self, url: str, tmp_path: str, headers, size: int):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        final = self.body_path(key)
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        os.replace(tmp_path, final)
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url, key, headers.get("ETag"), headers.get("Last-Modified"), headers.get("Content-Type"),
+                    size, now, now,
+                ),
+            )
+            self._bytes += size - (old[0] if old else 0)
+            self._maybe_commit()
+            if self._bytes > self.max_bytes:
+                self._trim()
+
+    def new_tmp_path(self) -> str:
+        return os.path.join(self._bodies, f".tmp-{os.getpid()}-{time.monotonic_ns()}")
+
+    def evict(self):
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            expired = self._db.execute(
+                "SELECT url, key, size FROM responses WHERE stored_at < ?", (cutoff,)
+            ).fetchall()
+            for url, key, size in expired:
+                self._delete(url, key, size)
+            if self._bytes > self.max_bytes:
+                self._trim()
+            self._commit()
+
+    def _trim(self):
+        # Walks the least recently used entries only until enough bytes are freed.
+        cursor = self._db.execute("SELECT url, key, size FROM responses ORDER BY accessed_at")
+        victims = []
+        freed = 0
+        for url, key, size in cursor:
+            if self._bytes - freed <= self.max_bytes:
+                break
+            victims.append((url, key, size))
+            freed += size
+        cursor.close()
+        for url, key, size in victims:
+            self._delete(url, key, size)
+
+    def _delete(self, url: str, key: str, size: int):
+        try:
+            os.remove(self.body_path(key))
+        except FileNotFoundError:
+            pass
+        self._db.execute("DELETE FROM responses WHERE url = ?", (url,))
+        self._bytes -= size
+        self._maybe_commit()
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self._commit()
+
+    def _commit(self):
+        self._db.commit()
+        self._pending = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "bytes_saved": self.bytes_saved,
+        }
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._db.close()
+
+
+class CachedResponse:
+    """
+    The subset of aiohttp.ClientResponse the pipeline uses, backed either by a
+    live response (optionally written through to the cache) or by a cached body.
+    """
+
+    def __init__(self, url, status, headers, resp=None, cache=None, entry=None, store=False):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.from_cache = resp is None
+        self._resp = resp
+        self._cache = cache
+        self._entry = entry
+        self._store = store
+        self._tmp_path = None
+
+    async def iter_chunked(self, size: int = READ_CHUNK) -> AsyncIterator[bytes]:
+        if self._resp is None:
+            with open(self._cache.body_path(self._entry.key), "rb") as f:
+                while chunk := f.read(size):
+                    yield chunk
+            return
+
+        if not self._store:
+            async for chunk in self._resp.content.iter_chunked(size):
+                yield chunk
+            return
+
+        # Write through to a temp file; it only becomes a cache entry once the
+        # whole body has been read.
+        self._tmp_path = self._cache.new_tmp_path()
+        written = 0
+        with open(self._tmp_path, "wb") as f:
+            async for chunk in self._resp.content.iter_chunked(size):
+                f.write(chunk)
+                written += len(chunk)
+                yield chunk
+        await asyncio.to_thread(self._cache.store, self.url, self._tmp_path, self.headers, written)
+        self._tmp_path = None
+
+    async def read(self) -> bytes:
+        return b"".join([chunk async for chunk in self.iter_chunked()])
+
+    async def text(self) -> str:
+        # The body was read chunk by chunk, so aiohttp has nothing to sniff an
+        # encoding from; the header's charset, else UTF-8, works for both cases.
+        body = await self.read()
+        charset = "utf-8"
+        for part in (self.headers.get("Content-Type") or "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name.lower() == "charset" and value:
+                charset = value.strip('"')
+        try:
+            return body.decode(charset, errors="replace")
+        except LookupError:
+            return body.decode("utf-8", errors="replace")
+
+    def raise_for_status(self):
+        if self._resp is not None:
+            self._resp.raise_for_status()
+
+    def _discard(self):
+        if self._tmp_path:
+            try:
+                os.remove(self._tmp_path)
+            except FileNotFoundError:
+                pass
+
+
+_cache: Optional[HttpCache] = None
+
+
+def configure_cache(cache: Optional[HttpCache]):
+    """Installs the process-wide cache used by `cached_get`; None disables caching."""
+    global _cache
+    if _cache is not None and _cache is not cache:
+        _cache.close()
+    _cache = cache
+
+
+def get_cache() -> Optional[HttpCache]:
+    return _cache
+
+
+def _max_age(cache_control: str) -> Optional[int]:
+    for directive in cache_control.split(","):
+        name, _, value = directive.strip().partition("=")
+        if name == "max-age":
+            try:
+                return int(value.strip('"'))
+            except ValueError:
+                return None
+    return None
+
+
+def _cacheable(resp: aiohttp.ClientResponse, cache: HttpCache) -> bool:
+    """
+    Worth storing: the response can be revalidated, or its max-age covers the
+    `fresh_for` window it would be served from the cache without revalidation.
+    Anything else would be fetched and rewritten in full on every later use.
+    """
+    cache_control = resp.headers.get("Cache-Control", "").lower()
+    if "no-store" in cache_control:
+        return False
+    if resp.headers.get("ETag") or resp.headers.get("Last-Modified"):
+        return True
+    max_age = _max_age(cache_control)
+    return bool(cache.fresh_for) and max_age is not None and max_age >= cache.fresh_for
+
+
+@asynccontextmanager
+async def cached_get(
+    session: aiohttp.ClientSession,
+    url: str,
+    headers: Optional[dict] = None,
+    timeout=None,
+    cache: Optional[HttpCache] = None,
+) -> AsyncIterator[CachedResponse]:
+    """
+    GET through the response cache.
+
+    A 304 from the origin is reported as a 200 served from the stored body, so
+    callers handle fresh and revalidated responses the same way.
+    """
+    cache = cache or _cache
+    entry = cache.lookup(url) if cache else None
+    if entry and cache.is_fresh(entry):
+        cache.hits += 1
+        cache.bytes_saved += entry.size
+        await asyncio.to_thread(cache.touch, entry)
+        yield CachedResponse(url, 200, {"Content-Type": entry.content_type or ""}, cache=cache, entry=entry)
+        return
+
+    request_headers = dict(headers or {})
+    if entry:
+        request_headers.update(entry.validators())
+
+    async with session.get(url, headers=request_headers, timeout=timeout, allow_redirects=True) as resp:
+        if resp.status == 304 and entry:
+            cache.hits += 1
+            cache.revalidated += 1
+            cache.bytes_saved += entry.size
+            await asyncio.to_thread(cache.touch, entry, True)
+            response = CachedResponse(url, 200, {"Content-Type": entry.content_type or ""}, cache=cache, entry=entry)
+        else:
+            if cache:
+                cache.misses += 1
+            store = bool(cache) and resp.status == 200 and _cacheable(resp, cache)
+            response = CachedResponse(url, resp.status, resp.headers, resp=resp, cache=cache, store=store)
+        try:
+            yield response
+        finally:
+            response._discard()
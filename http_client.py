@@ -0,0 +1,156 @@
+# http_client.py
+import asyncio
+import ssl
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import aiohttp
+import certifi
+
+from metrics import metrics
+
+ssl_context = ssl.create_default_context(cafile=certifi.where())
+
+
+@dataclass
+class HttpClientConfig:
+    limit: int = 100                 # total open connections
+    limit_per_host: int = 10         # open connections per host
+    keepalive_timeout: float = 30.0  # seconds an idle connection stays in the pool
+    ttl_dns_cache: int = 300         # seconds a DNS answer is reused
+    timeout: float = 30.0            # default total timeout per request
+    headers: dict = field(default_factory=dict)
+
+
+@dataclass
+class ConnectionStats:
+    opened: int = 0
+    reused: int = 0
+    dns_hits: int = 0
+    dns_misses: int = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        total = self.opened + self.reused
+        return self.reused / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "opened": self.opened,
+            "reused": self.reused,
+            "reuse_ratio": round(self.reuse_ratio, 3),
+            "dns_hits": self.dns_hits,
+            "dns_misses": self.dns_misses,
+        }
+
+
+_config = HttpClientConfig()
+_stats = ConnectionStats()
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def configure(config: HttpClientConfig):
+    """Sets the pool configuration. Takes effect for the next session created."""
+    global _config
+    _config = config
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    """
+    Connection reuse and DNS cache counts, plus per-host timings of the HTTP
+    phases (dns, connect = TCP + TLS, ttfb = request sent to headers received)
+    and bytes downloaded, recorded in metrics.
+    """
+    trace = aiohttp.TraceConfig()
+    clock = time.perf_counter
+
+    async def on_request_start(session, ctx, params):
+        ctx.host = params.url.host
+        ctx.start = ctx.ready = clock()
+
+    async def on_dns_start(session, ctx, params):
+        ctx.dns_start = clock()
+
+    async def on_dns_end(session, ctx, params):
+        metrics.observe("dns", clock() - ctx.dns_start, params.host)
+
+    async def on_connect_start(session, ctx, params):
+        ctx.connect_start = clock()
+
+    async def on_create(session, ctx, params):
+        _stats.opened += 1
+        ctx.ready = clock()
+        metrics.observe("connect", ctx.ready - ctx.connect_start, getattr(ctx, "host", None))
+
+    async def on_reuse(session, ctx, params):
+        _stats.reused += 1
+        ctx.ready = clock()
+
+    async def on_dns_hit(session, ctx, params):
+        _stats.dns_hits += 1
+
+    async def on_dns_miss(session, ctx, params):
+        _stats.dns_misses += 1
+
+    async def on_request_end(session, ctx, params):
+        metrics.observe("ttfb", clock() - ctx.ready, ctx.host)
+        metrics.count("http_responses", host=ctx.host)
+
+    async def on_chunk(session, ctx, params):
+        metrics.count("http_bytes", len(params.chunk), getattr(ctx, "host", None))
+
+    async def on_exception(session, ctx, params):
+        metrics.count("http_errors", host=getattr(ctx, "host", None))
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_dns_resolvehost_start.append(on_dns_start)
+    trace.on_dns_resolvehost_end.append(on_dns_end)
+    trace.on_connection_create_start.append(on_connect_start)
+    trace.on_connection_create_end.append(on_create)
+    trace.on_connection_reuseconn.append(on_reuse)
+    trace.on_dns_cache_hit.append(on_dns_hit)
+    trace.on_dns_cache_miss.append(on_dns_miss)
+    trace.on_request_end.append(on_request_end)
+    trace.on_response_chunk_received.append(on_chunk)
+    trace.on_request_exception.append(on_exception)
+    return trace
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """
+    Returns the pipeline-wide session, creating it on first use.
+
+    All requests share one TCPConnector, so DNS answers and TCP/TLS connections
+    are reused across hunt, sitemap parsing, link checks and page fetches.
+    """
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=_config.limit,
+            limit_per_host=_config.limit_per_host,
+            keepalive_timeout=_config.keepalive_timeout,
+            ttl_dns_cache=_config.ttl_dns_cache,
+            ssl=ssl_context,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            headers=_config.headers,
+            timeout=aiohttp.ClientTimeout(total=_config.timeout),
+            trace_configs=[_trace_config()],
+        )
+        _session_loop = loop
+    return _session
+
+
+async def close_session():
+    global _session, _session_loop
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session, _session_loop = None, None
+
+
+def connection_stats() -> ConnectionStats:
+    return _stats
@@ -0,0 +1,161 @@
+# link_graph.py
+import heapq
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from url_index import SeenSet, url_key
+
+# Node flags
+IN_SITEMAP = 1
+LINKED = 2          # target of at least one crawled link, or the crawl's start page
+CRAWLED = 4         # fetched and parsed
+EXTERNAL = 8        # on another host; checked, never crawled
+CHECKED = 16        # status known
+BROKEN = 32
+
+NO_DEPTH = 0xFFFF
+DEFAULT_MAX_NODES = 2_000_000
+DEFAULT_MAX_EDGES = 20_000_000
+RECENT_URLS = 50_000        # exact spellings remembered, so nav / footer links skip canonicalization
+
+
+class LinkGraph:
+    """
+    Link graph of one site with integer node IDs and array-backed storage.
+
+    A node costs its URL in UTF-8 inside one shared buffer plus ~45 bytes
+    (ID map, flags, depth, in-link count, status); an edge costs 8 bytes in
+    two parallel ID arrays. A million-edge site therefore fits in tens of
+    MB. Beyond `max_nodes` / `max_edges` new URLs and links are counted in
+    `dropped_nodes` / `dropped_edges` but not stored, so memory stays
+    bounded on any site.
+
+    IDs are handed out in discovery order, which is what lets the crawler use
+    a cursor instead of a frontier queue.
+    """
+
+    def __init__(self, host: str, max_nodes: int = DEFAULT_MAX_NODES, max_edges: int = DEFAULT_MAX_EDGES):
+        self.host = host.lower()
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+        # URL digest -> node ID; IDs are the digests' insertion order
+        self.ids = SeenSet(ids=True)
+        self._urls = bytearray()
+        self._url_ends = array("Q")
+        self.flags = bytearray()
+        self.depth = array("H")         # hops from the start page when discovered
+        self.in_links = array("I")
+        self.status = array("H")        # HTTP status of the check, 0 if none
+        self.src = array("I")
+        self.dst = array("I")
+        self.dropped_nodes = 0
+        self.dropped_edges = 0
+        self._recent: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.flags)
+
+    @property
+    def edges(self) -> int:
+        return len(self.dst)
+
+    @property
+    def truncated(self) -> bool:
+        return bool(self.dropped_nodes or self.dropped_edges)
+
+    def url(self, node: int) -> str:
+        start = self._url_ends[node - 1] if node else 0
+        return self._urls[start:self._url_ends[node]].decode("utf-8", "surrogatepass")
+
+    def node(self, url: str) -> Optional[int]:
+        return self.ids.id_of(url_key(url))
+
+    def is_internal(self, url: str) -> bool:
+        return urlsplit(url).netloc.lower() == self.host
+
+    def _append(self, digest: bytes, url: str, flags: int, depth: int) -> int:
+        # Every added digest gets a node, so its insertion number is the next node ID.
+        node = len(self.flags)
+        self.ids.add(digest)
+        self._urls += url.encode("utf-8", "surrogatepass")
+        self._url_ends.append(len(self._urls))
+        self.flags.append(flags | (0 if self.is_internal(url) else EXTERNAL))
+        self.depth.append(depth)
+        self.in_links.append(0)
+        self.status.append(0)
+        return node
+
+    def add_node(self, url: str, flags: int = 0, depth: int = NO_DEPTH) -> Optional[int]:
+        """ID of the URL, added with `flags` if new; None once the graph is full."""
+        digest = url_key(url)
+        node = self.ids.id_of(digest)
+        if node is not None:
+            self.flags[node] |= flags
+            self.depth[node] = min(self.depth[node], depth)
+            return node
+        if len(self) >= self.max_nodes:
+            self.dropped_nodes += 1
+            return None
+        return self._append(digest, url, flags, depth)
+
+    def add_links(self, src: int, urls: Iterable[str]):
+        """Records a crawled page's outlinks; repeats and self-links are skipped."""
+        depth = min(self.depth[src] + 1, NO_DEPTH - 1)
+        seen = set()
+        recent = self._recent
+        for url in urls:
+            node = recent.get(url)
+            if node is None:
+                node = self.add_node(url, LINKED, depth)
+                if node is None:
+                    continue
+                if len(recent) >= RECENT_URLS:
+                    recent.clear()
+                recent[url] = node
+            else:
+                self.flags[node] |= LINKED
+                if depth < self.depth[node]:
+                    self.depth[node] = depth
+            if node == src or node in seen:
+                continue
+            seen.add(node)
+            if len(self.dst) >= self.max_edges:
+                self.dropped_edges += 1
+                continue
+            self.src.append(src)
+            self.dst.append(node)
+            self.in_links[node] += 1
+
+    def select(self, all_of: int = 0, none_of: int = 0) -> Iterator[int]:
+        """IDs of the nodes that have every flag in `all_of` and none in `none_of`."""
+        for node, flags in enumerate(self.flags):
+            if flags & all_of == all_of and not flags & none_of:
+                yield node
+
+    def orphans(self) -> Iterator[int]:
+        """Internal sitemap URLs that no crawled page links to."""
+        for node in self.select(IN_SITEMAP, EXTERNAL):
+            if not self.in_links[node] and self.depth[node] != 0:
+                yield node
+
+    def most_linked(self, n: int = 10) -> List[Tuple[int, int]]:
+        """(node, in-links) for the `n` internal pages with the most in-links."""
+        internal = (node for node in range(len(self)) if not self.flags[node] & EXTERNAL)
+        return [(node, self.in_links[node]) for node in heapq.nlargest(n, internal, key=self.in_links.__getitem__)]
+
+    def sources(self, targets: Iterable[int], per_target: int = 3) -> Dict[int, List[int]]:
+        """Up to `per_target` pages linking to each target, in one pass over the edges."""
+        found: Dict[int, List[int]] = {node: [] for node in targets}
+        if not found:
+            return found
+        for src, dst in zip(self.src, self.dst):
+            pages = found.get(dst)
+            if pages is not None and len(pages) < per_target:
+                pages.append(src)
+        return found
+
+    def memory_bytes(self) -> int:
+        ids = self.ids.memory_bytes
+        nodes = len(self._urls) + len(self) * (8 + 1 + 2 + 4 + 2)
+        return ids + nodes + len(self.dst) * 8
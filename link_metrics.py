@@ -0,0 +1,150 @@
+# link_metrics.py
+import logging
+from typing import Optional, Tuple
+
+from link_graph import CRAWLED, EXTERNAL, LinkGraph
+
+DAMPING = 0.85
+TOLERANCE = 1e-6        # L1 change between iterations at which PageRank stops
+MAX_ITERATIONS = 100
+
+
+def internal_csr(graph: LinkGraph):
+    """
+    The graph's internal links as CSR arrays (indptr, indices), rows being
+    the linking page. Links to other hosts are dropped: they neither carry
+    PageRank nor lead anywhere a crawl from the homepage can follow.
+    """
+    import numpy as np
+
+    n = len(graph)
+    src = np.frombuffer(graph.src, dtype=np.uint32)
+    dst = np.frombuffer(graph.dst, dtype=np.uint32)
+    external = (np.frombuffer(graph.flags, dtype=np.uint8) & EXTERNAL) != 0
+    keep = ~external[dst]
+    src, dst = src[keep], dst[keep]
+    order = np.argsort(src, kind="stable")
+    indices = dst[order].astype(np.int64)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, indices
+
+
+def pagerank(indptr, indices, internal, damping: float = DAMPING, tol: float = TOLERANCE,
+             max_iter: int = MAX_ITERATIONS) -> Tuple["object", int]:
+    """
+    Power iteration over the CSR graph; `internal` masks the pages that take
+    part. Rank of pages without outlinks (dangling) is spread evenly, so the
+    scores always sum to 1. Returns (scores, iterations).
+    """
+    import numpy as np
+
+    n = len(indptr) - 1
+    count = int(internal.sum())
+    rank = np.zeros(n)
+    if not count:
+        return rank, 0
+    teleport = internal / count
+    rank[:] = teleport
+    out_degree = np.diff(indptr)
+    dangling = internal & (out_degree == 0)
+    # Each edge carries rank[src] / out_degree[src]; repeating the per-row share
+    # over the row's edges and scattering with bincount is one CSR^T · x product.
+    share = np.divide(1.0, out_degree, out=np.zeros(n), where=out_degree > 0)
+    for iteration in range(1, max_iter + 1):
+        flow = np.bincount(indices, weights=np.repeat(rank * share, out_degree), minlength=n)
+        new = damping * (flow + rank[dangling].sum() * teleport) + (1 - damping) * teleport
+        delta = np.abs(new - rank).sum()
+        rank = new
+        if delta < tol:
+            break
+    return rank, iteration
+
+
+def click_depth(indptr, indices, root: int):
+    """Fewest clicks from `root` to every page (-1 if unreachable), one BFS level per step."""
+    import numpy as np
+
+    n = len(indptr) - 1
+    depth = np.full(n, -1, dtype=np.int32)
+    depth[root] = 0
+    frontier = np.array([root], dtype=np.int64)
+    level = 0
+    while frontier.size:
+        starts, counts = indptr[frontier], indptr[frontier + 1] - indptr[frontier]
+        total = int(counts.sum())
+        if not total:
+            break
+        # Positions of every outlink of every frontier page, without a Python loop.
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+        targets = indices[offsets]
+        frontier = np.unique(targets[depth[targets] < 0])
+        level += 1
+        depth[frontier] = level
+    return depth
+
+
+class LinkMetrics:
+    """Internal PageRank, click depth and in-link counts for every page of a crawl."""
+
+    def __init__(self, graph: LinkGraph, pagerank, depth, in_links, iterations: int):
+        self.graph = graph
+        self.pagerank = pagerank
+        self.depth = depth
+        self.in_links = in_links
+        self.iterations = iterations
+        internal = int((self.depth >= 0).sum())
+        self._scale = max(internal, 1)
+
+    def node_metrics(self, node: int) -> dict:
+        return {
+            # 1.0 is an average page; the homepage is usually far above it.
+            "pagerank": round(float(self.pagerank[node]) * self._scale, 4),
+            "click_depth": int(self.depth[node]) if self.depth[node] >= 0 else None,
+            "in_links": int(self.in_links[node]),
+        }
+
+    def for_url(self, url: str) -> dict:
+        node = self.graph.node(url)
+        if node is None or self.graph.flags[node] & EXTERNAL:
+            return {"pagerank": None, "click_depth": None, "in_links": None}
+        return self.node_metrics(node)
+
+    def top(self, n: int = 10, crawled_only: bool = True):
+        """(node, metrics) for the `n` pages with the highest PageRank."""
+        import numpy as np
+
+        scores = self.pagerank
+        if crawled_only:
+            crawled = (np.frombuffer(self.graph.flags, dtype=np.uint8) & CRAWLED) != 0
+            scores = np.where(crawled, scores, -1.0)
+        nodes = np.argsort(-scores, kind="stable")[:n]
+        return [(int(node), self.node_metrics(int(node))) for node in nodes if scores[node] >= 0]
+
+    def link_impact(self, targets):
+        """PageRank of the pages linking to each target, summed: how much a broken link costs."""
+        import numpy as np
+
+        src = np.frombuffer(self.graph.src, dtype=np.uint32)
+        dst = np.frombuffer(self.graph.dst, dtype=np.uint32)
+        impact = np.bincount(dst, weights=self.pagerank[src], minlength=len(self.graph)) * self._scale
+        return {node: float(impact[node]) for node in targets}
+
+
+def compute_link_metrics(graph: LinkGraph, root: int = 0, damping: float = DAMPING) -> Optional[LinkMetrics]:
+    """
+    PageRank over the internal pages reachable from `root`, plus click depth
+    and in-links. Needs NumPy; returns None without it.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        logging.warning("⚠️ NumPy is not installed; skipping PageRank and click depth.")
+        return None
+
+    indptr, indices = internal_csr(graph)
+    depth = click_depth(indptr, indices, root)
+    # Orphans and unreachable pages get no PageRank of their own.
+    scores, iterations = pagerank(indptr, indices, depth >= 0, damping)
+    in_links = np.bincount(indices, minlength=len(graph))
+    return LinkMetrics(graph, scores, depth, in_links, iterations)
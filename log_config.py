@@ -0,0 +1,44 @@
+# log_config.py
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, TextIO
+
+LOG_FORMAT = "%(message)s"
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(level: str = "INFO", stream: Optional[TextIO] = None, fmt: str = LOG_FORMAT):
+    """
+    Sends every log record through a queue to a background thread that does
+    the writing, so a crawl logging thousands of lines never blocks the event
+    loop on the terminal. Calling it again swaps the destination, e.g. to a
+    per-domain log file in batch mode.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter(fmt))
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(QueueHandler(records))
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    _listener = QueueListener(records, handler)
+    _listener.start()
+
+
+def stop_logging():
+    """Flushes the queued records; call before the process exits or the stream closes."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -1,24 +1,47 @@
+from fastapi import Request, Query, Header
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import json
+import logging
+from typing import Optional
+import openai
+from agent import generate_seo_advice, stream_seo_advice
+from google_api import GoogleApiError
+from google_console_analytics import app, fetch_ga4_report, fetch_gsc_performance, parse_date_param, parse_gsc_range
 
+# The advice endpoint lives on the same app as the GSC / GA4 endpoints, so it
+# shares the session middleware, the Google API pool and the response cache.
 
-from fastapi import FastAPI, Request, Query, Header
-from fastapi.responses import RedirectResponse, JSONResponse
-from starlette.config import Config
-from starlette.middleware.sessions import SessionMiddleware
-from google_auth_oauthlib.flow import Flow
-import os
-from dotenv import load_dotenv
-import urllib.parse
-from typing import List
-import pathlib
-import requests
-from agent import generate_seo_advice
 
-app = FastAPI()
+def sse_event(data: dict, event: Optional[str] = None) -> bytes:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def advice_events(gsc_data: dict, ga4_data: dict):
+    """Server-sent events: one `data` event per text delta, then `done` (or `error`)."""
+    try:
+        async for delta in stream_seo_advice(gsc_summary=gsc_data, ga4_summary=ga4_data):
+            yield sse_event({"delta": delta})
+    except (openai.APITimeoutError, TimeoutError):
+        logging.error("SEO advice stream timed out")
+        yield sse_event({"error": "Timed out waiting for SEO advice"}, event="error")
+        return
+    except openai.OpenAIError as e:
+        logging.error(f"SEO advice stream failed: {e}")
+        yield sse_event({"error": str(e)}, event="error")
+        return
+    yield sse_event({}, event="done")
+
 
 @app.get("/seo/ai-advice")
-def seo_ai_advice(
+async def seo_ai_advice(
     site: str,
     request: Request,
+    property_id: str = Query(...),  # GA4 property ID, with or without the "properties/" prefix
+    start_date: str = Query(default="28daysAgo"),
+    end_date: str = Query(default="today"),
+    stream: bool = Query(default=False),
     authorization: str = Header(default=None),
 ):
     # 1. Get user token
@@ -28,37 +51,41 @@ def seo_ai_advice(
     if not token:
         return JSONResponse({"error": "Not authenticated"}, status_code=401)
 
-    # 2. Fetch GSC data (summary)
-    gsc_headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    encoded_site = urllib.parse.quote(site.rstrip("/"), safe="")
-    gsc_url = f"https://searchconsole.googleapis.com/webmasters/v3/sites/{encoded_site}/searchAnalytics/query"
-    gsc_payload = {
-        "startDate": "2024-06-01",
-        "endDate": "2024-06-30",
-        "dimensions": ["query"],
-        "rowLimit": 5,
-    }
-    gsc_response = requests.post(gsc_url, headers=gsc_headers, json=gsc_payload)
-    if gsc_response.status_code != 200:
-        return JSONResponse({"error": "Failed to fetch GSC data"}, status_code=500)
-    gsc_data = gsc_response.json()
+    try:
+        start_date = parse_date_param(start_date)
+        end_date = parse_date_param(end_date)
+        gsc_start, gsc_end = parse_gsc_range(start_date, end_date)
+    except ValueError as ve:
+        return JSONResponse({"error": str(ve)}, status_code=400)
+
+    # 2-3. Fetch the GSC and GA4 summaries concurrently
+    try:
+        gsc_data, ga4_data = await asyncio.gather(
+            fetch_gsc_performance(token, site, gsc_start, gsc_end, ["query"], 5),
+            fetch_ga4_report(token, property_id, start_date, end_date, ["sessions", "totalUsers"], ["date"]),
+        )
+    except GoogleApiError as e:
+        return JSONResponse({
+            "error": "Failed to fetch GSC / GA4 data",
+            "status_code_from_google": e.status,
+            "details": e.details
+        }, status_code=500)
 
-    # 3. Fetch GA4 data summary similarly (example with sessions & users)
-    ga4_headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    ga4_property_id = "properties/123456789"  # Get this from your GA4 account list or param
-    ga4_url = f"https://analyticsdata.googleapis.com/v1beta/{ga4_property_id}:runReport"
-    ga4_payload = {
-        "dateRanges": [{"startDate": "2024-06-01", "endDate": "2024-06-30"}],
-        "metrics": [{"name": "sessions"}, {"name": "users"}],
-        "dimensions": [{"name": "date"}],
-    }
-    ga4_response = requests.post(ga4_url, headers=ga4_headers, json=ga4_payload)
-    if ga4_response.status_code != 200:
-        return JSONResponse({"error": "Failed to fetch GA4 data"}, status_code=500)
-    ga4_data = ga4_response.json()
+    # 4. Generate SEO advice via OpenAI, streamed as server-sent events if asked for
+    if stream or "text/event-stream" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            advice_events(gsc_data, ga4_data),
+            media_type="text/event-stream",
+            # Keep proxies from buffering, so the first tokens reach the client right away.
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
-    # 4. Generate SEO advice via OpenAI
-    advice = generate_seo_advice(gsc_summary=gsc_data, ga4_summary=ga4_data)
+    try:
+        advice = await generate_seo_advice(gsc_summary=gsc_data, ga4_summary=ga4_data)
+    except (openai.APITimeoutError, TimeoutError):
+        return JSONResponse({"error": "Timed out waiting for SEO advice"}, status_code=504)
+    except openai.OpenAIError as e:
+        return JSONResponse({"error": "Failed to generate SEO advice", "message": str(e)}, status_code=502)
 
     # 5. Return advice
     return {"seo_advice": advice}
@@ -0,0 +1,190 @@
+# metrics.py
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+# Upper bounds in seconds, from a cached parse to a slow LLM call.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+MAX_HOSTS = 200         # distinct host labels; later hosts are counted as "other"
+PREFIX = "seo"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; quantiles are interpolated within a bucket."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)     # last slot: above the largest bucket
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def merge(self, other: "Histogram"):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lo = BUCKETS[i - 1] if i else 0.0
+                hi = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1] * 2
+                return lo + (hi - lo) * (rank - seen) / n
+            seen += n
+        return BUCKETS[-1]
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_s": round(self.sum, 3),
+            "mean_ms": round(self.sum / self.count * 1000, 1) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1000, 1),
+            "p90_ms": round(self.quantile(0.9) * 1000, 1),
+            "p99_ms": round(self.quantile(0.99) * 1000, 1),
+        }
+
+
+class Metrics:
+    """
+    Per-stage latency histograms (by host where there is one), counters such
+    as bytes transferred, and in-flight gauges with their peaks.
+
+    Stages are the pipeline steps (get, check_link, fetch_html, parse,
+    sitemap, google_api, openai, ...) and the HTTP phases recorded by the
+    aiohttp trace in http_client (dns, connect, ttfb, download).
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.counters: Dict[Tuple[str, str], float] = defaultdict(float)
+        self.in_flight: Dict[str, int] = defaultdict(int)
+        self.peak: Dict[str, int] = defaultdict(int)
+        self._hosts = set()
+        self.started = time.time()
+
+    def host_label(self, host: Optional[str]) -> str:
+        if not host:
+            return ""
+        host = host.lower()
+        if host in self._hosts:
+            return host
+        if len(self._hosts) >= MAX_HOSTS:
+            return "other"
+        self._hosts.add(host)
+        return host
+
+    def observe(self, stage: str, seconds: float, host: Optional[str] = None):
+        key = (stage, self.host_label(host))
+        histogram = self.latency.get(key)
+        if histogram is None:
+            histogram = self.latency[key] = Histogram()
+        histogram.observe(seconds)
+
+    def count(self, name: str, value: float = 1, host: Optional[str] = None):
+        self.counters[(name, self.host_label(host))] += value
+
+    @contextmanager
+    def track(self, stage: str, host: Optional[str] = None) -> Iterator[None]:
+        """Times the block as `stage` and counts it in flight meanwhile; errors are counted too."""
+        self.in_flight[stage] += 1
+        self.peak[stage] = max(self.peak[stage], self.in_flight[stage])
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.count(f"{stage}_errors", host=host)
+            raise
+        finally:
+            self.in_flight[stage] -= 1
+            self.observe(stage, time.perf_counter() - t0, host)
+
+    def stages(self) -> Dict[str, Histogram]:
+        """Histograms merged over hosts."""
+        merged: Dict[str, Histogram] = {}
+        for (stage, _), histogram in self.latency.items():
+            merged.setdefault(stage, Histogram()).merge(histogram)
+        return merged
+
+    def summary(self, top_hosts: int = 10) -> dict:
+        """JSON-ready totals: per stage, the slowest hosts, counters and peak concurrency."""
+        hosts: Dict[str, float] = defaultdict(float)
+        for (stage, host), histogram in self.latency.items():
+            if host:
+                hosts[host] += histogram.sum
+        counters: Dict[str, float] = defaultdict(float)
+        for (name, _), value in self.counters.items():
+            counters[name] += value
+        return {
+            "elapsed_s": round(time.time() - self.started, 3),
+            "stages": {stage: h.as_dict() for stage, h in sorted(self.stages().items())},
+            "hosts_by_time_s": {
+                host: round(total, 3) for host, total in sorted(hosts.items(), key=lambda kv: -kv[1])[:top_hosts]
+            },
+            "counters": {name: _json_number(value) for name, value in sorted(counters.items())},
+            "peak_in_flight": dict(sorted(self.peak.items())),
+        }
+
+    def prometheus(self, extra: Optional[Dict[str, float]] = None) -> str:
+        """Text exposition format (version 0.0.4) for a /metrics endpoint."""
+        lines = [
+            f"# HELP {PREFIX}_stage_seconds Latency per pipeline stage and host.",
+            f"# TYPE {PREFIX}_stage_seconds histogram",
+        ]
+        for (stage, host), histogram in sorted(self.latency.items()):
+            labels = f'stage="{_escape(stage)}",host="{_escape(host)}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS, histogram.counts):
+                cumulative += n
+                lines.append(f'{PREFIX}_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{PREFIX}_stage_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"{PREFIX}_stage_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"{PREFIX}_stage_seconds_count{{{labels}}} {histogram.count}")
+
+        names = sorted({name for name, _ in self.counters})
+        for name in names:
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            for (counter, host), value in sorted(self.counters.items()):
+                if counter == name:
+                    lines.append(f'{PREFIX}_{name}_total{{host="{_escape(host)}"}} {_number(value)}')
+
+        lines.append(f"# TYPE {PREFIX}_in_flight gauge")
+        for stage, value in sorted(self.in_flight.items()):
+            lines.append(f'{PREFIX}_in_flight{{stage="{_escape(stage)}"}} {value}')
+        lines.append(f"# TYPE {PREFIX}_in_flight_peak gauge")
+        for stage, value in sorted(self.peak.items()):
+            lines.append(f'{PREFIX}_in_flight_peak{{stage="{_escape(stage)}"}} {value}')
+
+        for name, value in sorted((extra or {}).items()):
+            lines.append(f"# TYPE {PREFIX}_{name} gauge")
+            lines.append(f"{PREFIX}_{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _json_number(value: float):
+    return int(value) if float(value).is_integer() else round(value, 3)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+metrics = Metrics()
@@ -0,0 +1,96 @@
+# parse_pool.py
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from extractors import default_backend, page_fields_batch
+
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_LINGER = 0.05      # seconds a partial batch waits for more pages
+PENDING_PER_WORKER = 64    # fetched-but-unparsed pages allowed per worker
+
+
+class ParsePool:
+    """
+    Parses fetched HTML in worker processes so the event loop keeps fetching.
+
+    Pages are grouped into batches of `batch_size` (or whatever arrived within
+    `linger` seconds) to amortise pickling and IPC. At most `max_pending` pages
+    may be waiting for, or in, a worker; further `parse` calls block until
+    results come back, which holds fetchers back instead of piling HTML up in
+    memory.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        linger: float = DEFAULT_LINGER,
+        max_pending: Optional[int] = None,
+        backend: Optional[str] = None,
+        audit: bool = False,
+        outlinks: bool = False,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = max(1, batch_size)
+        self.linger = linger
+        self.backend = backend or default_backend()
+        self.audit = audit
+        self.outlinks = outlinks
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._slots = asyncio.Semaphore(max_pending or self.workers * PENDING_PER_WORKER)
+        self._batch: List[Tuple[str, str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.pages = 0
+
+    async def parse(self, html: str, url: str = "") -> dict:
+        """Returns extractors.page_fields(html), computed in a worker process."""
+        await self._slots.acquire()
+        try:
+            future = asyncio.get_running_loop().create_future()
+            self._batch.append((url, html, future))
+            if len(self._batch) >= self.batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.linger, self._flush)
+            return await future
+        finally:
+            self._slots.release()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        self.batches += 1
+        self.pages += len(batch)
+        loop = asyncio.get_running_loop()
+        pages = [(url, html) for url, html, _ in batch]
+        result = loop.run_in_executor(
+            self._executor, page_fields_batch, pages, self.backend, self.audit, self.outlinks
+        )
+        result.add_done_callback(lambda done: _deliver(done, batch))
+
+    async def close(self):
+        """Stops the workers; waiting for the processes to exit happens off the event loop."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await asyncio.to_thread(self._executor.shutdown, wait=True, cancel_futures=True)
+
+
+def _deliver(done: asyncio.Future, batch: List[Tuple[str, str, asyncio.Future]]):
+    if done.cancelled():
+        for _, _, future in batch:
+            if not future.done():
+                future.cancel()
+        return
+    error = done.exception()
+    results = done.result() if error is None else [{"error": f"Parse failed: {error}"}] * len(batch)
+    for (_, _, future), fields in zip(batch, results):
+        if not future.done():
+            future.set_result(fields)
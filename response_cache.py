@@ -0,0 +1,152 @@
+# response_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+DEFAULT_TTL = 300           # seconds a Google API response is reused
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisBackend:
+    """
+    Shared cache for multi-worker deployments; anything speaking the Redis
+    protocol works. Values are stored as JSON with a Redis-side expiry.
+    """
+
+    def __init__(self, url: str, prefix: str = "seo:resp:"):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        data = await self._redis.get(self.prefix + key)
+        return json.loads(data) if data is not None else None
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await self._redis.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0      # requests that waited on an identical in-flight call
+    errors: int = 0
+
+    def as_dict(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+        }
+
+
+class ResponseCache:
+    """
+    TTL cache for Google API responses with single-flight coalescing.
+
+    Identical concurrent requests share one upstream call, and every caller
+    awaits the same result. Failures are not cached; every waiter gets the
+    same exception.
+    """
+
+    def __init__(self, backend=None, ttl: float = DEFAULT_TTL):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def key(namespace: str, token: str, **request) -> str:
+        """
+        Key for a normalised request. The token is hashed in, so users never
+        see each other's responses; relative dates must be resolved to
+        YYYY-MM-DD before they get here.
+        """
+        identity = hashlib.sha256(token.encode()).hexdigest()[:32]
+        body = json.dumps(request, sort_keys=True, default=str, separators=(",", ":"))
+        return f"{namespace}:{identity}:{hashlib.sha256(body.encode()).hexdigest()}"
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        value = await self.backend.get(key)
+        if value is not None:
+            self.stats.hits += 1
+            return value
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats.coalesced += 1
+        else:
+            self.stats.misses += 1
+            # A task of its own, so a caller that disconnects doesn't cancel it for the others.
+            task = self._in_flight[key] = asyncio.create_task(self._fetch(key, fetch, ttl))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: Optional[float]) -> Any:
+        try:
+            value = await fetch()
+            await self.backend.set(key, value, self.ttl if ttl is None else ttl)
+            return value
+        except Exception:
+            self.stats.errors += 1
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+    def stats_dict(self) -> dict:
+        entries = len(self.backend) if isinstance(self.backend, MemoryBackend) else None
+        return {**self.stats.as_dict(), "entries": entries, "in_flight": len(self._in_flight)}
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    The process-wide cache. Uses Redis when $RESPONSE_CACHE_REDIS_URL is set,
+    otherwise an in-process LRU; $RESPONSE_CACHE_TTL sets the TTL in seconds.
+    """
+    global _cache
+    if _cache is None:
+        redis_url = os.getenv("RESPONSE_CACHE_REDIS_URL")
+        backend = RedisBackend(redis_url) if redis_url else MemoryBackend()
+        _cache = ResponseCache(backend, ttl=float(os.getenv("RESPONSE_CACHE_TTL", DEFAULT_TTL)))
+    return _cache
@@ -0,0 +1,271 @@
+# scheduler.py
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Mapping, Tuple
+from urllib.parse import urlparse
+
+DEFAULT_CONCURRENCY = 50
+DEFAULT_PER_HOST = 8
+DEFAULT_MIN_DELAY = 0.0
+READ_AHEAD = 20             # URLs buffered per worker, spread over the host queues
+
+_DONE = object()
+
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+class _HostSlot:
+    """In-flight limit, spacing between request starts and queued URLs for a single host."""
+
+    def __init__(self, max_in_flight: int, min_delay: float):
+        self.max_in_flight = max_in_flight
+        self.min_delay = min_delay
+        self.in_flight = 0
+        self.next_start = 0.0
+        self.queue: deque = deque()
+
+    def ready_at(self) -> float | None:
+        """When this host may start its next URL; None if it has nothing it could start."""
+        if not self.queue or self.in_flight >= self.max_in_flight:
+            return None
+        return self.next_start
+
+
+class CrawlScheduler:
+    """
+    Runs a coroutine function over a stream of URLs with a fixed pool of workers.
+
+    Only `concurrency` tasks ever exist, and at most `read_ahead` URLs are
+    buffered, so memory stays flat no matter how many URLs are fed in. Each host
+    gets its own in-flight limit and a minimum delay between request starts; a
+    `Crawl-delay` found in robots.txt (see `func.CRAWL_DELAYS`) overrides the
+    default delay when it is larger. Buffered URLs wait in per-host queues and
+    workers take from whichever host may start next, round-robin, so a slow or
+    throttled host holds only its own slots instead of parking every worker.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        per_host: int = DEFAULT_PER_HOST,
+        min_delay: float = DEFAULT_MIN_DELAY,
+        crawl_delays: Mapping[str, float] | None = None,
+        report_interval: float | None = None,
+        total: int | None = None,
+        read_ahead: int | None = None,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.per_host = max(1, per_host)
+        self.min_delay = min_delay
+        self.crawl_delays = crawl_delays if crawl_delays is not None else {}
+        self.report_interval = report_interval
+        # Expected number of URLs, if known; enables the ETA in report().
+        self.total = total
+        self.read_ahead = max(1, read_ahead or self.concurrency * READ_AHEAD)
+        self._hosts: dict[str, _HostSlot] = {}
+        # Hosts with queued URLs, in round-robin order
+        self._rotation: deque = deque()
+        self._buffered = 0
+        self._input_done = False
+        # Workers wait for a URL they can start, the producer for buffer space.
+        lock = asyncio.Lock()
+        self._startable = asyncio.Condition(lock)
+        self._space = asyncio.Condition(lock)
+
+        self.started = 0
+        self.completed = 0
+        self.errors = 0
+        self._t0: float | None = None
+        self._t1: float | None = None
+
+    def _slot(self, host: str) -> _HostSlot:
+        slot = self._hosts.get(host)
+        if slot is None:
+            delay = max(self.min_delay, self.crawl_delays.get(host, 0.0))
+            # A host asking for a crawl delay gets requests one at a time.
+            per_host = 1 if delay > self.min_delay else self.per_host
+            slot = self._hosts[host] = _HostSlot(per_host, delay)
+        return slot
+
+    def _enqueue(self, url: str):
+        slot = self._slot(host_of(url))
+        if not slot.queue:
+            self._rotation.append(slot)
+        slot.queue.append(url)
+        self._buffered += 1
+
+    def _take(self) -> Tuple[str | None, _HostSlot | None, float | None]:
+        """
+        The next URL of the first host, round-robin, that may start now. When
+        none can, returns the earliest time one will be able to (or None).
+        """
+        now = time.monotonic()
+        earliest = None
+        for _ in range(len(self._rotation)):
+            slot = self._rotation.popleft()
+            ready_at = slot.ready_at()
+            if ready_at is not None and ready_at <= now:
+                url = slot.queue.popleft()
+                self._buffered -= 1
+                if slot.queue:
+                    self._rotation.append(slot)
+                slot.in_flight += 1
+                if slot.min_delay > 0:
+                    slot.next_start = now + slot.min_delay
+                return url, slot, None
+            self._rotation.append(slot)
+            if ready_at is not None and (earliest is None or ready_at < earliest):
+                earliest = ready_at
+        return None, None, earliest
+
+    async def _next(self) -> Tuple[str | None, _HostSlot | None]:
+        """Waits for a URL whose host may start; (None, None) once the input is exhausted."""
+        async with self._startable:
+            while True:
+                url, slot, earliest = self._take()
+                if url is not None:
+                    # Pass the wake-up on in case more URLs can start, and make room for the producer.
+                    self._startable.notify()
+                    self._space.notify()
+                    return url, slot
+                if self._input_done and not self._buffered:
+                    self._startable.notify()
+                    return None, None
+                timeout = None if earliest is None else max(0.0, earliest - time.monotonic())
+                try:
+                    await asyncio.wait_for(self._startable.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _release(self, slot: _HostSlot):
+        async with self._startable:
+            slot.in_flight -= 1
+            self._startable.notify()
+
+    async def _run_one(self, func: Callable[[str], Awaitable[Any]], url: str) -> Any:
+        self.started += 1
+        try:
+            return await func(url)
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"❌ Task failed: {url} [Exception: {e}]")
+            return e
+        finally:
+            self.completed += 1
+
+    async def map(
+        self,
+        func: Callable[[str], Awaitable[Any]],
+        urls: Iterable[str] | AsyncIterator[str],
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Yields (url, result) pairs in completion order.
+
+        `urls` may be a plain iterable or an async iterator, so URLs can be
+        checked while a sitemap is still downloading. Exceptions raised by
+        `func` are yielded as the result instead of aborting the crawl.
+        """
+        outbox: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        self._input_done = False
+
+        async def add(url):
+            async with self._space:
+                while self._buffered >= self.read_ahead:
+                    await self._space.wait()
+                self._enqueue(url)
+                self._startable.notify()
+
+        async def produce():
+            try:
+                if hasattr(urls, "__aiter__"):
+                    async for url in urls:
+                        await add(url)
+                else:
+                    for url in urls:
+                        await add(url)
+            finally:
+                async with self._startable:
+                    self._input_done = True
+                    self._startable.notify_all()
+
+        async def work():
+            try:
+                while True:
+                    url, slot = await self._next()
+                    if url is None:
+                        break
+                    try:
+                        result = await self._run_one(func, url)
+                    finally:
+                        await self._release(slot)
+                    await outbox.put((url, result))
+            finally:
+                await outbox.put(_DONE)
+
+        self._t0 = self._t0 or time.monotonic()
+        self._t1 = None
+        tasks = [asyncio.create_task(produce())]
+        tasks += [asyncio.create_task(work()) for _ in range(self.concurrency)]
+        if self.report_interval:
+            tasks.append(asyncio.create_task(self._report_loop()))
+
+        try:
+            running = self.concurrency
+            while running:
+                item = await outbox.get()
+                if item is _DONE:
+                    running -= 1
+                    continue
+                yield item
+            # Surface errors from the URL source itself (e.g. a failed download).
+            await tasks[0]
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Nothing queued survives into a later map() call.
+            for slot in self._rotation:
+                self._buffered -= len(slot.queue)
+                slot.queue.clear()
+            self._rotation.clear()
+            self._t1 = time.monotonic()
+
+    async def run(
+        self,
+        func: Callable[[str], Awaitable[Any]],
+        urls: Iterable[str] | AsyncIterator[str],
+    ) -> list:
+        """Like `map`, but collects the (url, result) pairs into a list."""
+        return [pair async for pair in self.map(func, urls)]
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            logging.info(f"⏱️ {self.report()}")
+
+    @property
+    def elapsed(self) -> float:
+        if self._t0 is None:
+            return 0.0
+        return (self._t1 or time.monotonic()) - self._t0
+
+    @property
+    def rate(self) -> float:
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed else 0.0
+
+    def report(self) -> str:
+        done = f"{self.completed}/{self.total}" if self.total else f"{self.completed}"
+        line = (
+            f"{done} done, {self.errors} errors, "
+            f"{self.started - self.completed} in flight, "
+            f"{self.rate:.1f} req/s over {self.elapsed:.1f}s"
+        )
+        if self.total and self.rate:
+            remaining = max(self.total - self.completed, 0) / self.rate
+            line += f", ETA {remaining / 60:.1f} min"
+        return line
@@ -0,0 +1,529 @@
+# seo_rules.py
+import hashlib
+import json
+import time
+from collections import Counter, defaultdict
+from html.parser import HTMLParser
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+TITLE_MIN, TITLE_MAX = 30, 60
+DESCRIPTION_MIN, DESCRIPTION_MAX = 70, 160
+THIN_CONTENT_WORDS = 300
+MAX_OUTLINE = 50
+
+SKIP_TEXT_TAGS = {"script", "style", "noscript", "template", "svg"}
+HEADINGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+
+
+class Rule:
+    """
+    One audit check. The engine calls `start`/`end` only for the tags listed in
+    `tags` ("*" for every tag) and `data` only when `wants_text` is set, so a
+    rule costs nothing on events it does not care about.
+    """
+
+    name = "rule"
+    tags: Tuple[str, ...] = ()
+    wants_text = False
+
+    def __init__(self, page_url: str):
+        self.page_url = page_url
+
+    def start(self, tag: str, attrs: dict, ctx: "AuditContext"):
+        pass
+
+    def end(self, tag: str, ctx: "AuditContext"):
+        pass
+
+    def data(self, text: str, ctx: "AuditContext"):
+        pass
+
+    def finish(self) -> Tuple[dict, List[str]]:
+        """Returns (fields, issues) for the page."""
+        return {}, []
+
+
+class AuditContext:
+    def __init__(self):
+        self.skip_depth = 0        # inside <script>, <style>, ...
+        self.in_head = False
+
+
+def _length_issues(name: str, value: Optional[str], lo: int, hi: int) -> List[str]:
+    if not value:
+        return [f"{name}_missing"]
+    if len(value) < lo:
+        return [f"{name}_too_short"]
+    if len(value) > hi:
+        return [f"{name}_too_long"]
+    return []
+
+
+class TitleRule(Rule):
+    name = "title"
+    tags = ("title",)
+    wants_text = True
+
+    def __init__(self, page_url):
+        super().__init__(page_url)
+        self.parts = None
+        self.title = None
+        self.count = 0
+
+    def start(self, tag, attrs, ctx):
+        if ctx.skip_depth:   # <title> inside inline <svg>
+            return
+        self.count += 1
+        if self.title is None and self.parts is None:
+            self.parts = []
+
+    def end(self, tag, ctx):
+        if self.parts is not None and self.title is None:
+            self.title = " ".join("".join(self.parts).split())
+
+    def data(self, text, ctx):
+        if self.parts is not None and self.title is None:
+            self.parts.append(text)
+
+    def finish(self):
+        title = self.title if self.title is not None else (" ".join("".join(self.parts).split()) if self.parts else None)
+        issues = _length_issues("title", title, TITLE_MIN, TITLE_MAX)
+        if self.count > 1:
+            issues.append("title_multiple")
+        return {"title": title, "title_length": len(title or "")}, issues
+
+
+class MetaRule(Rule):
+    """Meta description, robots meta, Open Graph and Twitter card tags."""
+
+    name = "meta"
+    tags = ("meta",)
+    SOCIAL_KEYS = ("og:title", "og:description", "og:image", "og:url", "og:type", "twitter:card", "twitter:title",
+                   "twitter:description", "twitter:image")
+
+    def __init__(self, page_url):
+        super().__init__(page_url)
+        self.description = None
+        self.robots = None
+        self.social = {}
+
+    def start(self, tag, attrs, ctx):
+        name = (attrs.get("name") or attrs.get("property") or "").lower()
+        content = attrs.get("content")
+        if content is None:
+            return
+        if name == "description" and self.description is None:
+            self.description = content.strip()
+        elif name in ("robots", "googlebot") and self.robots is None:
+            self.robots = content.strip().lower()
+        elif name.startswith(("og:", "twitter:")) and name not in self.social:
+            self.social[name] = content.strip()
+
+    def finish(self):
+        issues = _length_issues("description", self.description, DESCRIPTION_MIN, DESCRIPTION_MAX)
+        directives = {d.strip() for d in (self.robots or "").split(",")}
+        noindex = "noindex" in directives or "none" in directives
+        nofollow = "nofollow" in directives or "none" in directives
+        if noindex:
+            issues.append("noindex")
+        if not any(k.startswith("og:") for k in self.social):
+            issues.append("open_graph_missing")
+        if "twitter:card" not in self.social:
+            issues.append("twitter_card_missing")
+        return {
+            "description": self.description,
+            "description_length": len(self.description or ""),
+            "robots": self.robots,
+            "noindex": noindex,
+            "nofollow": nofollow,
+            "social": {k: self.social[k] for k in self.SOCIAL_KEYS if k in self.social},
+        }, issues
+
+
+class LinkTagRule(Rule):
+    """<link rel="canonical"> and hreflang alternates."""
+
+    name = "link_tags"
+    tags = ("link",)
+
+    def __init__(self, page_url):
+        super().__init__(page_url)
+        self.canonicals = []
+        self.hreflang = {}
+
+    def start(self, tag, attrs, ctx):
+        rel = (attrs.get("rel") or "").lower().split()
+        href = attrs.get("href")
+        if not href:
+            return
+        if "canonical" in rel:
+            self.canonicals.append(urljoin(self.page_url, href.strip()))
+        elif "alternate" in rel and attrs.get("hreflang"):
+            self.hreflang[attrs["hreflang"].lower()] = urljoin(self.page_url, href.strip())
+
+    def finish(self):
+        issues = []
+        canonical = self.canonicals[0] if self.canonicals else None
+        if not canonical:
+            issues.append("canonical_missing")
+        elif len(set(self.canonicals)) > 1:
+            issues.append("canonical_conflicting")
+        elif canonical.rstrip("/") != self.page_url.split("#")[0].rstrip("/"):
+            issues.append("canonical_points_elsewhere")
+        if self.hreflang and "x-default" not in self.hreflang:
+            issues.append("hreflang_no_x_default")
+        return {"canonical": canonical, "hreflang": self.hreflang}, issues
+
+
+class HeadingRule(Rule):
+    name = "headings"
+    tags = HEADINGS
+    wants_text = True
+
+    def __init__(self, page_url):
+        super().__init__(page_url)
+        self.outline = []
+        self.counts = Counter()
+        self.current = None   # (level, parts)
+        self.skipped_levels = False
+        self.last_level = 0
+
+    def start(self, tag, attrs, ctx):
+        level = int(tag[1])
+        self.counts[tag] += 1
+        if self.last_level and level > self.last_level + 1:
+            self.skipped_levels = True
+        self.last_level = level
+        if self.current is None:
+            self.current = (level, [])
+
+    def end(self, tag, ctx):
+        if self.current is not None and int(tag[1]) == self.current[0]:
+            level, parts = self.current
+            if len(self.outline) < MAX_OUTLINE:
+                self.outline.append((level, " ".join("".join(parts).split())))
+            self.current = None
+
+    def data(self, text, ctx):
+        if self.current is not None and not ctx.skip_depth:
+            self.current[1].append(text)
+
+    def finish(self):
+        issues = []
+        h1_count = self.counts.get("h1", 0)
+        if h1_count == 0:
+            issues.append("h1_missing")
+        elif h1_count > 1:
+            issues.append("h1_multiple")
+        if self.skipped_levels:
+            issues.append("heading_levels_skipped")
+        if any(not text for _, text in self.outline):
+            issues.append("heading_empty")
+        h1 = next((text for level, text in self.outline if level == 1), None)
+        return {
+            "h1": h1,
+            "heading_counts": {h: self.counts.get(h, 0) for h in HEADINGS},
+            "outline": [f"h{level}: {text}" for level, text in self.outline],
+        }, issues
+
+
+class ImageAltRule(Rule):
+    name = "images"
+    tags = ("img",)
+
+    def __init__(self, page_url):
+        super().__init__(page_url)
+        self.total = 0
+        self.with_alt = 0
+
+    def start(self, tag, attrs, ctx):
+        self.total += 1
+        if (attrs.get("alt") or "").strip():
+            self.with_alt += 1
+
+    def finish(self):
+        coverage = self.with_alt / self.total if self.total else 1.0
+        issues = ["image_alt_missing"] if coverage < 1.0 else []
+        return {"images": self.total, "images_with_alt": self.with_alt, "alt_coverage": round(coverage, 3)}, issues
+
+
+class WordCountRule(Rule):
+    name = "word_count"
+    wants_text = True
+
+    def __init__(self, page_url):
+        super().__init__(page_url)
+        self.words = 0
+
+    def data(self, text, ctx):
+        if not ctx.skip_depth and not ctx.in_head:
+            self.words += len(text.split())
+
+    def finish(self):
+        return {"word_count": self.words}, (["thin_content"] if self.words < THIN_CONTENT_WORDS else [])
+
+
+class LinkRule(Rule):
+    name = "links"
+    tags = ("a",)
+    collect = False     # keep the link targets too (see OutlinkRule)
+
+    def __init__(self, page_url):
+        super().__init__(page_url)
+        parts = urlparse(page_url)
+        self.host = parts.netloc.lower()
+        self.origin = f"{parts.scheme}://{parts.netloc}"
+        self.internal = 0
+        self.external = 0
+        self.nofollow = 0
+        self.targets: Dict[str, None] = {}     # insertion-ordered set
+
+    def start(self, tag, attrs, ctx):
+        href = (attrs.get("href") or "").strip()
+        if not href or href.startswith(("#", "javascript:", "mailto:", "tel:", "data:")):
+            return
+        if href.startswith("/") and not href.startswith("//"):
+            # Root-relative: internal without paying for urljoin.
+            self.internal += 1
+            if self.collect:
+                self.targets[self.origin + href.split("#", 1)[0]] = None
+        else:
+            url = urljoin(self.page_url, href)
+            target = urlparse(url)
+            if target.scheme not in ("http", "https"):
+                return
+            if target.netloc.lower() == self.host:
+                self.internal += 1
+            else:
+                self.external += 1
+            if self.collect:
+                self.targets[url.split("#", 1)[0]] = None
+        if "nofollow" in (attrs.get("rel") or "").lower():
+            self.nofollow += 1
+
+    def finish(self):
+        issues = ["no_internal_links"] if not self.internal else []
+        return {"internal_links": self.internal, "external_links": self.external, "nofollow_links": self.nofollow}, issues
+
+
+class OutlinkRule(LinkRule):
+    """LinkRule that also returns every distinct http(s) link target, for the site crawler."""
+
+    collect = True
+
+    def finish(self):
+        fields, issues = super().finish()
+        fields["outlinks"] = list(self.targets)
+        return fields, issues
+
+
+class StructuredDataRule(Rule):
+    name = "structured_data"
+    tags = ("script",)
+    wants_text = True
+
+    def __init__(self, page_url):
+        super().__init__(page_url)
+        self.parts = None
+        self.blocks = 0
+        self.invalid = 0
+        self.types = set()
+
+    def start(self, tag, attrs, ctx):
+        if (attrs.get("type") or "").lower() == "application/ld+json":
+            self.parts = []
+
+    def end(self, tag, ctx):
+        if self.parts is None:
+            return
+        self.blocks += 1
+        try:
+            self._collect_types(json.loads("".join(self.parts)))
+        except ValueError:
+            self.invalid += 1
+        self.parts = None
+
+    def data(self, text, ctx):
+        if self.parts is not None:
+            self.parts.append(text)
+
+    def _collect_types(self, node):
+        if isinstance(node, list):
+            for item in node:
+                self._collect_types(item)
+        elif isinstance(node, dict):
+            kind = node.get("@type")
+            if isinstance(kind, str):
+                self.types.add(kind)
+            elif isinstance(kind, list):
+                self.types.update(k for k in kind if isinstance(k, str))
+            for item in node.get("@graph", []) if isinstance(node.get("@graph"), list) else []:
+                self._collect_types(item)
+
+    def finish(self):
+        issues = []
+        if not self.blocks:
+            issues.append("structured_data_missing")
+        if self.invalid:
+            issues.append("structured_data_invalid")
+        return {"json_ld_blocks": self.blocks, "json_ld_types": sorted(self.types)}, issues
+
+
+DEFAULT_RULES = (TitleRule, MetaRule, LinkTagRule, HeadingRule, ImageAltRule, WordCountRule, LinkRule,
+                 StructuredDataRule)
+# Just what page_fields needs, plus the outlinks, when the full audit is off.
+OUTLINK_RULES = (TitleRule, MetaRule, HeadingRule, OutlinkRule)
+
+
+def with_outlinks(rules: Iterable[type]) -> Tuple[type, ...]:
+    """The same rules with LinkRule swapped for OutlinkRule."""
+    return tuple(OutlinkRule if rule is LinkRule else rule for rule in rules)
+
+
+class _Dispatcher(HTMLParser):
+    def __init__(self, rules: List[Rule], timings: Dict[str, int]):
+        super().__init__(convert_charrefs=True)
+        self.ctx = AuditContext()
+        self.timings = timings
+        # Bound methods are resolved once here, not per event.
+        self.starts: Dict[str, list] = defaultdict(list)
+        self.ends: Dict[str, list] = defaultdict(list)
+        self.any_starts = []
+        self.any_ends = []
+        for rule in rules:
+            for tag in rule.tags:
+                if tag == "*":
+                    self.any_starts.append((rule.name, rule.start))
+                    self.any_ends.append((rule.name, rule.end))
+                else:
+                    self.starts[tag].append((rule.name, rule.start))
+                    self.ends[tag].append((rule.name, rule.end))
+        self.datas = [(rule.name, rule.data) for rule in rules if rule.wants_text]
+
+    def _dispatch(self, handlers, *args):
+        timings, clock = self.timings, time.perf_counter_ns
+        for name, handler in handlers:
+            t0 = clock()
+            handler(*args)
+            timings[name] += clock() - t0
+
+    def handle_starttag(self, tag, attrs):
+        ctx = self.ctx
+        if tag == "head":
+            ctx.in_head = True
+        elif tag == "body":
+            ctx.in_head = False
+        handlers = self.starts.get(tag)
+        if handlers or self.any_starts:
+            attrs = dict(attrs)
+            if handlers:
+                self._dispatch(handlers, tag, attrs, ctx)
+            if self.any_starts:
+                self._dispatch(self.any_starts, tag, attrs, ctx)
+        if tag in SKIP_TEXT_TAGS:
+            ctx.skip_depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag in SKIP_TEXT_TAGS:
+            self.ctx.skip_depth -= 1
+
+    def handle_endtag(self, tag):
+        ctx = self.ctx
+        if tag in SKIP_TEXT_TAGS and ctx.skip_depth:
+            ctx.skip_depth -= 1
+        if tag == "head":
+            ctx.in_head = False
+        handlers = self.ends.get(tag)
+        if handlers:
+            self._dispatch(handlers, tag, ctx)
+        if self.any_ends:
+            self._dispatch(self.any_ends, tag, ctx)
+
+    def handle_data(self, data):
+        self._dispatch(self.datas, data, self.ctx)
+
+
+def audit_html(html: str, page_url: str, rules: Iterable[type] = DEFAULT_RULES) -> dict:
+    """
+    Runs every rule over the document in one tokenizer pass.
+
+    Returns {"fields": {...}, "issues": [...], "timings_us": {rule: µs}}.
+    """
+    instances = [rule(page_url) for rule in rules]
+    timings = {rule.name: 0 for rule in instances}
+    dispatcher = _Dispatcher(instances, timings)
+    t0 = time.perf_counter_ns()
+    dispatcher.feed(html)
+    dispatcher.close()
+    tokenize_ns = time.perf_counter_ns() - t0 - sum(timings.values())
+
+    fields, issues = {}, []
+    for rule in instances:
+        t1 = time.perf_counter_ns()
+        rule_fields, rule_issues = rule.finish()
+        timings[rule.name] += time.perf_counter_ns() - t1
+        fields.update(rule_fields)
+        issues.extend(rule_issues)
+
+    timings_us = {name: ns // 1000 for name, ns in timings.items()}
+    timings_us["_tokenize"] = max(tokenize_ns, 0) // 1000
+    return {"fields": fields, "issues": issues, "timings_us": timings_us}
+
+
+class RuleTimings:
+    """Aggregates per-rule timings across pages (and worker processes)."""
+
+    def __init__(self):
+        self.total_us = Counter()
+        self.pages = 0
+
+    def add(self, timings_us: Dict[str, int]):
+        self.pages += 1
+        self.total_us.update(timings_us)
+
+    def report(self) -> str:
+        lines = [f"⏱️ Rule timings over {self.pages} pages (total ms, µs/page):"]
+        for name, total in self.total_us.most_common():
+            lines.append(f"  - {name}: {total / 1000:.1f} ms, {total / max(self.pages, 1):.0f} µs/page")
+        return "\n".join(lines)
+
+
+def _digest(text: str) -> bytes:
+    normalized = " ".join(text.lower().split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+
+
+class DuplicateIndex:
+    """
+    Site-wide duplicate title / description detection.
+
+    Each value is reduced to an 8-byte hash of its normalized text, so checking
+    a page is a dict lookup rather than a comparison against every other page.
+    """
+
+    PLACEHOLDERS = {"No title", "Missing"}
+
+    def __init__(self):
+        self._first: Dict[Tuple[str, bytes], str] = {}
+        self.groups: Dict[Tuple[str, bytes], List[str]] = {}
+
+    def add(self, url: str, **fields: Optional[str]) -> List[str]:
+        """Registers e.g. title=..., description=...; returns duplicate_* issues."""
+        issues = []
+        for name, value in fields.items():
+            if not value or value in self.PLACEHOLDERS:
+                continue
+            key = (name, _digest(value))
+            first = self._first.setdefault(key, url)
+            if first != url:
+                self.groups.setdefault(key, [first]).append(url)
+                issues.append(f"duplicate_{name}")
+        return issues
+
+    def duplicates(self) -> Dict[str, List[List[str]]]:
+        report: Dict[str, List[List[str]]] = defaultdict(list)
+        for (name, _), urls in self.groups.items():
+            report[name].append(urls)
+        return dict(report)
@@ -1,85 +1,427 @@
 # server.py
+import argparse
+import json
+import logging
+import os
 import sys
 import asyncio
-import aiohttp
-from func import hunt, extract_links_from_sitemap, check_link, analyze_seo
-# from broken_link import check_link
+import heapq
+from functools import partial
+from urllib.parse import urlparse
+from broken_link import RedirectReport, verify_link
+from func import hunt, iter_sitemap_entries, normalize_root, report_link, analyze_seo, CRAWL_DELAYS
+from extractors import MISSING, NO_TITLE
+from crawl_state import DEFAULT_STALE_AFTER, DEFAULT_STATE_PATH, CrawlState
+from feedback_cache import DEFAULT_FEEDBACK_CACHE, FeedbackCache
+from http_cache import DEFAULT_CACHE_DIR, HttpCache, configure_cache, get_cache
+from http_client import close_session, connection_stats, get_session
+from log_config import configure_logging
+from metrics import metrics
+from parse_pool import ParsePool
+from scheduler import CrawlScheduler
+from seo_rules import DuplicateIndex, RuleTimings
+from site_crawler import DEFAULT_MAX_PAGES, SiteCrawler
+from sinks import Checkpoint, ResultWriter, open_sink
+from url_index import UrlIndex
 # from sitemap_parser import extract_links_from_sitemap
 # from seo_audit import analyze_seo
-from agent import ask_ai_for_seo_feedback
+from agent import REVIEW_FIELDS, review_site, review_template_id
 
 
-async def main(domain_or_url):
-    sitemap_urls = await hunt(domain_or_url)
+async def main(
+    domain_or_url,
+    incremental=False,
+    stale_after=DEFAULT_STALE_AFTER,
+    diff_report=None,
+    parse_workers=0,
+    audit_rules=False,
+    output=None,
+    bloom_capacity=None,
+    review_limit=None,
+    crawl=False,
+    crawl_max_pages=DEFAULT_MAX_PAGES,
+    crawl_depth=None,
+    metrics_json=None,
+):
+    metrics.reset()
+    # Set SEO_CACHE_DIR to an empty string to disable the response cache.
+    cache_dir = os.getenv("SEO_CACHE_DIR", DEFAULT_CACHE_DIR)
+    if cache_dir:
+        configure_cache(HttpCache(cache_dir))
+    state = CrawlState(os.getenv("SEO_STATE_DB", DEFAULT_STATE_PATH), stale_after=stale_after)
+    parse_pool = ParsePool(workers=parse_workers, audit=audit_rules, outlinks=crawl) if parse_workers else None
+    try:
+        await audit(
+            domain_or_url, state, incremental, diff_report, parse_pool, audit_rules, output, bloom_capacity, review_limit,
+            crawl, crawl_max_pages, crawl_depth,
+        )
+    finally:
+        if parse_pool:
+            await parse_pool.close()
+        state.close()
+        await close_session()
+        logging.info(f"🔌 Connections: {connection_stats().as_dict()}")
+        if get_cache():
+            logging.info(f"🗄️ Cache: {get_cache().stats()}")
+            configure_cache(None)
+        report_metrics(metrics_json)
+
+
+def report_metrics(path=None):
+    """Logs the slowest stages and hosts; the full per-stage summary goes to `path` as JSON."""
+    summary = metrics.summary()
+    stages = sorted(summary["stages"].items(), key=lambda kv: -kv[1]["total_s"])
+    logging.info("\n⏱️ Time per stage (count, p50 / p99 ms):")
+    for stage, h in stages:
+        logging.info(f"  - {stage}: {h['total_s']}s ({h['count']}, {h['p50_ms']} / {h['p99_ms']})")
+    if summary["hosts_by_time_s"]:
+        logging.info(f"🐢 Slowest hosts: {summary['hosts_by_time_s']}")
+    if path:
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2)
+        logging.info(f"💾 Metrics written to {path}")
+
+
+# Pages analysed when not running a full-site audit.
+SAMPLE_PAGES = 5
+# Pages sent to the AI review when every page is analysed (--output or --crawl)
+# and --review-limit is not given: the ones with the most problems.
+FULL_SITE_REVIEW_LIMIT = 200
+
+
+def review_priority(data):
+    """Higher for pages that need the review more: audit issues, else missing tags."""
+    if "issues" in data:
+        return len(data["issues"])
+    return sum(data.get(name) in (MISSING, NO_TITLE) for name in ("title", "description", "h1"))
+
+
+class SeoCollector:
+    """Post-processing shared by the sample and full-site SEO stages."""
+
+    def __init__(self, state, review_limit=None):
+        self.state = state
+        # Pages kept for the AI review (None: every analysed page); with a
+        # limit only the worst ones are kept, in a min-heap on review_priority.
+        self.review_limit = review_limit
+        self._review = {}
+        self._review_heap = []
+        self._seq = 0
+        self.duplicates = DuplicateIndex()
+        self.rule_timings = RuleTimings()
+
+    def pages(self, result):
+        """Yields (url, data) for one analyze_seo result; failures carry an "error" key."""
+        # Ensure result is a dictionary before updating
+        if not isinstance(result, dict):
+            logging.warning(f"[Skipping invalid result] {result}")
+            return
+        if "error" in result and "url" in result:
+            yield result["url"], {"error": result["error"]}
+            return
+        for url, data in result.items():
+            if not isinstance(data, dict):
+                logging.warning(f"[Skipping invalid entry] {url}: {data}")
+                continue
+            if "timings_us" in data:
+                self.rule_timings.add(data.pop("timings_us"))
+            # Only the crawler needs the outlinks; they stay out of the stored results.
+            data.pop("outlinks", None)
+            dup_issues = self.duplicates.add(url, title=data.get("title"), description=data.get("description"))
+            if "issues" in data:
+                data["issues"].extend(dup_issues)
+            self._keep_for_review(url, data)
+            self.state.record_seo(url, data)
+            yield url, data
+
+    def _keep_for_review(self, url, data):
+        if self.review_limit == 0:
+            return
+        # Accept only valid dicts, and only the fields the review reads
+        fields = {name: data[name] for name in REVIEW_FIELDS if name in data}
+        if self.review_limit is None:
+            self._review[url] = fields
+            return
+        # The sequence number keeps the earliest of equally bad pages.
+        self._seq -= 1
+        entry = (review_priority(data), self._seq, url, fields)
+        if len(self._review_heap) < self.review_limit:
+            heapq.heappush(self._review_heap, entry)
+        elif entry[:2] > self._review_heap[0][:2]:
+            heapq.heapreplace(self._review_heap, entry)
+
+    @property
+    def seo_data(self):
+        """The pages for the AI review, worst first when a limit applies."""
+        if self.review_limit is None:
+            return self._review
+        return {url: fields for _, _, url, fields in sorted(self._review_heap, reverse=True)}
+
+    def report(self):
+        for name, groups in self.duplicates.duplicates().items():
+            logging.info(f"\n♊ Duplicate {name}s: {len(groups)} groups")
+            for urls in groups:
+                logging.info(f"  - {', '.join(urls)}")
+        if self.rule_timings.pages:
+            logging.info(self.rule_timings.report())
+
+
+async def audit(
+    domain_or_url,
+    state,
+    incremental=False,
+    diff_report=None,
+    parse_pool=None,
+    audit_rules=False,
+    output=None,
+    bloom_capacity=None,
+    review_limit=None,
+    crawl=False,
+    crawl_max_pages=DEFAULT_MAX_PAGES,
+    crawl_depth=None,
+):
+    session = await get_session()
+    sitemap_urls = await hunt(domain_or_url, session)
     if not sitemap_urls:
-        print("\n❌ No sitemaps found.")
+        logging.error("\n❌ No sitemaps found.")
         return
 
-    print("\n Checking all links from sitemaps...")
-    all_links = []
-    for sitemap_url in sitemap_urls:
-        urls = await extract_links_from_sitemap(sitemap_url)
-        all_links.extend(urls)
+    url_indexes = []
 
-    if not all_links:
-        print("❌ No links found in sitemaps.")
-        return
+    async def sitemap_entries():
+        # Every pass over the sitemaps yields each logical URL once.
+        seen = UrlIndex(bloom_capacity)
+        url_indexes.append(seen)
+        for sitemap_url in sitemap_urls:
+            async for entry in iter_sitemap_entries(sitemap_url, session, seen):
+                yield entry
 
-    async with aiohttp.ClientSession() as session:
-        broken_tasks = [check_link(session, url) for url in all_links]
-        broken_results = await asyncio.gather(*broken_tasks)
+    logging.info("\n Checking all links from sitemaps...")
+    # Only counters and a small sample are kept, so memory does not grow with the site.
+    link_count = 0
+    first_link = None
+    sample_links = []
+    lastmods = {}
 
+    async def sitemap_links():
+        nonlocal link_count, first_link
+        # Links are checked while the sitemaps are still downloading.
+        async for entry in sitemap_entries():
+            link_count += 1
+            first_link = first_link or entry.loc
+            # In incremental mode only new, changed or stale URLs are re-checked.
+            if not state.observe(entry.loc, entry.lastmod) and incremental:
+                continue
+            if len(sample_links) < SAMPLE_PAGES:
+                sample_links.append(entry.loc)
+            lastmods[entry.loc] = entry.lastmod
+            yield entry.loc
+
+    scheduler = CrawlScheduler(crawl_delays=CRAWL_DELAYS, report_interval=10)
+    broken_links = []
+    redirects = RedirectReport()
     # Filter broken links based on False result
-    broken_links = [url for url, result in zip(all_links, broken_results) if result is False]
+    async for url, checked in scheduler.map(partial(verify_link, session), sitemap_links()):
+        result = False if isinstance(checked, Exception) else report_link(checked)
+        state.record_link(url, result, lastmods.pop(url, None))
+        if result is False:
+            broken_links.append(url)
+        if not isinstance(checked, Exception):
+            redirects.add(checked)
+    checked_count = scheduler.completed
+    logging.info(f"⏱️ Link check: {scheduler.report()}")
+
+    if not link_count:
+        logging.error("❌ No links found in sitemaps.")
+        return
 
-    async with aiohttp.ClientSession() as session:
-        print("\n📊 Analyzing SEO for pages...")
-        seo_tasks = [analyze_seo(session, url) for url in all_links[:5]]
-        seo_results = await asyncio.gather(*seo_tasks)
+    if review_limit is None and (output or crawl):
+        review_limit = FULL_SITE_REVIEW_LIMIT
+    collector = SeoCollector(state, review_limit)
+    crawler = link_metrics = None
+    if crawl:
+        start_url = await normalize_root(session, domain_or_url) + "/"
+        crawler = SiteCrawler(
+            session, start_url, crawl_max_pages, crawl_depth, parse_pool=parse_pool, audit=audit_rules
+        )
+        # With --output every sitemap page is analysed below, with its PageRank; the crawl only builds the graph.
+        await crawl_site(crawler, sitemap_entries, None if output else collector, redirects)
+        link_metrics = crawler.rank()
+    analyze = partial(analyze_seo, session, parse_pool=parse_pool, audit=audit_rules, link_metrics=link_metrics)
+    if output:
+        await analyze_site(sitemap_entries, analyze, collector, state, incremental, output, link_count)
+    elif not crawl:
+        logging.info("\n📊 Analyzing SEO for pages...")
+        seo_scheduler = CrawlScheduler(crawl_delays=CRAWL_DELAYS)
+        async for _, result in seo_scheduler.map(analyze, sample_links):
+            for _ in collector.pages(result):
+                pass
 
-    print("\n🧾 Summary:")
-    print(f"✅ Total links checked: {len(all_links)}")
-    print(f"❌ Broken links found: {len(broken_links)}")
+    parsed = urlparse(first_link)
+    site = f"{parsed.scheme}://{parsed.netloc}"
+    logging.info("\n🧾 Summary:")
+    logging.info(f"✅ Total links checked: {checked_count}")
+    logging.info(f"♻️ Duplicate sitemap URLs skipped: {url_indexes[0].duplicates}")
+    if incremental:
+        logging.info(f"⏭️ Unchanged links skipped: {link_count - checked_count}")
+        broken_links = state.broken_urls(site)
+    logging.info(f"❌ Broken links found: {len(broken_links)}")
     for b in broken_links:
-        print("  -", b)
-
-    # # Combine all seo_results into a single dictionary
-    # seo_data = {}
-    # for result in seo_results:
-    #     seo_data.update(result)
+        logging.info(f"  - {b}")
+    redirects.report()
+    if crawler:
+        crawler.report()
 
-    # feedback = ask_ai_for_seo_feedback(seo_data)
-    # print(f"Review:\n{feedback}")
+    collector.report()
+    seo_data = collector.seo_data
 
-    seo_data = {}
-    for result in seo_results:
-        # Ensure result is a dictionary before updating
-        if isinstance(result, dict):
-            for url, data in result.items():
-                if isinstance(data, dict):
-                    seo_data[url] = data  # Accept only valid dicts
-                else:
-                    print(f"[Skipping invalid entry] {url}: {data}")
-        else:
-            print(f"[Skipping invalid result] {result}")
+    diff = state.finish(site)
+    logging.info("\n🔄 Changes since last run:")
+    logging.info(diff.summary())
+    if diff_report:
+        with open(diff_report, "w") as f:
+            json.dump(diff.as_dict(), f, indent=2)
+        logging.info(f"💾 Diff report written to {diff_report}")
 
     # Call only if we have valid data
-    if seo_data:
-        feedback = ask_ai_for_seo_feedback(seo_data)
-        print(f"Review:\n{feedback}")
+    if review_limit == 0:
+        pass
+    elif seo_data:
+        logging.info(f"\n🤖 Reviewing {len(seo_data)} pages...")
+        # Set SEO_FEEDBACK_CACHE to an empty string to always re-review every page.
+        cache_path = os.getenv("SEO_FEEDBACK_CACHE", DEFAULT_FEEDBACK_CACHE)
+        feedback_cache = FeedbackCache(cache_path, template=review_template_id()) if cache_path else None
+        try:
+            review = await review_site(seo_data, cache=feedback_cache)
+        finally:
+            if feedback_cache:
+                feedback_cache.close()
+        logging.info(f"Review:\n{review.report()}")
+        logging.info(
+            f"🤖 {review.cached} pages from the feedback cache, {review.batches} review batches "
+            f"({review.failed_batches} failed), {review.prompt_tokens} prompt + {review.completion_tokens} completion tokens"
+        )
     else:
-        print("No valid SEO data to analyze.")
+        logging.info("No valid SEO data to analyze.")
+
+
+async def analyze_site(sitemap_entries, analyze, collector, state, incremental, output, link_count):
+    """
+    Analyses every sitemap URL and streams each result to `output` as it completes.
+    A checkpoint next to the output lets an interrupted run resume where it stopped.
+    """
+    checkpoint_path = output.rstrip("/") + ".checkpoint"
+    resume = os.path.exists(checkpoint_path)
+    checkpoint = Checkpoint(checkpoint_path)
+    already_done = checkpoint.count()
+    writer = ResultWriter(open_sink(output, append=resume, position=checkpoint.position()), checkpoint)
+    writer.start()
+    if resume:
+        logging.info(f"\n♻️ Resuming from checkpoint: {already_done} pages already written")
+
+    async def pages_to_analyze():
+        async for entry in sitemap_entries():
+            if checkpoint.is_done(entry.loc):
+                continue
+            if incremental and not state.needs_seo(entry.loc):
+                continue
+            yield entry.loc
+
+    logging.info(f"\n📊 Analyzing SEO for all pages → {output}")
+    seo_scheduler = CrawlScheduler(crawl_delays=CRAWL_DELAYS, report_interval=10, total=link_count - already_done)
+    try:
+        async for _, result in seo_scheduler.map(analyze, pages_to_analyze()):
+            for url, data in collector.pages(result):
+                await writer.put(url, data)
+    finally:
+        await writer.close()
+    logging.info(f"⏱️ SEO analysis: {seo_scheduler.report()}")
+    logging.info(f"💾 {writer.written} results written to {output}")
+    checkpoint.remove()
+
+
+async def crawl_site(crawler, sitemap_entries, collector, redirects):
+    """
+    Follows internal links from the homepage, checks every link target once,
+    then compares what the crawl reached with the sitemaps.
+    """
+    logging.info(f"\n🕸️ Crawling internal links from {crawler.graph.url(crawler.root)}")
+    async for result in crawler.crawl():
+        if collector:
+            for _ in collector.pages(result):
+                pass
+
+    logging.info("\n🔗 Checking links found by the crawl...")
+    async for _, checked in crawler.check_links():
+        if not isinstance(checked, Exception):
+            report_link(checked)
+            redirects.add(checked)
+
+    async for entry in sitemap_entries():
+        crawler.mark_sitemap(entry.loc)
 
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(usage="python server.py <domain_or_url> [options]")
+    parser.add_argument("domain_or_url")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only re-check URLs that are new, changed (sitemap lastmod) or stale")
+    parser.add_argument("--stale-days", type=float, default=DEFAULT_STALE_AFTER / 86400,
+                        help="re-check unchanged URLs older than this many days (default: 7)")
+    parser.add_argument("--diff-report", metavar="PATH", help="write the change report as JSON")
+    parser.add_argument("--parse-workers", type=int, default=0, metavar="N",
+                        help="parse HTML in N worker processes (default: parse in the event loop)")
+    parser.add_argument("--audit", action="store_true",
+                        help="run the full on-page audit rules (canonical, robots, hreflang, headings, ...)")
+    parser.add_argument("--output", metavar="PATH",
+                        help="analyse every sitemap URL and stream results to PATH (.jsonl, .csv or .parquet); "
+                             "rerun with the same PATH to resume after a crash")
+    parser.add_argument("--bloom-capacity", type=int, metavar="N",
+                        help="dedup URLs with a Bloom filter sized for N URLs instead of an exact set "
+                             "(for multi-million URL sites; ~0.1%% of URLs may be skipped)")
+    parser.add_argument("--review-limit", type=int, metavar="N",
+                        help="send the N analysed pages with the most issues to the AI review "
+                             f"(default: all sampled pages, {FULL_SITE_REVIEW_LIMIT} with --output or --crawl; 0 skips the review)")
+    parser.add_argument("--crawl", action="store_true",
+                        help="also follow internal links from the homepage: broken outlinks, orphan pages, "
+                             "PageRank and click depth")
+    parser.add_argument("--crawl-max-pages", type=int, default=DEFAULT_MAX_PAGES, metavar="N",
+                        help=f"stop the crawl after N pages (default: {DEFAULT_MAX_PAGES})")
+    parser.add_argument("--crawl-depth", type=int, metavar="N",
+                        help="only crawl pages up to N clicks from the homepage")
+    parser.add_argument("--metrics-json", metavar="PATH",
+                        help="write per-stage timings (p50/p90/p99), per-host totals and counters as JSON")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="DEBUG also logs every link that checked OK (default: INFO)")
     if len(sys.argv) < 2:
-        print("Usage: python server.py <domain_or_url>")
+        parser.print_usage()
         sys.exit(1)
+    args = parser.parse_args()
+    configure_logging(args.log_level)
 
-    domain = sys.argv[1]
-    asyncio.run(main(domain))
+    asyncio.run(main(
+        args.domain_or_url,
+        incremental=args.incremental,
+        stale_after=args.stale_days * 86400,
+        diff_report=args.diff_report,
+        parse_workers=args.parse_workers,
+        audit_rules=args.audit,
+        output=args.output,
+        bloom_capacity=args.bloom_capacity,
+        review_limit=args.review_limit,
+        crawl=args.crawl,
+        crawl_max_pages=args.crawl_max_pages,
+        crawl_depth=args.crawl_depth,
+        metrics_json=args.metrics_json,
+    ))
 
 # python server.py https://www.nytimes.com
 
-# python server.py factiiv.io
\ No newline at end of file
+# python server.py factiiv.io
+
+# python server.py factiiv.io --incremental --diff-report diff.json
+
+# python server.py factiiv.io --audit --parse-workers 8 --output audit.jsonl
+
+# python server.py factiiv.io --crawl --crawl-max-pages 50000
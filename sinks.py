@@ -0,0 +1,272 @@
+# sinks.py
+import asyncio
+import csv
+import json
+import os
+import sqlite3
+from typing import Optional
+
+FLUSH_EVERY = 200           # records between sink flush + checkpoint commit
+DEFAULT_QUEUE_SIZE = 1000
+
+CSV_COLUMNS = ["url", "title", "description", "h1", "content_hash", "issues", "error", "audit",
+               "pagerank", "click_depth", "in_links"]
+
+
+def flatten(url: str, data: dict) -> dict:
+    """One flat row per page for the tabular sinks; nested audit fields become JSON."""
+    return {
+        "url": url,
+        "title": data.get("title"),
+        "description": data.get("description"),
+        "h1": data.get("h1"),
+        "content_hash": data.get("content_hash"),
+        "issues": ",".join(data.get("issues", [])),
+        "error": data.get("error"),
+        "audit": json.dumps(data["audit"], ensure_ascii=False) if "audit" in data else None,
+        "pagerank": data.get("pagerank"),
+        "click_depth": data.get("click_depth"),
+        "in_links": data.get("in_links"),
+    }
+
+
+def _truncate(path: str, position: Optional[int]):
+    """
+    Drops whatever a crashed run wrote after its last checkpointed flush: rows
+    the buffered writer spilled early and a possibly torn last line.
+    """
+    if position is not None and os.path.exists(path) and os.path.getsize(path) > position:
+        os.truncate(path, position)
+
+
+class JsonlSink:
+    """
+    `flush` returns the byte offset that is safely on disk; passing it back as
+    `position` with `append` resumes from exactly that point.
+    """
+
+    def __init__(self, path: str, append: bool = False, position: Optional[int] = None):
+        if append:
+            _truncate(path, position)
+        self._f = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, url: str, data: dict):
+        self._f.write(json.dumps({"url": url, **data}, ensure_ascii=False) + "\n")
+
+    def flush(self) -> int:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return self._f.tell()
+
+    def close(self):
+        self.flush()
+        self._f.close()
+
+
+class CsvSink:
+    """Like JsonlSink, `flush` returns the synced byte offset to resume from."""
+
+    def __init__(self, path: str, append: bool = False, position: Optional[int] = None):
+        if append:
+            _truncate(path, position)
+        new_file = not append or not os.path.exists(path) or os.path.getsize(path) == 0
+        self._f = open(path, "a" if append else "w", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._f, fieldnames=CSV_COLUMNS)
+        if new_file:
+            self._writer.writeheader()
+
+    def write(self, url: str, data: dict):
+        self._writer.writerow(flatten(url, data))
+
+    def flush(self) -> int:
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        return self._f.tell()
+
+    def close(self):
+        self.flush()
+        self._f.close()
+
+
+class ParquetSink:
+    """
+    Writes a directory of Parquet part files (readable as one dataset by pyarrow,
+    DuckDB or pandas). A Parquet file is only readable once closed, so every
+    flush closes a part and returns the number of parts; a resumed run drops
+    any part past that `position` and adds more parts.
+    """
+
+    flush_every = 5000
+
+    def __init__(self, path: str, append: bool = False, position: Optional[int] = None):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa, self._pq = pa, pq
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        parts = sorted(name for name in os.listdir(path) if name.startswith("part-"))
+        keep = len(parts) if position is None else position
+        if not append:
+            keep = 0
+        for name in parts[keep:]:
+            os.remove(os.path.join(path, name))
+        self._part = min(keep, len(parts))
+        types = {"pagerank": pa.float64(), "click_depth": pa.int32(), "in_links": pa.int64()}
+        self._schema = pa.schema([(name, types.get(name, pa.string())) for name in CSV_COLUMNS])
+        self._rows = []
+
+    def write(self, url: str, data: dict):
+        self._rows.append(flatten(url, data))
+
+    def flush(self) -> int:
+        if not self._rows:
+            return self._part
+        table = self._pa.Table.from_pylist(self._rows, schema=self._schema)
+        part_path = os.path.join(self.path, f"part-{self._part:05d}.parquet")
+        self._pq.write_table(table, part_path + ".tmp")
+        os.replace(part_path + ".tmp", part_path)
+        self._part += 1
+        self._rows = []
+        return self._part
+
+    def close(self):
+        self.flush()
+
+
+def open_sink(path: str, append: bool = False, position: Optional[int] = None):
+    """
+    Picks the sink from the file extension; `append` continues an interrupted
+    run from `position`, the value its last checkpointed `flush` returned.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        return JsonlSink(path, append, position)
+    if ext == ".csv":
+        return CsvSink(path, append, position)
+    if ext == ".parquet":
+        return ParquetSink(path, append, position)
+    raise ValueError(f"Unsupported output format {ext!r}; use .jsonl, .csv or .parquet")
+
+
+class Checkpoint:
+    """
+    URLs whose results are already on disk, so a crashed run can resume, and
+    the sink position they were flushed up to.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Losing the last commits on power failure only means redoing those pages.
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS done (url TEXT PRIMARY KEY)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        # A new checkpoint starts at an empty output.
+        self._db.execute("INSERT OR IGNORE INTO meta VALUES ('position', 0)")
+        self._db.commit()
+
+    def is_done(self, url: str) -> bool:
+        return self._db.execute("SELECT 1 FROM done WHERE url = ?", (url,)).fetchone() is not None
+
+    def count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM done").fetchone()[0]
+
+    def mark(self, url: str):
+        self._db.execute("INSERT OR IGNORE INTO done VALUES (?)", (url,))
+
+    def position(self) -> Optional[int]:
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'position'").fetchone()
+        return row[0] if row else None
+
+    def set_position(self, position: Optional[int]):
+        """Records where the sink was flushed to; committed with the URLs it covers."""
+        if position is not None:
+            self._db.execute("UPDATE meta SET value = ? WHERE name = 'position'", (position,))
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+    def remove(self):
+        """Deletes the checkpoint once a run has completed."""
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+
+
+class ResultWriter:
+    """
+    Writes results to a sink from a bounded queue.
+
+    Producers block once `queue_size` results are waiting, so a slow disk slows
+    the crawl down instead of growing memory; flushes run in a thread, so only
+    the producers wait, not the event loop. URLs are marked in the checkpoint
+    only after the sink has been flushed, so a resumed run never skips a page
+    whose row was lost. If writing fails, `put` and `close` raise the error.
+    """
+
+    def __init__(self, sink, checkpoint: Optional[Checkpoint] = None, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.sink = sink
+        self.checkpoint = checkpoint
+        self.written = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._unflushed = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def put(self, url: str, data: dict):
+        await self._put((url, data))
+
+    async def _put(self, item):
+        """Queues `item`, or raises the writer task's error instead of waiting on a dead queue."""
+        if self._task is None:
+            await self._queue.put(item)
+            return
+        if self._task.done():
+            self._task.result()
+        put = asyncio.ensure_future(self._queue.put(item))
+        await asyncio.wait({put, self._task}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            self._task.result()
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                break
+            url, data = item
+            self.sink.write(url, data)
+            self.written += 1
+            self._unflushed.append(url)
+            if len(self._unflushed) >= getattr(self.sink, "flush_every", FLUSH_EVERY):
+                await self._flush()
+        await self._flush()
+
+    async def _flush(self):
+        position = await asyncio.to_thread(self.sink.flush)
+        if self.checkpoint:
+            for url in self._unflushed:
+                self.checkpoint.mark(url)
+            self.checkpoint.set_position(position)
+            self.checkpoint.commit()
+        self._unflushed = []
+
+    async def close(self):
+        try:
+            if self._task:
+                await self._put(None)
+                await self._task
+        finally:
+            self.sink.close()
+            if self.checkpoint:
+                self.checkpoint.close()
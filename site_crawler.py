@@ -0,0 +1,177 @@
+# site_crawler.py
+import asyncio
+import logging
+from functools import partial
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from broken_link import LinkResult, verify_link
+from func import CRAWL_DELAYS, analyze_seo
+from link_graph import BROKEN, CHECKED, CRAWLED, EXTERNAL, IN_SITEMAP, LINKED, LinkGraph
+from link_metrics import LinkMetrics, compute_link_metrics
+from scheduler import CrawlScheduler, host_of
+
+DEFAULT_MAX_PAGES = 10_000
+
+
+class SiteCrawler:
+    """
+    Breadth-first crawl of a site's internal links, starting from one page.
+
+    Every page is fetched and parsed once by analyze_seo, which returns the
+    page's outlinks from the same parse pass. The graph hands out node IDs in
+    discovery order, so the frontier is a cursor into it rather than a queue
+    of URLs. After the crawl, `check_links` checks every other link target
+    (external links, pages that failed or were past the limits) exactly once,
+    and `rank` computes PageRank and click depth over the finished graph.
+    """
+
+    def __init__(
+        self,
+        session,
+        start_url: str,
+        max_pages: Optional[int] = DEFAULT_MAX_PAGES,
+        max_depth: Optional[int] = None,
+        parse_pool=None,
+        audit: bool = False,
+        graph: Optional[LinkGraph] = None,
+    ):
+        self.session = session
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.graph = graph or LinkGraph(host_of(start_url))
+        self.root = self.graph.add_node(start_url, LINKED, depth=0)
+        self.analyze = partial(analyze_seo, session, parse_pool=parse_pool, audit=audit, outlinks=True)
+        self.queued = 0
+        self.crawled = 0
+        self.broken = 0
+        self.issues: Dict[int, int] = {}     # node -> audit issues, for crawled pages that have any
+        self.metrics: Optional[LinkMetrics] = None
+
+    def _crawlable(self, node: int) -> bool:
+        if self.graph.flags[node] & EXTERNAL:
+            return False
+        return self.max_depth is None or self.graph.depth[node] <= self.max_depth
+
+    async def crawl(self) -> AsyncIterator[dict]:
+        """Crawls the site, yielding each analyze_seo result (minus the outlinks) as it completes."""
+        graph = self.graph
+        cursor = 0
+        pending = 0
+        progress = asyncio.Event()
+
+        async def frontier():
+            nonlocal cursor, pending
+            while True:
+                while cursor < len(graph) and (self.max_pages is None or self.queued < self.max_pages):
+                    node, cursor = cursor, cursor + 1
+                    if self._crawlable(node):
+                        self.queued += 1
+                        pending += 1
+                        yield graph.url(node)
+                if not pending:
+                    return
+                # Wait for a page in flight to add its outlinks to the graph.
+                progress.clear()
+                await progress.wait()
+
+        scheduler = CrawlScheduler(crawl_delays=CRAWL_DELAYS, report_interval=10)
+        async for url, result in scheduler.map(self.analyze, frontier()):
+            page = result.get(url) if isinstance(result, dict) else None
+            if isinstance(page, dict):
+                node = graph.node(url)
+                graph.flags[node] |= CRAWLED | CHECKED
+                graph.status[node] = 200
+                graph.add_links(node, page.pop("outlinks", None) or ())
+                if page.get("issues"):
+                    self.issues[node] = len(page["issues"])
+                self.crawled += 1
+            pending -= 1
+            progress.set()
+            yield result
+        logging.info(f"⏱️ Crawl: {scheduler.report()}")
+
+    async def check_links(self) -> AsyncIterator[Tuple[str, object]]:
+        """
+        Checks each linked URL the crawl did not fetch, once, and yields
+        (url, LinkResult or exception) pairs.
+        """
+        graph = self.graph
+        targets = (graph.url(node) for node in graph.select(LINKED, CHECKED))
+        scheduler = CrawlScheduler(crawl_delays=CRAWL_DELAYS, report_interval=10)
+        async for url, checked in scheduler.map(partial(verify_link, self.session), targets):
+            node = graph.node(url)
+            graph.flags[node] |= CHECKED
+            if isinstance(checked, LinkResult):
+                graph.status[node] = checked.status or 0
+                broken = checked.ok is False or checked.status is None
+            else:
+                broken = True
+            if broken:
+                graph.flags[node] |= BROKEN
+                self.broken += 1
+            yield url, checked
+        logging.info(f"⏱️ Outlink check: {scheduler.report()}")
+
+    def rank(self) -> Optional[LinkMetrics]:
+        """PageRank, click depth and in-links for every page; None without NumPy."""
+        self.metrics = compute_link_metrics(self.graph, self.root)
+        return self.metrics
+
+    def mark_sitemap(self, url: str):
+        """Flags a sitemap URL; ones the crawl never reached are added as unlinked nodes."""
+        self.graph.add_node(url, IN_SITEMAP)
+
+    def report(self, max_listed: int = 20):
+        graph, metrics = self.graph, self.metrics
+        external = sum(1 for _ in graph.select(EXTERNAL))
+        logging.info(
+            f"🕸️ Crawled {self.crawled} pages: {len(graph)} URLs ({external} external), {graph.edges} links, "
+            f"~{graph.memory_bytes() / 2**20:.1f} MB graph"
+        )
+        if self.max_pages is not None and self.queued >= self.max_pages:
+            logging.warning(f"⚠️ Crawl stopped at {self.max_pages} pages; the lists below only cover what was reached.")
+        if graph.truncated:
+            logging.warning(f"⚠️ Graph full: {graph.dropped_nodes} URLs and {graph.dropped_edges} links not recorded.")
+
+        broken = list(graph.select(BROKEN))
+        logging.info(f"❌ Broken links found by the crawl: {len(broken)}")
+        if metrics:
+            # Links from the strongest pages first: those cost the most PageRank.
+            impact = metrics.link_impact(broken)
+            broken.sort(key=impact.__getitem__, reverse=True)
+        sources = graph.sources(broken[:max_listed])
+        for node in broken[:max_listed]:
+            linked_from = ", ".join(graph.url(src) for src in sources[node])
+            logging.info(f"  - {graph.url(node)} [{graph.status[node] or 'error'}] ← {linked_from}")
+
+        if any(True for _ in graph.select(IN_SITEMAP)):
+            orphans = list(graph.orphans())
+            logging.info(f"🏝️ Sitemap URLs no crawled page links to (orphans): {len(orphans)}")
+            for node in orphans[:max_listed]:
+                logging.info(f"  - {graph.url(node)}")
+            missing = list(graph.select(CRAWLED, IN_SITEMAP))
+            logging.info(f"🗺️ Crawled pages missing from the sitemap: {len(missing)}")
+            for node in missing[:max_listed]:
+                logging.info(f"  - {graph.url(node)}")
+
+        if not metrics:
+            top = graph.most_linked(10)
+            if top:
+                logging.info("🔗 Most linked pages (in-links):")
+                for node, count in top:
+                    logging.info(f"  - {graph.url(node)} ({count})")
+            return
+
+        logging.info(f"🏆 Top pages by internal PageRank (1.0 = average page, {metrics.iterations} iterations):")
+        for node, page in metrics.top(10):
+            logging.info(f"  - {graph.url(node)} (PageRank {page['pagerank']}, depth {page['click_depth']}, "
+                         f"{page['in_links']} in-links)")
+        deep = int((metrics.depth > 3).sum())
+        if deep:
+            logging.info(f"🪜 Pages more than 3 clicks from the homepage: {deep}")
+        if self.issues:
+            logging.info("🎯 Fix first (pages with audit issues, by PageRank):")
+            ranked = sorted(self.issues, key=lambda node: metrics.pagerank[node], reverse=True)
+            for node in ranked[:max_listed]:
+                logging.info(f"  - {graph.url(node)} ({self.issues[node]} issues, "
+                             f"PageRank {metrics.node_metrics(node)['pagerank']})")
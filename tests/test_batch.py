@@ -0,0 +1,105 @@
+# test_batch.py
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch import JobQueue, domain_slug  # noqa: E402
+
+
+class JobQueueTest(unittest.TestCase):
+    """Claiming, retries and recovery on a queue file shared by several workers."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "queue.sqlite")
+        self.queue = JobQueue(self.path)
+        self.addCleanup(self.queue.close)
+
+    def status(self, domain: str) -> dict:
+        return next(job for job in self.queue.jobs() if job["domain"] == domain)
+
+    def test_claim_and_finish(self):
+        self.queue.add(["a.com", "b.com"])
+        self.assertEqual(self.queue.claim(1), "a.com")
+        self.assertEqual(self.queue.claim(2), "b.com")
+        self.assertIsNone(self.queue.claim(3))
+        self.queue.finish("a.com")
+        self.assertEqual(self.status("a.com")["status"], "done")
+        self.assertEqual(self.queue.counts(), {"queued": 0, "running": 1, "done": 1, "failed": 0})
+        self.assertTrue(self.queue.has_work())
+        self.queue.finish("b.com")
+        self.assertFalse(self.queue.has_work())
+
+    def test_failed_job_waits_then_retries_until_max_attempts(self):
+        self.queue.add(["a.com"])
+        self.assertEqual(self.queue.claim(1), "a.com")
+        self.queue.finish("a.com", "boom", max_attempts=2)
+        self.assertEqual(self.status("a.com")["status"], "queued")
+        self.assertIsNone(self.queue.claim(1))  # backing off for batch.RETRY_DELAY
+        self.assertTrue(self.queue.has_work())
+
+        self.queue._db.execute("UPDATE jobs SET not_before = 0")  # the delay has passed
+        self.assertEqual(self.queue.claim(1), "a.com")
+        self.queue.finish("a.com", "boom again", max_attempts=2)
+        job = self.status("a.com")
+        self.assertEqual((job["status"], job["attempts"], job["error"]), ("failed", 2, "boom again"))
+        self.assertFalse(self.queue.has_work())
+
+    def test_add_requeues_finished_but_not_running(self):
+        self.queue.add(["a.com", "b.com"])
+        self.queue.claim(1)
+        self.queue.finish("a.com", "boom", max_attempts=1)
+        self.queue.claim(1)
+        self.queue.add(["a.com", "b.com"])
+        self.assertEqual((self.status("a.com")["status"], self.status("a.com")["attempts"]), ("queued", 0))
+        self.assertEqual(self.status("b.com")["status"], "running")
+
+    def test_release_dead_worker(self):
+        self.queue.add(["a.com", "b.com", "c.com"])
+        self.queue.claim(1)
+        self.queue.claim(2)
+        self.assertEqual(self.queue.release(worker=1, max_attempts=1), 1)
+        self.assertEqual(self.status("a.com")["status"], "failed")
+        self.assertEqual(self.status("b.com")["status"], "running")
+        self.assertEqual(self.queue.release(penalize=False), 1)
+        self.assertEqual((self.status("b.com")["status"], self.status("b.com")["attempts"]), ("queued", 0))
+
+    def test_concurrent_workers_never_share_a_job(self):
+        domains = [f"site{n}.com" for n in range(200)]
+        self.queue.add(domains)
+        claimed = {}
+
+        def worker(n):
+            queue = JobQueue(self.path)
+            try:
+                claimed[n] = []
+                while (domain := queue.claim(n)) is not None:
+                    claimed[n].append(domain)
+                    queue.finish(domain)
+            finally:
+                queue.close()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        everything = [domain for done in claimed.values() for domain in done]
+        self.assertEqual(sorted(everything), sorted(domains))
+        self.assertEqual(self.queue.counts()["done"], 200)
+
+
+class DomainSlugTest(unittest.TestCase):
+    def test_slug(self):
+        self.assertEqual(domain_slug("https://www.example.com/path"), "www.example.com")
+        self.assertEqual(domain_slug("example.com:8080"), "example.com_8080")
+        self.assertEqual(domain_slug("///"), "domain")
+
+
+if __name__ == "__main__":
+    unittest.main()
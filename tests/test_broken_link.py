@@ -0,0 +1,127 @@
+# test_broken_link.py
+import os
+import sys
+import time
+import unittest
+from collections import Counter
+from unittest import mock
+
+from aiohttp import ClientSession, web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import broken_link  # noqa: E402
+from broken_link import LinkChecker, LinkResult, RedirectReport, retry_after_seconds  # noqa: E402
+
+
+class LinkCheckerTest(unittest.IsolatedAsyncioTestCase):
+    """HEAD/GET fallback, retries and redirects against a local server."""
+
+    async def asyncSetUp(self):
+        self.requests = []
+        self.busy = Counter()
+
+        async def no_head(request):
+            self.requests.append((request.method, request.path, request.headers.get("Range")))
+            if request.method == "HEAD":
+                raise web.HTTPMethodNotAllowed("HEAD", ["GET"])
+            return web.Response(status=206, text="x")
+
+        async def gone(request):
+            self.requests.append((request.method, request.path, request.headers.get("Range")))
+            raise web.HTTPNotFound()
+
+        async def busy(request):
+            self.requests.append((request.method, request.path, request.headers.get("Range")))
+            self.busy[request.path] += 1
+            if self.busy[request.path] <= int(request.query.get("fail", "1")):
+                raise web.HTTPTooManyRequests(headers={"Retry-After": request.query.get("after", "1")})
+            return web.Response(text="ok")
+
+        async def hop(request):
+            n = int(request.match_info["n"])
+            if n == 0:
+                return web.Response(text="ok")
+            raise web.HTTPMovedPermanently(f"/hop/{n - 1}")
+
+        app = web.Application()
+        app.router.add_route("*", "/no-head/{n}", no_head)
+        app.router.add_route("*", "/gone", gone)
+        app.router.add_route("*", "/busy/{n}", busy)
+        app.router.add_route("*", "/hop/{n}", hop)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.base = f"http://127.0.0.1:{self.runner.addresses[0][1]}"
+        self.session = ClientSession()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.runner.cleanup()
+
+    async def test_head_rejection_falls_back_to_ranged_get(self):
+        checker = LinkChecker()
+        result = await checker.check(self.session, self.base + "/no-head/1")
+        self.assertEqual((result.ok, result.status, result.method, result.attempts), (True, 206, "GET", 1))
+        self.assertEqual(self.requests, [("HEAD", "/no-head/1", None), ("GET", "/no-head/1", "bytes=0-0")])
+
+    async def test_host_learned_as_get_only(self):
+        checker = LinkChecker()
+        for n in range(3):
+            await checker.check(self.session, f"{self.base}/no-head/{n}")
+        self.assertIn(self.base[len("http://"):], checker.head_rejecting_hosts)
+        self.assertEqual([method for method, path, _ in self.requests if path == "/no-head/2"], ["GET"])
+
+    async def test_broken_link_is_confirmed_with_get(self):
+        result = await LinkChecker().check(self.session, self.base + "/gone")
+        self.assertEqual((result.ok, result.status, result.method), (False, 404, "GET"))
+        self.assertEqual([method for method, *_ in self.requests], ["HEAD", "GET"])
+
+    async def test_retry_after_is_honoured(self):
+        start = time.monotonic()
+        result = await LinkChecker().check(self.session, self.base + "/busy/1?after=1")
+        self.assertGreaterEqual(time.monotonic() - start, 0.95)
+        self.assertEqual((result.ok, result.status, result.attempts), (True, 200, 2))
+
+    async def test_retry_after_is_capped(self):
+        start = time.monotonic()
+        with mock.patch.object(broken_link, "RETRY_AFTER_MAX", 0.05):
+            result = await LinkChecker().check(self.session, self.base + "/busy/2?after=86400")
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual((result.ok, result.attempts), (True, 2))
+
+    async def test_retries_give_up_after_max_attempts(self):
+        result = await LinkChecker(max_attempts=2).check(self.session, self.base + "/busy/3?after=0&fail=5")
+        self.assertEqual((result.ok, result.status, result.attempts), (False, 429, 2))
+        self.assertEqual(self.busy["/busy/3"], 2)
+
+    async def test_redirect_chain_is_recorded(self):
+        result = await LinkChecker().check(self.session, self.base + "/hop/3")
+        self.assertEqual(result.hops, 3)
+        self.assertEqual([status for status, _ in result.redirects], [301, 301, 301])
+        self.assertEqual(result.final_url, self.base + "/hop/0")
+
+
+class RetryAfterTest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(retry_after_seconds("5"), 5.0)
+        self.assertIsNone(retry_after_seconds(None))
+        self.assertIsNone(retry_after_seconds("soon"))
+        self.assertEqual(retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+
+
+class RedirectReportTest(unittest.TestCase):
+    def test_keeps_longest_chains_first_seen_first(self):
+        report = RedirectReport(long_chain=2, max_listed=3)
+        for n, hops in enumerate([1, 2, 5, 3, 5, 2, 4, 0]):
+            report.add(LinkResult(url=f"https://example.com/{n}", ok=True, redirects=[(301, "x")] * hops))
+        self.assertEqual(report.redirected, 7)
+        self.assertEqual(report.long_chain_count, 6)
+        self.assertEqual([r.url for r in report.long_chains], [
+            "https://example.com/2", "https://example.com/4", "https://example.com/6",
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+# test_extractors.py
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extractors  # noqa: E402
+
+XHTML = (
+    '<?xml version="1.0" encoding="ISO-8859-1"?>\n'
+    '<!DOCTYPE html><html xmlns="http://www.w3.org/1999/xhtml"><head><title>Café</title>'
+    '<meta name="description" content="Menu"/></head><body><h1>Welcome</h1></body></html>'
+)
+EXPECTED = {"title": "Café", "description": "Menu", "h1": "Welcome"}
+
+
+class ExtractSeoTest(unittest.TestCase):
+    def test_xhtml_with_encoding_declaration(self):
+        for backend in extractors.available_backends():
+            with self.subTest(backend=backend):
+                self.assertEqual(extractors.extract_seo(XHTML, backend), EXPECTED)
+
+    def test_failing_backend_falls_back_to_stream(self):
+        def broken(html):
+            raise ValueError("cannot parse")
+
+        with mock.patch.dict(extractors.BACKENDS, {"lxml": broken}):
+            self.assertEqual(extractors.extract_seo(XHTML, "lxml"), EXPECTED)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+# test_gsc_export.py
+import os
+import sys
+import unittest
+from datetime import date
+from unittest import mock
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gsc_export  # noqa: E402
+from google_api import GoogleApiClient, GoogleApiError  # noqa: E402
+from gsc_export import date_shards, export_dimensions, export_rows, shard_payloads  # noqa: E402
+
+ROW_LIMIT = 3
+
+
+class DateShardsTest(unittest.TestCase):
+    def test_shards(self):
+        start, end = date(2024, 1, 30), date(2024, 2, 12)
+        days = date_shards(start, end)
+        self.assertEqual(len(days), 14)
+        self.assertEqual(days[0], (start, start))
+        self.assertEqual(days[-1], (end, end))
+        self.assertEqual(date_shards(start, end, "week"), [
+            (date(2024, 1, 30), date(2024, 2, 5)),
+            (date(2024, 2, 6), date(2024, 2, 12)),
+        ])
+        self.assertEqual(date_shards(start, date(2024, 2, 1), "week"), [(start, date(2024, 2, 1))])
+        self.assertEqual(date_shards(start, end, "none"), [(start, end)])
+        self.assertEqual(date_shards(end, start), [])
+
+    def test_sharded_exports_are_per_day(self):
+        self.assertEqual(export_dimensions(["query"], "day"), ["date", "query"])
+        self.assertEqual(export_dimensions(["date", "query"], "week"), ["date", "query"])
+        self.assertEqual(export_dimensions(["query"], "none"), ["query"])
+
+    def test_device_dimension_splits_payloads(self):
+        payloads = shard_payloads(date(2024, 1, 1), date(2024, 1, 2), ["date", "device"])
+        self.assertEqual(len(payloads), 2 * len(gsc_export.DEVICES))
+        expressions = {p["dimensionFilterGroups"][0]["filters"][0]["expression"] for p in payloads}
+        self.assertEqual(expressions, set(gsc_export.DEVICES))
+
+
+class ExportRowsTest(unittest.IsolatedAsyncioTestCase):
+    """startRow paging and shard fan-out against a local searchAnalytics.query."""
+
+    async def asyncSetUp(self):
+        # Rows per day: a partial last page, an exact multiple of the page size, and none.
+        self.rows_per_day = {"2024-01-01": 7, "2024-01-02": 6, "2024-01-03": 0, "2024-01-04": 2}
+        self.requests = []
+
+        async def query(request):
+            body = await request.json()
+            self.requests.append((request.match_info["site"], body["startDate"], body["startRow"]))
+            if request.headers.get("Authorization") != "Bearer token":
+                raise web.HTTPUnauthorized()
+            day, start_row = body["startDate"], body["startRow"]
+            if day == "2024-01-05":
+                return web.json_response({"error": {"message": "Bad request"}}, status=400)
+            total = self.rows_per_day[day]
+            rows = [
+                {"keys": [day, f"query {n}"], "clicks": n, "impressions": 10 * n, "ctr": 0.1, "position": 1.5}
+                for n in range(start_row, min(start_row + body["rowLimit"], total))
+            ]
+            return web.json_response({"rows": rows} if rows else {})
+
+        app = web.Application()
+        app.router.add_post("/sites/{site}/searchAnalytics/query", query)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        base = f"http://127.0.0.1:{self.runner.addresses[0][1]}"
+        for target, value in (("GSC_BASE", base), ("GSC_MAX_ROWS", ROW_LIMIT)):
+            patcher = mock.patch.object(gsc_export, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = GoogleApiClient(retries=0)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.runner.cleanup()
+
+    async def export(self, end: date, **kwargs):
+        rows = export_rows(
+            "token", "https://example.com/", date(2024, 1, 1), end, ["query"],
+            per_minute=None, client=self.client, **kwargs,
+        )
+        return [row async for row in rows]
+
+    async def test_pages_every_shard_with_start_row(self):
+        rows = await self.export(date(2024, 1, 4), concurrency=2)
+        expected = {(day, f"query {n}") for day, total in self.rows_per_day.items() for n in range(total)}
+        self.assertEqual({(row["date"], row["query"]) for row in rows}, expected)
+        self.assertEqual(len(rows), len(expected))
+        self.assertEqual(set(rows[0]), {"date", "query", "clicks", "impressions", "ctr", "position"})
+
+        pages = sorted((day, start_row) for _, day, start_row in self.requests)
+        self.assertEqual(pages, [
+            ("2024-01-01", 0), ("2024-01-01", 3), ("2024-01-01", 6),
+            ("2024-01-02", 0), ("2024-01-02", 3), ("2024-01-02", 6),
+            ("2024-01-03", 0),
+            ("2024-01-04", 0),
+        ])
+        self.assertEqual({site for site, *_ in self.requests}, {"https://example.com"})
+
+    async def test_failed_shard_fails_the_export(self):
+        with self.assertRaises(GoogleApiError) as cm:
+            await self.export(date(2024, 1, 5), concurrency=1)
+        self.assertEqual(cm.exception.status, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+# test_http_cache.py
+import os
+import sys
+import tempfile
+import unittest
+
+from aiohttp import ClientSession, web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_cache import HttpCache, cached_get  # noqa: E402
+
+PAGE = "<html><head><title>Café</title></head><body>ünïcode</body></html>"
+
+
+class CacheServerTest(unittest.IsolatedAsyncioTestCase):
+    """A local origin plus a client session and a scratch directory."""
+
+    async def asyncSetUp(self):
+        async def bare(request):
+            # body= with an explicit header: no charset parameter is added.
+            headers = {"Content-Type": request.query.get("type", "text/html"), "ETag": '"v1"'}
+            if request.headers.get("If-None-Match") == '"v1"':
+                return web.Response(status=304, headers=headers)
+            return web.Response(body=PAGE.encode(), headers=headers)
+
+        async def plain(request):
+            # No validator; an optional Cache-Control from the query string.
+            headers = {"Content-Type": "text/html"}
+            if "cc" in request.query:
+                headers["Cache-Control"] = request.query["cc"]
+            return web.Response(body=PAGE.encode(), headers=headers)
+
+        async def latin1(request):
+            return web.Response(body=PAGE.encode("latin-1"), headers={"Content-Type": "text/html; charset=ISO-8859-1"})
+
+        app = web.Application()
+        app.router.add_get("/bare", bare)
+        app.router.add_get("/latin1", latin1)
+        app.router.add_get("/plain", plain)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.base = f"http://127.0.0.1:{self.runner.addresses[0][1]}"
+        self.session = ClientSession()
+        self.tmp = tempfile.TemporaryDirectory()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.runner.cleanup()
+        self.tmp.cleanup()
+
+    async def fetch(self, path, cache=None):
+        async with cached_get(self.session, self.base + path, cache=cache) as resp:
+            return resp.status, await resp.text()
+
+
+class CachedGetTextTest(CacheServerTest):
+    """Bodies are decoded the same way live and from the cache, with or without a charset."""
+
+    async def test_no_charset_without_cache(self):
+        for content_type in ("text/html", "text/plain"):
+            status, text = await self.fetch(f"/bare?type={content_type}")
+            self.assertEqual(status, 200)
+            self.assertEqual(text, PAGE)
+
+    async def test_no_charset_through_cache(self):
+        cache = HttpCache(os.path.join(self.tmp.name, "cache"), fresh_for=60)
+        try:
+            self.assertEqual(await self.fetch("/bare", cache), (200, PAGE))
+            self.assertEqual(await self.fetch("/bare", cache), (200, PAGE))
+            self.assertEqual(cache.hits, 1)
+        finally:
+            cache.close()
+
+    async def test_header_charset(self):
+        self.assertEqual(await self.fetch("/latin1"), (200, PAGE))
+
+
+class HttpCacheStoreTest(CacheServerTest):
+    """What gets stored, revalidation, and trimming to max_bytes."""
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.caches = []
+
+    async def asyncTearDown(self):
+        for cache in self.caches:
+            cache.close()
+        await super().asyncTearDown()
+
+    def cache(self, **kwargs):
+        cache = HttpCache(os.path.join(self.tmp.name, "cache"), **kwargs)
+        self.caches.append(cache)
+        return cache
+
+    async def test_revalidated_with_etag(self):
+        cache = self.cache()
+        self.assertEqual(await self.fetch("/bare", cache), (200, PAGE))
+        self.assertEqual(await self.fetch("/bare", cache), (200, PAGE))
+        self.assertEqual((cache.misses, cache.hits, cache.revalidated), (1, 1, 1))
+
+    async def test_no_validator_not_stored(self):
+        cache = self.cache(fresh_for=60)
+        await self.fetch("/plain", cache)
+        self.assertIsNone(cache.lookup(self.base + "/plain"))
+
+    async def test_max_age_covering_fresh_for_stored(self):
+        cache = self.cache(fresh_for=60)
+        await self.fetch("/plain?cc=max-age=10", cache)
+        self.assertIsNone(cache.lookup(self.base + "/plain?cc=max-age=10"))
+        await self.fetch("/plain?cc=public, max-age=3600", cache)
+        self.assertEqual(await self.fetch("/plain?cc=public, max-age=3600", cache), (200, PAGE))
+        self.assertEqual(cache.hits, 1)
+
+    async def test_trimmed_to_max_bytes(self):
+        size = len(PAGE.encode())
+        cache = self.cache(max_bytes=2 * size)
+        for n in range(4):
+            await self.fetch(f"/bare?n={n}", cache)
+        self.assertEqual(cache._bytes, 2 * size)
+        self.assertIsNone(cache.lookup(self.base + "/bare?n=0"))
+        self.assertIsNotNone(cache.lookup(self.base + "/bare?n=3"))
+
+    async def test_batched_writes_survive_close(self):
+        cache = HttpCache(os.path.join(self.tmp.name, "cache"))
+        await self.fetch("/bare", cache)
+        cache.close()
+        reopened = self.cache()
+        self.assertIsNotNone(reopened.lookup(self.base + "/bare"))
+        self.assertEqual(reopened._bytes, len(PAGE.encode()))
+
+
+if __name__ == "__main__":
+    unittest.main()
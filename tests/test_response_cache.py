@@ -0,0 +1,113 @@
+# test_response_cache.py
+import asyncio
+import os
+import sys
+import unittest
+
+from aiohttp import ClientSession, web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from response_cache import MemoryBackend, ResponseCache  # noqa: E402
+
+
+class Upstream(Exception):
+    pass
+
+
+class ResponseCacheTest(unittest.IsolatedAsyncioTestCase):
+    """Single-flight coalescing in front of a slow local API."""
+
+    async def asyncSetUp(self):
+        self.calls = 0
+
+        async def report(request):
+            self.calls += 1
+            await asyncio.sleep(0.1)
+            if request.query.get("fail"):
+                raise web.HTTPServiceUnavailable()
+            return web.json_response({"rows": [request.query.get("site")], "call": self.calls})
+
+        app = web.Application()
+        app.router.add_get("/report", report)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.base = f"http://127.0.0.1:{self.runner.addresses[0][1]}"
+        self.session = ClientSession()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.runner.cleanup()
+
+    def fetcher(self, **params):
+        async def fetch():
+            async with self.session.get(self.base + "/report", params=params) as resp:
+                if resp.status >= 400:
+                    raise Upstream(resp.status)
+                return await resp.json()
+        return fetch
+
+    async def test_concurrent_identical_requests_share_one_call(self):
+        cache = ResponseCache()
+        key = ResponseCache.key("gsc", "token", site="a")
+        results = await asyncio.gather(*(cache.get_or_fetch(key, self.fetcher(site="a")) for _ in range(10)))
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(result == results[0] for result in results))
+        self.assertEqual(await cache.get_or_fetch(key, self.fetcher(site="a")), results[0])
+        self.assertEqual(self.calls, 1)
+        stats = cache.stats_dict()
+        self.assertEqual((stats["misses"], stats["coalesced"], stats["hits"]), (1, 9, 1))
+        self.assertEqual((stats["entries"], stats["in_flight"]), (1, 0))
+
+    async def test_different_requests_are_not_coalesced(self):
+        cache = ResponseCache()
+        keys = [ResponseCache.key("gsc", "token", site=site) for site in "ab"]
+        keys.append(ResponseCache.key("gsc", "other-token", site="a"))
+        self.assertEqual(len(set(keys)), 3)
+        await asyncio.gather(*(cache.get_or_fetch(key, self.fetcher(site="a")) for key in keys))
+        self.assertEqual(self.calls, 3)
+
+    async def test_failure_reaches_every_waiter_and_is_not_cached(self):
+        cache = ResponseCache()
+        key = ResponseCache.key("gsc", "token", site="a")
+        results = await asyncio.gather(
+            *(cache.get_or_fetch(key, self.fetcher(site="a", fail=1)) for _ in range(5)), return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(result, Upstream) for result in results))
+        self.assertEqual((self.calls, cache.stats.errors), (1, 1))
+        await cache.get_or_fetch(key, self.fetcher(site="a"))
+        self.assertEqual(self.calls, 2)
+
+    async def test_cancelled_caller_does_not_cancel_the_others(self):
+        cache = ResponseCache()
+        key = ResponseCache.key("gsc", "token", site="a")
+        first = asyncio.create_task(cache.get_or_fetch(key, self.fetcher(site="a")))
+        second = asyncio.create_task(cache.get_or_fetch(key, self.fetcher(site="a")))
+        await asyncio.sleep(0.02)
+        first.cancel()
+        self.assertEqual((await second)["rows"], ["a"])
+        self.assertEqual(self.calls, 1)
+
+    async def test_entries_expire(self):
+        cache = ResponseCache(ttl=0.05)
+        key = ResponseCache.key("gsc", "token", site="a")
+        await cache.get_or_fetch(key, self.fetcher(site="a"))
+        await asyncio.sleep(0.1)
+        await cache.get_or_fetch(key, self.fetcher(site="a"))
+        self.assertEqual(self.calls, 2)
+
+
+class MemoryBackendTest(unittest.IsolatedAsyncioTestCase):
+    async def test_least_recently_used_is_evicted(self):
+        backend = MemoryBackend(max_entries=2)
+        await backend.set("a", 1, 60)
+        await backend.set("b", 2, 60)
+        await backend.get("a")
+        await backend.set("c", 3, 60)
+        self.assertEqual([await backend.get(key) for key in "abc"], [1, None, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
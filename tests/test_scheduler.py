@@ -0,0 +1,107 @@
+# test_scheduler.py
+import asyncio
+import os
+import sys
+import time
+import unittest
+from collections import Counter
+
+from aiohttp import ClientSession, web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import CrawlScheduler, host_of  # noqa: E402
+
+
+class SchedulerTest(unittest.IsolatedAsyncioTestCase):
+    """Per-host limits and delays against a local server reached under two host names."""
+
+    async def asyncSetUp(self):
+        self.in_flight = Counter()
+        self.peak = Counter()
+        self.starts = {}
+
+        async def page(request):
+            host = request.host
+            self.in_flight[host] += 1
+            self.peak[host] = max(self.peak[host], self.in_flight[host])
+            self.starts.setdefault(host, []).append(time.monotonic())
+            try:
+                await asyncio.sleep(float(request.query.get("sleep", "0.02")))
+            finally:
+                self.in_flight[host] -= 1
+            if request.match_info["n"] == "fail":
+                raise web.HTTPInternalServerError()
+            return web.Response(text="ok")
+
+        app = web.Application()
+        app.router.add_get("/p/{n}", page)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.a = f"http://127.0.0.1:{port}"
+        self.b = f"http://localhost:{port}"
+        self.session = ClientSession()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.runner.cleanup()
+
+    async def fetch(self, url):
+        async with self.session.get(url) as resp:
+            resp.raise_for_status()
+            return await resp.text()
+
+    async def test_per_host_limit(self):
+        scheduler = CrawlScheduler(concurrency=10, per_host=2)
+        urls = [f"{host}/p/{n}" for n in range(12) for host in (self.a, self.b)]
+        results = await scheduler.run(self.fetch, urls)
+        self.assertEqual(sorted(url for url, _ in results), sorted(urls))
+        self.assertEqual(max(self.peak.values()), 2)
+        self.assertEqual((scheduler.completed, scheduler.errors), (24, 0))
+
+    async def test_crawl_delay_spaces_starts(self):
+        host = host_of(self.a)
+        scheduler = CrawlScheduler(concurrency=5, crawl_delays={host: 0.1})
+        await scheduler.run(self.fetch, [f"{self.a}/p/{n}" for n in range(4)])
+        starts = self.starts[host]
+        self.assertEqual(self.peak[host], 1)
+        self.assertTrue(all(later - earlier >= 0.09 for earlier, later in zip(starts, starts[1:])))
+
+    async def test_throttled_host_does_not_block_others(self):
+        # The throttled host's URLs come first; the other host must not wait behind them.
+        scheduler = CrawlScheduler(concurrency=4, crawl_delays={host_of(self.a): 0.2})
+        urls = [f"{self.a}/p/{n}" for n in range(10)] + [f"{self.b}/p/{n}" for n in range(20)]
+        order = [url async for url, _ in scheduler.map(self.fetch, urls)]
+        other = [n for n, url in enumerate(order) if url.startswith(self.b)]
+        self.assertLess(max(other), order.index(f"{self.a}/p/2"))
+
+    async def test_failures_are_yielded(self):
+        scheduler = CrawlScheduler(concurrency=3)
+        results = dict(await scheduler.run(self.fetch, [f"{self.a}/p/1", f"{self.a}/p/fail"]))
+        self.assertEqual(results[f"{self.a}/p/1"], "ok")
+        self.assertIsInstance(results[f"{self.a}/p/fail"], Exception)
+        self.assertEqual(scheduler.errors, 1)
+
+    async def test_read_ahead_is_bounded(self):
+        pulled = 0
+
+        async def urls():
+            nonlocal pulled
+            for n in range(50):
+                pulled += 1
+                yield f"{self.a}/p/{n}?sleep=0.05"
+
+        scheduler = CrawlScheduler(concurrency=2, per_host=2, read_ahead=5)
+        seen = 0
+        async for _ in scheduler.map(self.fetch, urls()):
+            seen += 1
+            # Read ahead, plus the URLs in flight and the one the producer is holding.
+            self.assertLessEqual(pulled - seen, 5 + 2 + 1)
+        self.assertEqual(seen, 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
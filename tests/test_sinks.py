@@ -0,0 +1,118 @@
+# test_sinks.py
+import asyncio
+import csv
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sinks import FLUSH_EVERY, Checkpoint, ResultWriter, open_sink  # noqa: E402
+
+
+def page(n: int) -> dict:
+    return {"title": f"Page {n}", "description": "Ünïcode description", "h1": "H1"}
+
+
+class DiskFull(Exception):
+    pass
+
+
+class FailingSink:
+    def write(self, url, data):
+        raise DiskFull("No space left on device")
+
+    def flush(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+class ResumeTest(unittest.IsolatedAsyncioTestCase):
+    """A crashed run resumes from the last checkpointed flush, without torn or duplicate rows."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    async def crash_after(self, output: str, count: int):
+        """Writes `count` rows, then dies with unflushed rows spilled to disk and a torn last line."""
+        checkpoint = Checkpoint(output + ".checkpoint")
+        writer = ResultWriter(open_sink(output), checkpoint)
+        writer.start()
+        for n in range(count):
+            await writer.put(f"https://example.com/{n}", page(n))
+        while writer.written < count:
+            await asyncio.sleep(0)
+        writer._task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await writer._task
+        writer.sink._f.flush()
+        with open(output, "a", encoding="utf-8") as f:
+            f.write('{"url": "https://example.com/torn", "ti')
+        writer.sink._f.close()
+        checkpoint._db.close()
+
+    async def resume(self, output: str, count: int):
+        checkpoint = Checkpoint(output + ".checkpoint")
+        writer = ResultWriter(open_sink(output, append=True, position=checkpoint.position()), checkpoint)
+        writer.start()
+        for n in range(count):
+            url = f"https://example.com/{n}"
+            if not checkpoint.is_done(url):
+                await writer.put(url, page(n))
+        await writer.close()
+
+    async def test_jsonl_resume(self):
+        output = os.path.join(self.tmp.name, "out.jsonl")
+        await self.crash_after(output, FLUSH_EVERY + 50)
+        await self.resume(output, FLUSH_EVERY + 80)
+        with open(output, encoding="utf-8") as f:
+            urls = [json.loads(line)["url"] for line in f]
+        self.assertEqual(urls, [f"https://example.com/{n}" for n in range(FLUSH_EVERY + 80)])
+
+    async def test_csv_resume_keeps_one_header(self):
+        output = os.path.join(self.tmp.name, "out.csv")
+        await self.crash_after(output, FLUSH_EVERY + 50)
+        await self.resume(output, FLUSH_EVERY + 80)
+        with open(output, encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row["url"] for row in rows], [f"https://example.com/{n}" for n in range(FLUSH_EVERY + 80)])
+        self.assertEqual(rows[0]["description"], "Ünïcode description")
+
+    async def test_crash_before_first_flush_starts_over(self):
+        output = os.path.join(self.tmp.name, "out.jsonl")
+        await self.crash_after(output, 10)
+        await self.resume(output, 10)
+        with open(output, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 10)
+
+
+class WriterFailureTest(unittest.IsolatedAsyncioTestCase):
+    """A failing sink surfaces its error instead of leaving producers blocked on a full queue."""
+
+    async def test_put_raises_sink_error(self):
+        writer = ResultWriter(FailingSink(), queue_size=2)
+        writer.start()
+        with self.assertRaises(DiskFull):
+            async with asyncio.timeout(5):
+                for n in range(10):
+                    await writer.put(f"https://example.com/{n}", page(n))
+        with self.assertRaises(DiskFull):
+            async with asyncio.timeout(5):
+                await writer.close()
+
+    async def test_close_raises_sink_error(self):
+        writer = ResultWriter(FailingSink(), queue_size=2)
+        writer.start()
+        await writer.put("https://example.com/", page(0))
+        with self.assertRaises(DiskFull):
+            async with asyncio.timeout(5):
+                await writer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+# test_sitemap_parser.py
+import gzip
+import os
+import sys
+import unittest
+import xml.etree.ElementTree as ET
+
+from aiohttp import ClientSession, web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sitemap_parser import SitemapStreamParser, probe_sitemap, stream_sitemap  # noqa: E402
+
+NS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+IMAGE_NS = 'xmlns:image="http://www.google.com/schemas/sitemap-image/1.1"'
+
+
+def urlset(count: int) -> bytes:
+    urls = "".join(
+        f"<url><loc>https://example.com/{n}</loc><lastmod>2024-01-0{n % 9 + 1}</lastmod>"
+        f"<priority>0.{n % 10}</priority>"
+        f"<image:image><image:loc>https://cdn.example.com/{n}.png</image:loc></image:image></url>"
+        for n in range(count)
+    )
+    return f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset {NS} {IMAGE_NS}>{urls}</urlset>'.encode()
+
+
+def sitemap_index(*locs: str) -> bytes:
+    children = "".join(f"<sitemap><loc>{loc}</loc></sitemap>" for loc in locs)
+    return f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex {NS}>{children}</sitemapindex>'.encode()
+
+
+class StreamParserTest(unittest.TestCase):
+    def feed_in_pieces(self, data: bytes, size: int) -> list:
+        parser = SitemapStreamParser()
+        entries = []
+        for i in range(0, len(data), size):
+            entries.extend(parser.feed(data[i:i + size]))
+        entries.extend(parser.close())
+        return parser, entries
+
+    def test_plain_and_gzip_give_the_same_entries(self):
+        data = urlset(50)
+        for payload, size in ((data, 7), (gzip.compress(data), 1), (gzip.compress(data), 4096)):
+            with self.subTest(gzipped=payload is not data, size=size):
+                parser, entries = self.feed_in_pieces(payload, size)
+                self.assertEqual(parser.kind, "urlset")
+                self.assertEqual([e.loc for e in entries], [f"https://example.com/{n}" for n in range(50)])
+                self.assertEqual(entries[3].priority, 0.3)
+                self.assertEqual(entries[3].lastmod, "2024-01-04")
+
+    def test_extension_loc_is_not_read_as_page_loc(self):
+        _, entries = self.feed_in_pieces(urlset(3), 1024)
+        self.assertFalse(any("cdn.example.com" in e.loc for e in entries))
+
+    def test_sitemap_index(self):
+        parser, entries = self.feed_in_pieces(sitemap_index("https://example.com/a.xml", "https://example.com/b.xml"), 16)
+        self.assertEqual(parser.kind, "sitemapindex")
+        self.assertEqual([e.loc for e in entries], ["https://example.com/a.xml", "https://example.com/b.xml"])
+
+    def test_malformed_xml_raises(self):
+        parser = SitemapStreamParser()
+        with self.assertRaises(ET.ParseError):
+            parser.feed(b"<urlset><url><loc>x</url>")
+            parser.close()
+
+
+class SitemapFetchTest(unittest.IsolatedAsyncioTestCase):
+    """Streaming and probing against a local server, plain and gzipped."""
+
+    async def asyncSetUp(self):
+        self.documents = {
+            "/sitemap.xml": urlset(200),
+            "/sitemap.xml.gz": gzip.compress(urlset(200)),
+            "/index.xml.gz": gzip.compress(sitemap_index("https://example.com/a.xml.gz", "https://example.com/b.xml")),
+            "/robots.txt": b"User-agent: *\nDisallow:\n",
+        }
+
+        async def document(request):
+            body = self.documents.get(request.path)
+            if body is None:
+                raise web.HTTPNotFound()
+            return web.Response(body=body, content_type="application/octet-stream")
+
+        app = web.Application()
+        app.router.add_get("/{name}", document)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.base = f"http://127.0.0.1:{self.runner.addresses[0][1]}"
+        self.session = ClientSession()
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.runner.cleanup()
+
+    async def test_stream_gzipped_sitemap(self):
+        for path in ("/sitemap.xml", "/sitemap.xml.gz"):
+            with self.subTest(path=path):
+                locs = [entry.loc async for entry in stream_sitemap(self.session, self.base + path)]
+                self.assertEqual(locs, [f"https://example.com/{n}" for n in range(200)])
+
+    async def test_stream_missing_sitemap_raises(self):
+        with self.assertRaises(Exception):
+            [entry async for entry in stream_sitemap(self.session, self.base + "/missing.xml")]
+
+    async def test_probe_classifies_documents(self):
+        self.assertEqual(await probe_sitemap(self.session, self.base + "/sitemap.xml.gz"), ("urlset", []))
+        self.assertEqual(
+            await probe_sitemap(self.session, self.base + "/index.xml.gz"),
+            ("sitemapindex", ["https://example.com/a.xml.gz", "https://example.com/b.xml"]),
+        )
+        self.assertEqual(await probe_sitemap(self.session, self.base + "/robots.txt"), (None, []))
+        self.assertEqual(await probe_sitemap(self.session, self.base + "/missing.xml"), (None, []))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+# test_url_index.py
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from url_index import BloomFilter, SeenSet, UrlIndex, canonicalize, unique, url_key  # noqa: E402
+
+
+class CanonicalizeTest(unittest.TestCase):
+    def test_equivalent_spellings(self):
+        cases = {
+            "HTTPS://Example.COM:443/a/b/": "https://example.com/a/b",
+            "http://example.com:80": "http://example.com/",
+            "http://example.com:8080/": "http://example.com:8080/",
+            "https://example.com./a#section": "https://example.com/a",
+            "https://example.com/a/./b/../c": "https://example.com/a/c",
+            "https://example.com/%7euser/%2fx%2Fy": "https://example.com/~user/%2Fx%2Fy",
+            "https://example.com/?b=2&a=1&&": "https://example.com/?a=1&b=2",
+            "https://user:pw@Example.com/": "https://user:pw@example.com/",
+            "https://[::1]:8443/x": "https://[::1]:8443/x",
+            "  https://example.com/x  ": "https://example.com/x",
+        }
+        for url, expected in cases.items():
+            with self.subTest(url=url):
+                self.assertEqual(canonicalize(url), expected)
+
+    def test_distinct_pages_stay_distinct(self):
+        self.assertNotEqual(url_key("https://example.com/a"), url_key("https://example.com/A"))
+        self.assertNotEqual(url_key("https://example.com/a?x=1"), url_key("https://example.com/a?x=2"))
+        self.assertNotEqual(url_key("http://example.com/"), url_key("https://example.com/"))
+
+
+class SeenSetTest(unittest.TestCase):
+    def test_add_and_contains_across_growth(self):
+        seen = SeenSet(capacity=4)
+        initial = seen.memory_bytes
+        keys = [url_key(f"https://example.com/{n}") for n in range(5000)]
+        self.assertTrue(all(seen.add(key) for key in keys))
+        self.assertFalse(any(seen.add(key) for key in keys))
+        self.assertEqual(len(seen), 5000)
+        self.assertTrue(all(key in seen for key in keys))
+        self.assertNotIn(url_key("https://example.com/other"), seen)
+        self.assertGreater(seen.memory_bytes, initial)
+
+    def test_ids_follow_insertion_order(self):
+        seen = SeenSet(capacity=4, ids=True)
+        keys = [url_key(f"https://example.com/{n}") for n in range(1000)]
+        for key in keys:
+            seen.add(key)
+        seen.add(keys[10])
+        self.assertEqual([seen.id_of(key) for key in keys], list(range(1000)))
+        self.assertIsNone(seen.id_of(url_key("https://example.com/other")))
+        self.assertGreater(seen.memory_bytes, SeenSet(capacity=1000).memory_bytes)
+
+
+class UrlIndexTest(unittest.TestCase):
+    def test_unique_keeps_first_spelling(self):
+        index = UrlIndex()
+        urls = ["https://Example.com/a/", "https://example.com/a", "https://example.com/b#top", "https://example.com/b"]
+        self.assertEqual(list(unique(urls, index)), ["https://Example.com/a/", "https://example.com/b#top"])
+        self.assertEqual((len(index), index.duplicates), (2, 2))
+        self.assertIn("https://example.com:443/a", index)
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(capacity=10000)
+        keys = [url_key(f"https://example.com/{n}") for n in range(10000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(url_key(f"https://other.example/{n}") in bloom for n in range(10000))
+        self.assertLess(false_positives, 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
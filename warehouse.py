@@ -0,0 +1,402 @@
+# warehouse.py
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import urllib.parse
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from google_api import GA4_DATA_BASE, GSC_BASE, GoogleApiClient, get_google_client
+from gsc_export import export_rows
+from log_config import configure_logging
+
+DEFAULT_WAREHOUSE_PATH = "analytics.duckdb"
+FINAL_AFTER_DAYS = 3        # GSC and GA4 keep revising the most recent ~2-3 days
+FRESH_TTL = 3600            # seconds before a not-yet-final day is fetched again
+GA4_PAGE_ROWS = 100000
+ACCESS_TTL = 600            # seconds a token's access to a property is trusted
+GSC_COLUMNS = ("query", "page", "device", "country")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS synced_days (
+    source TEXT, key TEXT, spec TEXT, day DATE, final BOOLEAN, synced_at DOUBLE,
+    PRIMARY KEY (source, key, spec, day)
+);
+CREATE TABLE IF NOT EXISTS gsc_rows (
+    site TEXT, spec TEXT, day DATE,
+    query TEXT, page TEXT, device TEXT, country TEXT,
+    clicks BIGINT, impressions BIGINT, ctr DOUBLE, position DOUBLE
+);
+CREATE TABLE IF NOT EXISTS ga4_rows (
+    property TEXT, spec TEXT, day DATE, dimensions TEXT, metrics TEXT
+);
+CREATE TABLE IF NOT EXISTS ga4_specs (
+    property TEXT, spec TEXT, metric_headers TEXT, PRIMARY KEY (property, spec)
+);
+"""
+
+
+def day_ranges(days: List[date]) -> List[Tuple[date, date]]:
+    """Groups sorted days into contiguous (start, end) ranges."""
+    ranges = []
+    for day in days:
+        if ranges and ranges[-1][1] + timedelta(days=1) == day:
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+
+def gsc_spec(dimensions: List[str]) -> str:
+    """Dataset key for a GSC dimension set; "date" is implied since rows are stored per day."""
+    return ",".join(sorted(d for d in dimensions if d != "date"))
+
+
+def ga4_spec(metrics: List[str], dimensions: List[str]) -> str:
+    return json.dumps({"metrics": list(metrics), "dimensions": sorted(d for d in dimensions if d != "date")})
+
+
+class Warehouse:
+    """
+    Local DuckDB copy of Search Console and GA4 data, one row set per property,
+    dataset (dimension / metric combination) and day.
+
+    `sync_*` fetches only the days that are missing, plus recent days that
+    Google may still revise (re-fetched at most every `fresh_ttl` seconds), so
+    historical ranges are answered from disk and only fresh days hit the API.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_WAREHOUSE_PATH,
+        final_after_days: int = FINAL_AFTER_DAYS,
+        fresh_ttl: float = FRESH_TTL,
+    ):
+        import duckdb
+
+        self.path = path
+        self.final_after_days = final_after_days
+        self.fresh_ttl = fresh_ttl
+        self.days_fetched = 0
+        self._db = duckdb.connect(path)
+        self._db.execute(SCHEMA)
+        self._write_lock = threading.Lock()
+        self._sync_locks: Dict[tuple, asyncio.Lock] = {}
+        self._access: Dict[tuple, float] = {}
+
+    async def _run(self, fn, *args):
+        """Runs `fn(cursor, *args)` in a thread so queries don't block the event loop."""
+        def call():
+            cursor = self._db.cursor()
+            try:
+                return fn(cursor, *args)
+            finally:
+                cursor.close()
+        return await asyncio.to_thread(call)
+
+    def _is_final(self, day: date) -> bool:
+        return day <= datetime.utcnow().date() - timedelta(days=self.final_after_days)
+
+    def _days_to_sync(self, cursor, source: str, key: str, spec: str, start: date, end: date) -> List[date]:
+        synced = {
+            day: (final, synced_at)
+            for day, final, synced_at in cursor.execute(
+                "SELECT day, final, synced_at FROM synced_days "
+                "WHERE source = ? AND key = ? AND spec = ? AND day BETWEEN ? AND ?",
+                [source, key, spec, start, end],
+            ).fetchall()
+        }
+        now = time.time()
+        days = []
+        day = start
+        while day <= end:
+            entry = synced.get(day)
+            if entry is None or (not entry[0] and now - entry[1] > self.fresh_ttl):
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+
+    def _replace(self, cursor, source: str, key: str, spec: str, start: date, end: date, table: str, rows):
+        """Swaps one dataset's rows for [start, end] and marks those days synced, atomically."""
+        import pyarrow as pa
+
+        key_column = "site" if table == "gsc_rows" else "property"
+        with self._write_lock:
+            cursor.execute("BEGIN")
+            try:
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE {key_column} = ? AND spec = ? AND day BETWEEN ? AND ?",
+                    [key, spec, start, end],
+                )
+                if rows:
+                    cursor.register("incoming", pa.Table.from_pylist(rows))
+                    cursor.execute(f"INSERT INTO {table} BY NAME SELECT * FROM incoming")
+                    cursor.unregister("incoming")
+                now = time.time()
+                day = start
+                while day <= end:
+                    cursor.execute(
+                        "INSERT OR REPLACE INTO synced_days VALUES (?, ?, ?, ?, ?, ?)",
+                        [source, key, spec, day, self._is_final(day), now],
+                    )
+                    day += timedelta(days=1)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+    async def _check_access(self, client: Optional[GoogleApiClient], token: str, url: str):
+        """
+        Stored rows are shared by every user, so a token must prove it can
+        read the property (a cheap metadata call, remembered for ACCESS_TTL)
+        before anything is served from disk. Raises GoogleApiError otherwise.
+        """
+        key = (hashlib.sha256(token.encode()).hexdigest(), url)
+        if self._access.get(key, 0) > time.monotonic():
+            return
+        await (client or get_google_client()).get(url, token)
+        self._access[key] = time.monotonic() + ACCESS_TTL
+
+    async def _sync(self, source: str, key: str, spec: str, start: date, end: date, fetch) -> int:
+        lock = self._sync_locks.setdefault((source, key, spec), asyncio.Lock())
+        async with lock:
+            days = await self._run(self._days_to_sync, source, key, spec, start, end)
+            for range_start, range_end in day_ranges(days):
+                table, rows = await fetch(range_start, range_end)
+                await self._run(self._replace, source, key, spec, range_start, range_end, table, rows)
+            self.days_fetched += len(days)
+            return len(days)
+
+    # --- Search Console ---
+
+    async def sync_gsc(
+        self, token: str, site: str, start: date, end: date, dimensions: List[str],
+        client: Optional[GoogleApiClient] = None,
+    ) -> int:
+        """Fetches missing or still-changing days of one GSC web search dataset; returns the number of days fetched."""
+        site = site.rstrip("/")
+        spec = gsc_spec(dimensions)
+        columns = spec.split(",") if spec else []
+
+        async def fetch(range_start, range_end):
+            rows = []
+            async for row in export_rows(
+                token, site, range_start, range_end, columns, shard="day", search_type="web", client=client
+            ):
+                stored = {"site": site, "spec": spec, "day": date.fromisoformat(row["date"])}
+                stored.update({c: row.get(c) for c in GSC_COLUMNS})
+                stored.update({m: row[m] for m in ("clicks", "impressions", "ctr", "position")})
+                rows.append(stored)
+            return "gsc_rows", rows
+
+        return await self._sync("gsc", site, spec, start, end, fetch)
+
+    async def gsc_performance(
+        self, token: str, site: str, start: date, end: date, dimensions: List[str], row_limit: int,
+        client: Optional[GoogleApiClient] = None,
+    ) -> dict:
+        """
+        Answers a searchAnalytics.query from the warehouse, syncing what is
+        missing first. Rows are aggregated from daily data (position is
+        impression-weighted), in the API's response format.
+        """
+        site = site.rstrip("/")
+        await self._check_access(client, token, f"{GSC_BASE}/sites/{urllib.parse.quote(site, safe='')}")
+        await self.sync_gsc(token, site, start, end, dimensions, client)
+        select = [("strftime(day, '%Y-%m-%d')" if d == "date" else d) for d in dimensions]
+
+        def query(cursor):
+            group_by = f"GROUP BY {', '.join(str(i + 1) for i in range(len(select)))}" if select else ""
+            return cursor.execute(
+                f"""
+                SELECT {''.join(s + ', ' for s in select)}
+                    SUM(clicks) AS clicks,
+                    SUM(impressions) AS impressions,
+                    SUM(position * impressions) / NULLIF(SUM(impressions), 0) AS position
+                FROM gsc_rows
+                WHERE site = ? AND spec = ? AND day BETWEEN ? AND ?
+                {group_by}
+                ORDER BY clicks DESC, impressions DESC
+                LIMIT ?
+                """,
+                [site, gsc_spec(dimensions), start, end, row_limit],
+            ).fetchall()
+
+        rows = []
+        for *keys, clicks, impressions, position in await self._run(query):
+            if not impressions:
+                continue
+            row = {"clicks": clicks, "impressions": impressions, "ctr": clicks / impressions, "position": position}
+            if keys:
+                row = {"keys": keys, **row}
+            rows.append(row)
+        aggregation = "byPage" if "page" in dimensions else "byProperty"
+        return {"rows": rows, "responseAggregationType": aggregation}
+
+    # --- GA4 ---
+
+    async def sync_ga4(
+        self, token: str, property_id: str, start: date, end: date, metrics: List[str], dimensions: List[str],
+        client: Optional[GoogleApiClient] = None,
+    ) -> int:
+        client = client or get_google_client()
+        spec = ga4_spec(metrics, dimensions)
+        other_dimensions = sorted(d for d in dimensions if d != "date")
+        url = f"{GA4_DATA_BASE}/properties/{property_id}:runReport"
+
+        async def fetch(range_start, range_end):
+            rows, offset, headers = [], 0, None
+            while True:
+                payload = {
+                    "dateRanges": [{"startDate": str(range_start), "endDate": str(range_end)}],
+                    "metrics": [{"name": m} for m in metrics],
+                    "dimensions": [{"name": d} for d in ["date", *other_dimensions]],
+                    "limit": GA4_PAGE_ROWS,
+                    "offset": offset,
+                }
+                data = await client.post(url, token, payload)
+                headers = data.get("metricHeaders", headers)
+                for row in data.get("rows", []):
+                    values = [v.get("value") for v in row.get("dimensionValues", [])]
+                    rows.append({
+                        "property": property_id,
+                        "spec": spec,
+                        "day": datetime.strptime(values[0], "%Y%m%d").date(),
+                        "dimensions": json.dumps(dict(zip(other_dimensions, values[1:]))),
+                        "metrics": json.dumps([v.get("value") for v in row.get("metricValues", [])]),
+                    })
+                offset += len(data.get("rows", []))
+                if not data.get("rows") or offset >= data.get("rowCount", 0):
+                    break
+            if headers:
+                await self._run(self._save_metric_headers, property_id, spec, headers)
+            return "ga4_rows", rows
+
+        return await self._sync("ga4", property_id, spec, start, end, fetch)
+
+    def _save_metric_headers(self, cursor, property_id: str, spec: str, headers: list):
+        with self._write_lock:
+            cursor.execute("INSERT OR REPLACE INTO ga4_specs VALUES (?, ?, ?)", [property_id, spec, json.dumps(headers)])
+
+    async def ga4_report(
+        self, token: str, property_id: str, start: date, end: date, metrics: List[str], dimensions: List[str],
+        client: Optional[GoogleApiClient] = None,
+    ) -> Optional[dict]:
+        """
+        Answers a runReport from the warehouse in the API's response format.
+        GA4 metrics such as users cannot be summed across days, so only reports
+        broken down by "date" are served; others return None and go live.
+        """
+        if "date" not in dimensions:
+            return None
+        await self._check_access(client, token, f"{GA4_DATA_BASE}/properties/{property_id}/metadata")
+        await self.sync_ga4(token, property_id, start, end, metrics, dimensions, client)
+        spec = ga4_spec(metrics, dimensions)
+
+        def query(cursor):
+            headers = cursor.execute(
+                "SELECT metric_headers FROM ga4_specs WHERE property = ? AND spec = ?", [property_id, spec]
+            ).fetchone()
+            rows = cursor.execute(
+                "SELECT strftime(day, '%Y%m%d'), dimensions, metrics FROM ga4_rows "
+                "WHERE property = ? AND spec = ? AND day BETWEEN ? AND ? ORDER BY day",
+                [property_id, spec, start, end],
+            ).fetchall()
+            return headers, rows
+
+        headers, stored = await self._run(query)
+        rows = []
+        for day, dimension_values, metric_values in stored:
+            values = json.loads(dimension_values)
+            values["date"] = day
+            rows.append({
+                "dimensionValues": [{"value": values.get(d)} for d in dimensions],
+                "metricValues": [{"value": v} for v in json.loads(metric_values)],
+            })
+        return {
+            "dimensionHeaders": [{"name": d} for d in dimensions],
+            "metricHeaders": json.loads(headers[0]) if headers else [{"name": m} for m in metrics],
+            "rows": rows,
+            "rowCount": len(rows),
+            "kind": "analyticsData#runReport",
+        }
+
+    def close(self):
+        self._db.close()
+
+
+_warehouse: Optional[Warehouse] = None
+_configured = False
+
+
+def configure_warehouse(warehouse: Optional[Warehouse]):
+    """Installs the process-wide warehouse; None makes the endpoints query Google live."""
+    global _warehouse, _configured
+    if _warehouse is not None and _warehouse is not warehouse:
+        _warehouse.close()
+    _warehouse, _configured = warehouse, True
+
+
+def get_warehouse() -> Optional[Warehouse]:
+    """
+    The process-wide warehouse, opened on first use at $SEO_WAREHOUSE. It is
+    opt-in: with SEO_WAREHOUSE unset or empty (or duckdb not installed) the
+    endpoints query Google live.
+    """
+    global _warehouse, _configured
+    if not _configured:
+        path = os.getenv("SEO_WAREHOUSE")
+        try:
+            _warehouse = Warehouse(path) if path else None
+        except ImportError:
+            logging.warning("SEO_WAREHOUSE is set but duckdb is not installed; querying Google live.")
+            _warehouse = None
+        _configured = True
+    return _warehouse
+
+
+async def sync(args):
+    """Daily sync job: keeps the last `--days` days of each dataset up to date."""
+    token = args.token or os.getenv("GOOGLE_ACCESS_TOKEN")
+    if not token:
+        raise SystemExit("Pass --token or set GOOGLE_ACCESS_TOKEN")
+    warehouse = Warehouse(args.path)
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=args.days)
+    try:
+        for site in args.site:
+            for dims in args.gsc_dimensions:
+                fetched = await warehouse.sync_gsc(token, site, start, end, dims.split(","))
+                logging.info(f"🔄 GSC {site} [{dims}]: {fetched} day(s) fetched")
+        for property_id in args.property:
+            fetched = await warehouse.sync_ga4(
+                token, property_id, start, end, args.ga4_metrics.split(","), args.ga4_dimensions.split(",")
+            )
+            logging.info(f"🔄 GA4 {property_id} [{args.ga4_metrics} by {args.ga4_dimensions}]: {fetched} day(s) fetched")
+    finally:
+        warehouse.close()
+        await get_google_client().close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(usage="python warehouse.py --site URL [--property ID] [options]")
+    parser.add_argument("--path", default=os.getenv("SEO_WAREHOUSE") or DEFAULT_WAREHOUSE_PATH)
+    parser.add_argument("--token", help="OAuth access token (default: $GOOGLE_ACCESS_TOKEN)")
+    parser.add_argument("--site", action="append", default=[], help="Search Console property, repeatable")
+    parser.add_argument("--gsc-dimensions", action="append", default=None,
+                        help="comma-separated GSC dimensions per dataset, repeatable (default: query)")
+    parser.add_argument("--property", action="append", default=[], help="GA4 property ID, repeatable")
+    parser.add_argument("--ga4-metrics", default="sessions")
+    parser.add_argument("--ga4-dimensions", default="date")
+    parser.add_argument("--days", type=int, default=90, help="days of history to keep synced (default: 90)")
+    args = parser.parse_args()
+    args.gsc_dimensions = args.gsc_dimensions or ["query"]
+    configure_logging()
+    asyncio.run(sync(args))
+
+# python warehouse.py --site https://factiiv.io --property 123456789 --days 90